@@ -0,0 +1,51 @@
+import hmac
+
+from fastapi import APIRouter, HTTPException, Request
+
+from app.config.settings import settings
+from app.models.schemas import CrawlJobRequest
+from app.services.crawl_jobs import crawl_job_manager
+from app.services.lender_crawls import start_lenders_crawl
+
+router = APIRouter(prefix="/crawl_jobs")
+
+
+@router.post("/webhook")
+async def crawl_webhook(request: Request):
+    """Receiver of the Firecrawl crawl webhooks, hands the crawled pages to their running job"""
+    # Without a configured token no push can be trusted, so the receiver accepts none
+    token = request.headers.get("X-Webhook-Token") or ""
+    if not settings.FIRECRAWL_WEBHOOK_TOKEN or not hmac.compare_digest(token, settings.FIRECRAWL_WEBHOOK_TOKEN):
+        raise HTTPException(status_code=401, detail="Invalid webhook token")
+    payload = await request.json()
+    return {"accepted": crawl_job_manager.handle_webhook(payload)}
+
+
+@router.post("")
+def start_crawl_job(request: CrawlJobRequest):
+    """Crawl a lender site and extract its data while the crawl runs, the result is in the job once it is done"""
+    job = start_lenders_crawl(request.url, keywords=request.keywordsToSearch, lender_name=request.lenderName, limit=request.limit)
+    if job["status"] == "failed":
+        raise HTTPException(status_code=502, detail=f"Crawl could not be started: {job.get('error')}")
+    return job
+
+
+@router.get("")
+def list_crawl_jobs():
+    return crawl_job_manager.list()
+
+
+@router.get("/{job_id}")
+def get_crawl_job(job_id: str):
+    job = crawl_job_manager.status(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Crawl job not found")
+    return job
+
+
+@router.delete("/{job_id}")
+def cancel_crawl_job(job_id: str):
+    job = crawl_job_manager.cancel(job_id)
+    if not job:
+        raise HTTPException(status_code=404, detail="Crawl job not found")
+    return job
@@ -0,0 +1,16 @@
+from fastapi import APIRouter, HTTPException, Response
+
+from app.utils.metrics import render_metrics
+
+router = APIRouter()
+
+
+@router.get("/metrics")
+def metrics():
+    """Prometheus scrape endpoint for the pipeline, fetcher, LLM, crawler and database metrics"""
+    rendered = render_metrics()
+    if rendered is None:
+        raise HTTPException(status_code=503, detail="prometheus_client is not installed")
+
+    content, content_type = rendered
+    return Response(content=content, media_type=content_type)
@@ -1,10 +1,10 @@
 import logging
 from fastapi import APIRouter
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
 from app.services.database_service import database_service
 from app.models.schemas import LendersGeminiSearchResponse, SnifferAIRequest, SnifferAIResponse
-from app.services.gemini_service import gemini_service
-from app.services.llm_services import openai_analyzer
+from app.services.gemini_service import GeminiService, get_gemini_service
+from app.services.llm_services import OpenAIAnalyzer, get_openai_analyzer
 
 logger = logging.getLogger(__name__)
 
@@ -12,12 +12,15 @@ logger = logging.getLogger(__name__)
 router = APIRouter()
 
 @router.post("/scrape_lenders")
-def scrape_lenders(request: SnifferAIRequest):
+def scrape_lenders(
+    request: SnifferAIRequest,
+    openai_analyzer: OpenAIAnalyzer = Depends(get_openai_analyzer),
+    gemini_service: GeminiService = Depends(get_gemini_service),
+):
     try:
         logger.info(f"Scraping lenders for request: {request}")
 
-        generate_response = gemini_service.generate_search_response(
-            prompt="""What is the 
+        search_prompt = """What is the 
                 1. interest rate, 
                 2. Loan-to-value, 
                 3. minimum credit score, 
@@ -26,20 +29,34 @@ def scrape_lenders(request: SnifferAIRequest):
                 6. approval time, 
                 7. processing fee, 
                 8. special Offers
-                for home loan in India for {}.""".format(request.entity),
-            model="gemini-2.0-flash"
-        )
-        search_response = generate_response["response"]
+                for home loan in India for {}.""".format(request.entity)
 
-        llm_response, token_usage = openai_analyzer.gpt_model_structured_response(
-            system_message="You are a helpful assistant which can extract the information from the data provided by the user. Parse that data into valuable structured response and provide the response in JSON format.", 
-            prompt=str(search_response), 
-            model="gpt-4o-mini", 
+        # One grounded call answering with the schema directly
+        generate_response = gemini_service.generate_structured_search_response(
+            prompt=search_prompt,
+            model="gemini-2.0-flash",
             response_format=LendersGeminiSearchResponse
         )
 
-        structured_response = llm_response.choices[0].message.parsed
-        structured_response_dict = structured_response.model_dump()
+        if generate_response["success"]:
+            structured_response_dict = generate_response["data"]
+        else:
+            # The answer did not match the schema: parse the free text in a second step
+            logger.info(f"Structured Gemini answer for {request.entity} did not validate, parsing it with gpt-4o-mini")
+            search_response = generate_response["response"]
+            if not search_response:
+                search_response = gemini_service.generate_search_response(prompt=search_prompt, model="gemini-2.0-flash").get("response")
+
+            llm_response = openai_analyzer.get_structured_response(
+                system_message="You are a helpful assistant which can extract the information from the data provided by the user. Parse that data into valuable structured response and provide the response in JSON format.", 
+                prompt=str(search_response), 
+                model="gpt-4o-mini", 
+                response_format=LendersGeminiSearchResponse
+            )
+            if not llm_response["success"]:
+                raise Exception(f"Could not parse the search answer: {llm_response['error']}")
+
+            structured_response_dict = llm_response["data"]
 
         # Reformat the response based on the keys in the response format
         structured_response_dict["lender"] = request.entity
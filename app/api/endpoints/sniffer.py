@@ -1,20 +1,31 @@
+import json
 import yaml
+import hashlib
 from pathlib import Path
+from typing import get_args, get_origin
 from urllib.parse import urlparse
 
 import logging
-from firecrawl import JsonConfig
-from fastapi import APIRouter, HTTPException
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.encoders import jsonable_encoder
+from app.config.settings import settings
 from app.services.crawlers import firecrawler
-from app.services.llm_services import openai_analyzer, gemini_service
+from app.services.llm_services import OpenAIAnalyzer, get_openai_analyzer
+from app.services.gemini_service import get_gemini_service
 from app.models.schemas import (
     SnifferAIRequest, SnifferAIResponse, SnifferExtractSchema, LendersGeminiSearchResponse, ClassificationAgentRequest, GenerateConfigAgentRequest, IOCLExtractSchema)
 from app.utils.prompts import (refinement_prompt_v2, lenders_usecase_system_message_v2, lenders_usecase_prompt_v2)
 
 from app.utils.prompts import get_prompt
-from app.services.database_service import database_service
+from app.services.database_service import database_service, BatchWriter
 from app.services.sniffer_services import get_lenders_data
-from app.services.llm_services import openai_analyzer
+from app.services.relevance import filter_text, filter_extracted_data
+from app.services.fetch_router import route_urls
+from app.services.tool_runner import run_tools, merge_tool_results
+from app.services.refinement import refine_records_with_fallback
+from app.services.webpage import extract_structured_records, canonical_url
+from app.services.singleflight import get_flight
+from app.utils.metrics import PipelineTracker
 
 logger = logging.getLogger(__name__)
 
@@ -113,6 +124,45 @@ def schema_match(schema):
     else:
         return None
 
+def get_list_field(schema):
+    """Name of the field of `schema` holding a list of records, if any (e.g. SnifferExtractSchema.output)"""
+    for name, field in getattr(schema, "model_fields", {}).items():
+        item_types = get_args(field.annotation)
+        if get_origin(field.annotation) is list and item_types and hasattr(item_types[0], "model_fields"):
+            return name
+    return None
+
+
+def records_response(records: list, list_field: str = None) -> dict:
+    """Records merged or mapped locally, in the response shape of a single tool (wrapped in the list field)"""
+    if list_field:
+        data = {list_field: records}
+    else:
+        data = records[0] if len(records) == 1 else records
+    return {"success": bool(records), "data": data}
+
+
+def ensure_table(table_name: str, column_names: list[str], unique_key: str):
+    """Create the table for the records if it does not exist yet"""
+    table_check = database_service.check_table_exists(table_name)
+    if table_check:
+        logger.info(f"Table {table_name} already exists")
+        return
+
+    create_table_result = database_service.create_table_from_columns(column_names, table_name, unique_key)
+    logger.info(f"Create table result: {create_table_result}")
+    if create_table_result["status"] == "error":
+        logger.error(f"Failed to generate sql table quert: {create_table_result['message']}")
+        raise HTTPException(status_code=400, detail=f"Failed to generate sql table query: {create_table_result['message']}")
+
+    generate_table_result = database_service.execute_sql_command(create_table_result["sql"])
+    logger.info(f"Generate table result: {generate_table_result}")
+    if generate_table_result["status"] == "error":
+        logger.error(f"Failed to generate sql table query: {generate_table_result['message']}")
+        raise HTTPException(status_code=400, detail=f"Failed to generate sql table query: {generate_table_result['message']}")
+    logger.info(f"Table {table_name} created successfully")
+
+
 def add_entity_to_response(response: list[dict], entity: str, source: str = "sniffer"):
     if not isinstance(response, list):
         response = [response]
@@ -167,6 +217,14 @@ def read_config():
     return read_yaml(config_path)
 
 
+def sniffer_request_key(request: SnifferAIRequest) -> str:
+    """Identity of a sniffer request: its canonical urls, prompt and flags"""
+    payload = request.model_dump()
+    payload["urls"] = sorted({canonical_url(url) for url in request.urls or []})
+    canonical = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False, default=str)
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
 ########################################## Validators ##########################################
 def validate_request_input(request: SnifferAIRequest):
     if not request.googleSearch and not request.snifferTool:
@@ -174,9 +232,61 @@ def validate_request_input(request: SnifferAIRequest):
     return True
 
 
+########################################## Sniffer Tool ##########################################
+LOCAL_EXTRACTION_MODEL = "gpt-4.1-mini-2025-04-14"
+
+
+def extract_with_fetch_router(urls: list[str], domain: str, prompt: str, model_schema, openai_analyzer: OpenAIAnalyzer,
+                              keywords: list[str] = None, list_field: str = None, unique_key: str = None,
+                              routed: dict = None) -> dict:
+    """
+    Sniffer tool extraction through the fetch router
+
+    Static pages are fetched locally and extracted with the LLM; only the pages that
+    need a browser (JS rendered, blocked) are sent to Firecrawl's extract. `routed` is
+    a route_urls result of the same urls, when the pages were already fetched.
+    """
+    routed = routed or route_urls(urls, domain=f"https://{domain}")
+    results = {}
+    if routed["pages"]:
+        record_model = get_args(model_schema.model_fields[list_field].annotation)[0] if list_field else model_schema
+        pages = filter_extracted_data(routed["pages"], (keywords or []) + list(record_model.model_fields.keys()))
+        content = "\n\n".join(f"Source: {url}\n{text}" for url, text in pages.items())
+        results["local"] = openai_analyzer.get_structured_response(
+            prompt, f"Raw Data:\n{content}", model=LOCAL_EXTRACTION_MODEL, response_format=model_schema)
+    if routed["escalate"]:
+        results["firecrawl"] = firecrawler.extract_data(
+            urls=routed["escalate"], prompt=prompt, schema=model_schema.model_json_schema())
+
+    if len(results) == 1:
+        return next(iter(results.values()))
+    records, _ = merge_tool_results(results, ["local", "firecrawl"], list_field=list_field, unique_key=unique_key)
+    return records_response(records, list_field)
+
+
 ########################################### Sniffer AI ##########################################
 @router.post("/sniffer_ai", response_model=SnifferAIResponse)
-def sniffer_ai(request: SnifferAIRequest):
+def sniffer_ai(
+    request: SnifferAIRequest,
+    openai_analyzer: OpenAIAnalyzer = Depends(get_openai_analyzer),
+):
+    # Times every stage and collects the token usage of the run
+    tracker = PipelineTracker("sniffer")
+    status = "error"
+    try:
+        # Identical concurrent requests (e.g. the batch driver and a user) share one pipeline run
+        response = get_flight("sniffer_request").do(
+            sniffer_request_key(request),
+            lambda: jsonable_encoder(run_sniffer_pipeline(request, openai_analyzer, tracker)),
+            cross_process=settings.SINGLEFLIGHT_CROSS_PROCESS,
+        )
+        status = "success"
+        return response
+    finally:
+        tracker.finish(status)
+
+
+def run_sniffer_pipeline(request: SnifferAIRequest, openai_analyzer: OpenAIAnalyzer, tracker: PipelineTracker):
     logger.info(f"Received request to Sniffer AI - {request.urls}")
 
     # Validation Checks
@@ -186,13 +296,14 @@ def sniffer_ai(request: SnifferAIRequest):
     update_if_exists = True
 
     ## Usecase loading ## --> Extract the configuration for the usecase
+    tracker.stage("config_loading")
     config = read_config()
     all_usecases = config.get("use_cases", {})
     usecases = list(set(all_usecases.keys()))
     print("USecases: ", usecases)
-    breakpoint()
 
     ###################################### Classicfication Agent ##############################################
+    tracker.stage("classification")
     schema_keywords = usecases + ["Not Found"]
     table_names = ['advisorkhoj', 'justdial']
 
@@ -250,7 +361,6 @@ def sniffer_ai(request: SnifferAIRequest):
     classification_agent_response = openai_analyzer.analyze_context(model="gpt-4o-mini",messages=messages, response_format=ClassificationAgentRequest)
     classification_agent_response = classification_agent_response.get("data", {})
     logger.info(f"Classification agent response: {classification_agent_response}")
-    breakpoint()
 
     
     # CA.2 --> Classification Agent Response
@@ -258,7 +368,6 @@ def sniffer_ai(request: SnifferAIRequest):
         entity = classification_agent_response.get("entity", None)
         usecase = classification_agent_response.get("keyword", None)
         logger.info(f"Classification agent response is classified, entity: {entity}, usecase: {usecase}")
-        breakpoint()
 
     # CA.3 --> Usecase Identification
     try:
@@ -275,6 +384,8 @@ def sniffer_ai(request: SnifferAIRequest):
 
 
     # CA.4.1 --> Usecase Identification
+    tracker.stage("usecase_config")
+    tracker.usecase = classified_usecase.lower() if classified_usecase != "Not Found" else "generated"
     if classified_usecase != "Not Found":
         logger.info("Usecase is found in our system config")
         try:
@@ -346,7 +457,6 @@ def sniffer_ai(request: SnifferAIRequest):
                     model_schema = schema_match("SnifferExtractSchema")  # fallback to default schema
 
 
-            breakpoint()
 
         else:
             raise HTTPException(status_code=400, detail="Invalid config generation agent response")
@@ -354,13 +464,11 @@ def sniffer_ai(request: SnifferAIRequest):
     else:
         raise HTTPException(status_code=400, detail="Invalid classification agent response")
 
-    logger.info("Direeeeeeeeeeeeeeeeeeee")
-    breakpoint()
 
     print("Model Schema: ", model_schema)
-    breakpoint()
 
     ########################################## Input Gathering #########################################
+    tracker.stage("input_gathering")
     # IG.1 --> Input Gathering
     if request.urls:
         urls = request.urls
@@ -373,6 +481,7 @@ def sniffer_ai(request: SnifferAIRequest):
     logger.info("All the inputs gathered. Lets start the process.")
 
     #################################### Prompt Loading #######################################################
+    tracker.stage("prompt_loading")
     if classified_usecase != "Not Found":
         get_scraper_system_message = get_prompt(scraper_system_message)
         get_scraper_prompt = get_prompt(scraper_prompt)
@@ -389,7 +498,6 @@ def sniffer_ai(request: SnifferAIRequest):
         final_scraper_prompt = scraper_system_message + "\n" + scraper_prompt
     
     print("Final Scraper Prompt: ", final_scraper_prompt)
-    breakpoint()
 
     #################################### Custom Scraper: Lenders Data #########################################
     # if request.dataToExtract.lower() == "lenders":
@@ -398,18 +506,85 @@ def sniffer_ai(request: SnifferAIRequest):
     #     first_tool_response = custom_scraper_response.get("data", {})
 
     ################################################## SnifferBase Agents #################################################
-    
+    tracker.stage("first_stage_tools")
+
+    # SBA.0 --> Local fetch: the fetch router reads the static pages once, for the structured data
+    # fast path (schema.org JSON-LD, microdata and tables parsed locally) and for the sniffer tool.
+    # Only sniffer tool requests read the pages, search-only requests never fetch them
+    routed, structured_records = None, []
+    if request.urls and request.snifferTool and (request.structuredFastPath or request.fetchRouter):
+        structured_pages = [] if request.structuredFastPath else None
+        routed = route_urls(request.urls, domain=f"https://{domain}", structured_sink=structured_pages)
+        if request.structuredFastPath:
+            list_field = get_list_field(model_schema)
+            record_model = get_args(model_schema.model_fields[list_field].annotation)[0] if list_field else model_schema
+            structured_records, coverage = extract_structured_records(structured_pages, record_model, single_record=not list_field)
+            if coverage < settings.STRUCTURED_COVERAGE_THRESHOLD:
+                structured_records = []
+
+    if structured_records:
+        logger.info(f"Extracting data - structured data covers the schema, skipping the tools ({len(structured_records)} records)")
+        first_tool_response = records_response(structured_records, get_list_field(model_schema))
+
+    # SBA.1.0 --> Parallel Agents: every enabled tool at once, merged per field
+    elif request.parallelTools:
+        logger.info("Extracting data - running the enabled tools in parallel")
+        list_field = get_list_field(model_schema)
+        record_model = get_args(model_schema.model_fields[list_field].annotation)[0] if list_field else model_schema
+        field_names = list(record_model.model_fields.keys())
+
+        tools = {}
+        if request.snifferTool and request.fetchRouter:
+            tools["extract"] = lambda: extract_with_fetch_router(
+                request.urls, domain, final_scraper_prompt, model_schema, openai_analyzer,
+                keywords=keywords, list_field=list_field, unique_key=unique_key, routed=routed)
+        elif request.snifferTool:
+            tools["extract"] = lambda: firecrawler.extract_data(
+                urls=request.urls, prompt=final_scraper_prompt, schema=model_schema.model_json_schema())
+        if request.googleSearch:
+            search_prompt = get_prompt("gemini_search_prompt").format(source=domain)
+            # Built here, so requests without googleSearch never need a Gemini key
+            tools["google_search"] = lambda: get_gemini_service().search_google(search_prompt, model="gemini-2.0-flash")
+        if request.enableSearch:
+            # The fields are not known to be empty yet, so search for all of them
+            def web_search():
+                search_response = firecrawler.search_data(
+                    input_data=f"{domain} " + " ".join(name.replace("_", " ") for name in field_names))
+                search_response["data"] = filter_text(str(search_response.get("data") or ""), (keywords or []) + field_names)
+                return search_response
+            tools["web_search"] = web_search
+
+        tool_results = run_tools(tools, request.toolDeadlineSeconds)
+        records, other_data = merge_tool_results(
+            tool_results, ["extract", "google_search", "web_search"], list_field=list_field, unique_key=unique_key)
+
+        if other_data:
+            if len(records) == 1:
+                records[0]["other_data"] = other_data
+            elif not records:
+                records = [{"other_data": other_data}]
+            else:
+                logger.info("Dropping unstructured tool output, the records are already a list")
+        first_tool_response = records_response(records, list_field)
+
     # SBA.1.1 --> Google Search Agent
-    if request.googleSearch:
+    elif request.googleSearch:
         logger.info("Extracting data - using google search tool")
         search_prompt = get_prompt("gemini_search_prompt")
         search_prompt = search_prompt.format(source=domain)
-        first_tool_response = gemini_service.search_google(search_prompt, model="gemini-2.0-flash")
+        first_tool_response = get_gemini_service().search_google(search_prompt, model="gemini-2.0-flash")
         # print("---------------------------------SEARCH RESPONSE---------------------------------")
         # print(first_tool_response)
         # print("---------------------------------SEARCH RESPONSE ENDS---------------------------------")
 
-    # SBA.1.2 --> Data Extraction Agent
+    # SBA.1.2 --> Data Extraction Agent: local fetch first, Firecrawl for the pages that need a browser
+    elif request.snifferTool and request.fetchRouter:
+        logger.info("Extracting data - using sniffer tool through the fetch router")
+        first_tool_response = extract_with_fetch_router(
+            request.urls, domain, final_scraper_prompt, model_schema, openai_analyzer,
+            keywords=keywords, list_field=get_list_field(model_schema), unique_key=unique_key, routed=routed)
+
+    # SBA.1.3 --> Data Extraction Agent
     elif request.snifferTool:
         logger.info("Extracting data - using sniffer tool")
         first_tool_response  = firecrawler.extract_data(urls=request.urls, prompt=final_scraper_prompt, schema=model_schema.model_json_schema())
@@ -417,16 +592,17 @@ def sniffer_ai(request: SnifferAIRequest):
         print(request.urls,"<<<--------------->>>",first_tool_response)
         print("---------------------------------SCRAPER RESPONSE ENDS---------------------------------")
     
-    # SBA.1.3 --> Error Handling
+    # SBA.1.4 --> Error Handling
     else:
         logger.info("No tool selected")
         raise HTTPException(status_code=400, detail="No tool selected")
 
     if isinstance(first_tool_response, dict):
         try:
-            first_tool_response = first_tool_response.get("data", {})
-            if "output" in first_tool_response.keys():
-                first_tool_response = first_tool_response.get("output", {})
+            # Tools answer with the records wrapped in the list field, a single record, or a bare list
+            data = first_tool_response.get("data", {})
+            records_field = get_list_field(model_schema) or "output"
+            first_tool_response = data[records_field] if isinstance(data, dict) and records_field in data else data
             
             if isinstance(first_tool_response, list) and len(first_tool_response) == 0:
                 print(":::::::::::::::",request.urls)
@@ -447,8 +623,9 @@ def sniffer_ai(request: SnifferAIRequest):
 
     print("---------------------------------FIRST TOOL RESPONSE ENDs---------------------------------")
     ################################################# Tool 2 #################################################
+    tracker.stage("search_fill")
     # Go forward with the search mode if enabled
-    if request.snifferTool and request.enableSearch:
+    if request.snifferTool and request.enableSearch and not request.parallelTools:
         logger.info("Using sniffer tool for search also")
         if first_tool_response:
             # Check if the first response has any empty keys
@@ -464,7 +641,7 @@ def sniffer_ai(request: SnifferAIRequest):
                 input_data = " ".join(empty_keys)
                 key_search_response = firecrawler.search_data(input_data=input_data)
                 print("---------------------------------KEY SEARCH RESPONSE---------------------------------")
-                first_tool_response["other_data"] = str(key_search_response.get("data", {}))
+                first_tool_response["other_data"] = filter_text(str(key_search_response.get("data", {})), (keywords or []) + empty_keys)
                 second_tool_response = first_tool_response
             else:
                 second_tool_response = first_tool_response
@@ -477,8 +654,30 @@ def sniffer_ai(request: SnifferAIRequest):
 
     print("---------------------------------SECOND TOOL RESPONSE ENDS---------------------------------")
     ################################################## Tool 3 #################################################
+    tracker.stage("refinement")
     # Go forward with the refinement mode if enabled
-    if request.enableRefinement:
+    streamed_result = None
+    # Streaming has to go through the LLM, so when it is asked for it wins over the local rules
+    list_field = get_list_field(model_schema)
+    stream_refinement = bool(request.streamRefinement and list_field)
+    if request.enableRefinement and request.localRefinement and not stream_refinement:
+        logger.info("Local refinement mode enabled")
+        if not second_tool_response:
+            logger.error("No records found for refinement process")
+            raise HTTPException(status_code=400, detail="No records found for refinement process")
+
+        try:
+            # Rule-based normalization, only the fields the rules cannot parse go to the LLM
+            record_model = get_args(model_schema.model_fields[list_field].annotation)[0] if list_field else model_schema
+            records = second_tool_response if isinstance(second_tool_response, list) else [second_tool_response]
+            final_response = refine_records_with_fallback(records, record_model, openai_analyzer, model="gpt-4o-2024-08-06")
+        except Exception as e:
+            logger.error(f"Failed to refine data: {e}")
+            raise HTTPException(status_code=400, detail=f"Failed to refine data: {e}")
+
+        logger.info("---THIRD TOOL RESPONDED")
+
+    elif request.enableRefinement:
         logger.info("Refinement mode enabled")
         # Check if the search response is empty
         if not second_tool_response:
@@ -501,19 +700,44 @@ def sniffer_ai(request: SnifferAIRequest):
             # refinementprompt = refinement_prompt.format(str(cleaned_string))
             print("Refinement prompt: ", refinement_prompt)
 
-            # Structured Response
-            refinement_response = openai_analyzer.structured_output(
-                prompt=f"Please refine the data - {cleaned_string}",
-                response_format=model_schema,
-                model="gpt-4o-2024-08-06"
-            )
-            
-            if refinement_response:
-                final_response = refinement_response.get("data", {})
-                logger.info(f"Parsed response: {final_response}")
+            if stream_refinement:
+                # Streamed Response --> every record is validated and saved while the model is still generating
+                item_model = get_args(model_schema.model_fields[list_field].annotation)[0]
+                ensure_table(table_name, list(item_model.model_fields.keys()), unique_key)
+
+                writer = BatchWriter(database_service, table_name, update_if_exists=update_if_exists)
+                refinement_response = openai_analyzer.stream_structured_output(
+                    prompt=f"Please refine the data - {cleaned_string}",
+                    response_format=model_schema,
+                    model="gpt-4o-2024-08-06",
+                    list_field=list_field,
+                    on_item=writer.add,
+                    collect_items=False,
+                )
+                streamed_result = writer.close()
+                logger.info(f"Streamed refinement: {refinement_response['item_count']} records, save result: {streamed_result}")
+
+                if not refinement_response["item_count"]:
+                    logger.error(f"No records from streamed refinement: {refinement_response['error']}")
+                    raise HTTPException(status_code=400, detail="No response from refinement process")
+                final_response = None
             else:
-                logger.error("No response from refinement process")
-                raise HTTPException(status_code=400, detail="No response from refinement process")
+                # Structured Response
+                refinement_response = openai_analyzer.structured_output(
+                    prompt=f"Please refine the data - {cleaned_string}",
+                    response_format=model_schema,
+                    model="gpt-4o-2024-08-06"
+                )
+
+                if refinement_response:
+                    final_response = refinement_response.get("data", {})
+                    logger.info(f"Parsed response: {final_response}")
+                else:
+                    logger.error("No response from refinement process")
+                    raise HTTPException(status_code=400, detail="No response from refinement process")
+        except HTTPException:
+            # Keep the status and detail of ensure_table and the checks above
+            raise
         except Exception as e:
             logger.error(f"Failed to refine data: {e}")
             raise HTTPException(status_code=400, detail=f"Failed to refine data: {e}")
@@ -524,9 +748,17 @@ def sniffer_ai(request: SnifferAIRequest):
         final_response = second_tool_response
 
     print("---------------------------------THIRD TOOL RESPONSE ENDS---------------------------------")
+    # Streamed records are already saved
+    if streamed_result is not None:
+        logger.info("--DATA SAVED TO DATABASE")
+        return SnifferAIResponse(
+            success=True,
+            message=f"Saved {streamed_result['inserted'] + streamed_result['updated']} streamed records to {table_name}."
+        )
+
     ################################################ Saving to Database #############################################
+    tracker.stage("db_save")
     print("Final Response: ", final_response)
-    breakpoint()
     if not final_response:
         logger.error("No records found for refinement process")
         raise HTTPException(status_code=400, detail="No records found for refinement process")
@@ -538,35 +770,11 @@ def sniffer_ai(request: SnifferAIRequest):
             
         column_names = list(final_response[0].keys())
         print("Column names: ", column_names)
-        breakpoint()
 
-        table_check = database_service.check_table_exists(table_name)
-        print("Table check: ", table_check)
-        print("Table name: ", table_name)
-        print("Unique key: ", unique_key)
-        print("Column names: ", column_names)
-        breakpoint()
-
-        if not table_check:
-            create_table_result = database_service.create_table_from_columns(column_names, table_name, unique_key)
-            logger.info(f"Create table result: {create_table_result}")
-            if create_table_result["status"] == "error":
-                logger.error(f"Failed to generate sql table quert: {create_table_result['message']}")
-                raise HTTPException(status_code=400, detail=f"Failed to generate sql table query: {create_table_result['message']}")
-            else:
-                generate_table_result = database_service.execute_sql_command(create_table_result["sql"])
-                logger.info(f"Generate table result: {generate_table_result}")
-                if generate_table_result["status"] == "error":
-                    logger.error(f"Failed to generate sql table query: {generate_table_result['message']}")
-                    raise HTTPException(status_code=400, detail=f"Failed to generate sql table query: {generate_table_result['message']}")
-                else:
-                    logger.info(f"Table {table_name} created successfully")
-
-        else:
-            logger.info(f"Table {table_name} already exists")
+        ensure_table(table_name, column_names, unique_key)
 
         # database_service.save_unique_data(scrape_result.data, table_name, primary_key, update_if_exists=update_if_exists) 
-        database_save_result = database_service.save_batch_unique_data(final_response, table_name, primary_key, update_if_exists=update_if_exists) 
+        database_save_result = database_service.save_batch_unique_data(final_response, table_name, update_if_exists=update_if_exists) 
         logger.info(f"Database save result: {database_save_result}")
 
         # # Use the interactive table creation approach
@@ -1,7 +1,9 @@
 from fastapi import APIRouter
-from app.api.endpoints import sniffer, scrape_lenders
+from app.api.endpoints import sniffer, scrape_lenders, metrics, crawl_jobs
 
 api_router = APIRouter()
 
 api_router.include_router(sniffer.router)
-api_router.include_router(scrape_lenders.router)
\ No newline at end of file
+api_router.include_router(scrape_lenders.router)
+api_router.include_router(metrics.router)
+api_router.include_router(crawl_jobs.router)
\ No newline at end of file
@@ -26,6 +26,73 @@ class Settings:
     OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-5o-nano")
     OPENAI_TEMPERATURE = float(os.getenv("OPENAI_TEMPERATURE", "0.0"))
     OPENAI_MAX_TOKENS = int(os.getenv("OPENAI_MAX_TOKENS", "1000"))
+    OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL")  # e.g. the local batch stand-in server
+    OPENAI_BATCH_POLL_SECONDS = float(os.getenv("OPENAI_BATCH_POLL_SECONDS", "30"))
+    OPENAI_TIMEOUT_SECONDS = float(os.getenv("OPENAI_TIMEOUT_SECONDS", "120"))
+
+    # Parallel first-stage tools give up on slower tools after this many seconds
+    TOOL_DEADLINE_SECONDS = float(os.getenv("TOOL_DEADLINE_SECONDS", "90"))
+
+    # Export OpenTelemetry traces of the pipeline stages (needs opentelemetry installed)
+    OTEL_TRACES_ENABLED = os.getenv("OTEL_TRACES_ENABLED", "false").lower() == "true"
+
+    # Pages whose JSON-LD, microdata and tables fill this share of the schema skip the LLM
+    STRUCTURED_COVERAGE_THRESHOLD = float(os.getenv("STRUCTURED_COVERAGE_THRESHOLD", "0.6"))
+
+    # Lender fields matched by the rate patterns with this confidence are not asked from the LLM
+    PRE_EXTRACTION_MIN_CONFIDENCE = float(os.getenv("PRE_EXTRACTION_MIN_CONFIDENCE", "0.8"))
+
+    # Fetch router: pages under MIN_TEXT_CHARS of visible text are JS shells, pages under
+    # SHELL_TEXT_CHARS are when they have an empty SPA root, a JavaScript noscript or a low text ratio
+    FETCH_ROUTER_MIN_TEXT_CHARS = int(os.getenv("FETCH_ROUTER_MIN_TEXT_CHARS", "200"))
+    FETCH_ROUTER_SHELL_TEXT_CHARS = int(os.getenv("FETCH_ROUTER_SHELL_TEXT_CHARS", "1500"))
+    FETCH_ROUTER_MIN_TEXT_RATIO = float(os.getenv("FETCH_ROUTER_MIN_TEXT_RATIO", "0.02"))
+    FETCH_ROUTE_TTL_SECONDS = float(os.getenv("FETCH_ROUTE_TTL_SECONDS", "86400"))
+    FETCH_ROUTER_WORKERS = int(os.getenv("FETCH_ROUTER_WORKERS", "4"))
+
+    # Firecrawl crawl jobs: pages are consumed by polling with backoff, or pushed to the webhook
+    # receiver (<public url>/orbit/crawl_jobs/webhook) when FIRECRAWL_WEBHOOK_URL and FIRECRAWL_WEBHOOK_TOKEN are set
+    CRAWL_JOBS_DIR = os.getenv("CRAWL_JOBS_DIR", "crawl_jobs")
+    CRAWL_PAGE_LIMIT = int(os.getenv("CRAWL_PAGE_LIMIT", "100"))
+    CRAWL_PAGE_WORKERS = int(os.getenv("CRAWL_PAGE_WORKERS", "4"))
+    CRAWL_POLL_MIN_SECONDS = float(os.getenv("CRAWL_POLL_MIN_SECONDS", "2"))
+    CRAWL_POLL_MAX_SECONDS = float(os.getenv("CRAWL_POLL_MAX_SECONDS", "30"))
+    FIRECRAWL_WEBHOOK_URL = os.getenv("FIRECRAWL_WEBHOOK_URL")
+    FIRECRAWL_WEBHOOK_TOKEN = os.getenv("FIRECRAWL_WEBHOOK_TOKEN")
+
+    # Per-domain url inventory from map_url, mapped again once older than the TTL
+    URL_INVENTORY_DIR = os.getenv("URL_INVENTORY_DIR", "url_inventory")
+    URL_INVENTORY_TTL_SECONDS = float(os.getenv("URL_INVENTORY_TTL_SECONDS", str(7 * 24 * 3600)))
+    URL_INVENTORY_HISTORY = int(os.getenv("URL_INVENTORY_HISTORY", "20"))
+    URL_INVENTORY_MAX_CANDIDATES = int(os.getenv("URL_INVENTORY_MAX_CANDIDATES", "50"))
+
+    # Identical concurrent sniffer requests, fetches and LLM calls wait for the one in flight;
+    # the cross-process mode coalesces requests across workers through lock files
+    SINGLEFLIGHT_ENABLED = os.getenv("SINGLEFLIGHT_ENABLED", "true").lower() == "true"
+    SINGLEFLIGHT_CROSS_PROCESS = os.getenv("SINGLEFLIGHT_CROSS_PROCESS", "false").lower() == "true"
+    SINGLEFLIGHT_DIR = os.getenv("SINGLEFLIGHT_DIR", "singleflight")
+    SINGLEFLIGHT_WAIT_SECONDS = float(os.getenv("SINGLEFLIGHT_WAIT_SECONDS", "900"))
+
+    # Extra text fields (comma separated names) refined with the number rules, besides the
+    # ones recognized by name (rates, amounts, tenures, scores)
+    REFINEMENT_NUMBER_FIELDS = os.getenv("REFINEMENT_NUMBER_FIELDS", "")
+
+    # Grounded Gemini search answers: fresh for the TTL, then served while refreshed in the
+    # background up to MAX_STALE, searched again before answering after that
+    SEARCH_CACHE_ENABLED = os.getenv("SEARCH_CACHE_ENABLED", "true").lower() == "true"
+    SEARCH_CACHE_DIR = os.getenv("SEARCH_CACHE_DIR", "search_cache")
+    SEARCH_CACHE_TTL_SECONDS = float(os.getenv("SEARCH_CACHE_TTL_SECONDS", "86400"))
+    SEARCH_CACHE_MAX_STALE_SECONDS = float(os.getenv("SEARCH_CACHE_MAX_STALE_SECONDS", str(7 * 24 * 3600)))
+
+    # Streamed refinement is saved in batches of this many records
+    STREAM_SAVE_BATCH_SIZE = int(os.getenv("STREAM_SAVE_BATCH_SIZE", "25"))
+
+    # Record/replay of provider calls for offline load tests: off, record or replay
+    REPLAY_MODE = os.getenv("REPLAY_MODE", "off").lower()
+    REPLAY_DIR = os.getenv("REPLAY_DIR", "replay_recordings")
+    REPLAY_LATENCY = os.getenv("REPLAY_LATENCY", "default=recorded")
+    REPLAY_LATENCY_SCALE = float(os.getenv("REPLAY_LATENCY_SCALE", "1.0"))
+    REPLAY_SEED = int(os.getenv("REPLAY_SEED", "0"))
 
     # Supabase Configuration
     SUPABASE_URL = os.getenv("SUPABASE_URL")
@@ -34,6 +101,40 @@ class Settings:
     # Gemini API Key
     GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 
+    # Extraction chunking configuration
+    EXTRACTION_CHUNK_MAX_TOKENS = int(os.getenv("EXTRACTION_CHUNK_MAX_TOKENS", "60000"))
+    EXTRACTION_MAX_WORKERS = int(os.getenv("EXTRACTION_MAX_WORKERS", "4"))
+
+    # Relevance pre-filter configuration, the filtered lender corpus is chunked into
+    # RELEVANCE_TOKEN_BUDGET / EXTRACTION_MAX_WORKERS tokens (capped at EXTRACTION_CHUNK_MAX_TOKENS)
+    RELEVANCE_TOKEN_BUDGET = int(os.getenv("RELEVANCE_TOKEN_BUDGET", "20000"))
+    RELEVANCE_TOP_K = int(os.getenv("RELEVANCE_TOP_K", "200"))
+    RELEVANCE_EMBEDDING_MODEL = os.getenv("RELEVANCE_EMBEDDING_MODEL", "")
+
+    # Missing field search configuration
+    SEARCH_REQUESTS_PER_MINUTE = int(os.getenv("SEARCH_REQUESTS_PER_MINUTE", "60"))
+    SEARCH_MAX_WORKERS = int(os.getenv("SEARCH_MAX_WORKERS", "4"))
+    SEARCH_MAX_FIELDS_PER_QUERY = int(os.getenv("SEARCH_MAX_FIELDS_PER_QUERY", "10"))
+
+    # Provider rate limits and retry configuration
+    OPENAI_REQUESTS_PER_MINUTE = int(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500"))
+    OPENAI_TOKENS_PER_MINUTE = int(os.getenv("OPENAI_TOKENS_PER_MINUTE", "200000"))
+    GEMINI_REQUESTS_PER_MINUTE = int(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+    GEMINI_TOKENS_PER_MINUTE = int(os.getenv("GEMINI_TOKENS_PER_MINUTE", "1000000"))
+    FIRECRAWL_REQUESTS_PER_MINUTE = int(os.getenv("FIRECRAWL_REQUESTS_PER_MINUTE", "100"))
+    FIRECRAWL_EXTRACT_SHARD_SIZE = int(os.getenv("FIRECRAWL_EXTRACT_SHARD_SIZE", "10"))
+    FIRECRAWL_EXTRACT_CONCURRENCY = int(os.getenv("FIRECRAWL_EXTRACT_CONCURRENCY", "4"))
+    FIRECRAWL_EXTRACT_SHARD_RETRIES = int(os.getenv("FIRECRAWL_EXTRACT_SHARD_RETRIES", "1"))
+    HTTP_REQUESTS_PER_MINUTE = int(os.getenv("HTTP_REQUESTS_PER_MINUTE", "120"))
+    HTTP_HOST_REQUESTS_PER_MINUTE = int(os.getenv("HTTP_HOST_REQUESTS_PER_MINUTE", "60"))
+    HTTP_POOL_MAX_CONNECTIONS = int(os.getenv("HTTP_POOL_MAX_CONNECTIONS", "100"))
+    HTTP_POOL_MAX_KEEPALIVE = int(os.getenv("HTTP_POOL_MAX_KEEPALIVE", "20"))
+    API_MAX_RETRIES = int(os.getenv("API_MAX_RETRIES", "4"))
+    API_RETRY_BASE_DELAY = float(os.getenv("API_RETRY_BASE_DELAY", "1.0"))
+    API_RETRY_MAX_DELAY = float(os.getenv("API_RETRY_MAX_DELAY", "60"))
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5"))
+    CIRCUIT_RESET_SECONDS = float(os.getenv("CIRCUIT_RESET_SECONDS", "30"))
+
 
 
 # Global Settings Instance
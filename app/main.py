@@ -1,8 +1,10 @@
 import sys
 import logging
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from app.config.settings import settings
 from app.api.routes import api_router
+from app.services.crawl_jobs import crawl_job_manager
 
 logging.basicConfig(
     level=logging.INFO,
@@ -15,10 +17,21 @@ logging.basicConfig(
 
 logger = logging.getLogger(__name__)
 
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Crawl jobs interrupted by a restart carry on from their first unprocessed page
+    resumed = crawl_job_manager.resume_all()
+    if resumed:
+        logger.info(f"Resumed {len(resumed)} crawl job(s)")
+    yield
+
+
 app = FastAPI(
     title=settings.API_TITLE,
     description=settings.API_DESCRIPTION,
     version=settings.API_VERSION,
+    lifespan=lifespan,
 )
 
 app.include_router(api_router, prefix="/orbit")
@@ -55,7 +55,7 @@ class GenerateConfigAgentRequest(BaseModel):
 
 ############################### Sniffer AI Schemas ####################################
 class SnifferAIRequest(BaseModel):
-    # entity: Optional[str] = Field(None, description="The entity to scrape")
+    entity: Optional[str] = Field(None, description="The entity to scrape")
     urls: Optional[List[str]] = Field(None, description="The url to scrape")
     prompt: Optional[str] = Field(None, description="The prompt to scrape the data")
     # source: Optional[str] = Field(None, description="Type of data to extract") # "lenders", "banking"
@@ -64,11 +64,24 @@ class SnifferAIRequest(BaseModel):
     enableSearch: Optional[bool] = Field(False, description="Whether to enable search")
     enableRefinement: Optional[bool] = Field(False, description="Whether to enable refinement")
     keywordsToSearch: Optional[List[str]] = Field(None, description="The keywords to search")
+    structuredFastPath: Optional[bool] = Field(False, description="Whether the sniffer tool reads JSON-LD, microdata and tables first and skips the tools when they cover the schema")
+    fetchRouter: Optional[bool] = Field(True, description="Whether the sniffer tool fetches pages locally and only sends JavaScript rendered pages to Firecrawl")
+    localRefinement: Optional[bool] = Field(True, description="Whether to normalize the records with the local rules and only send unparsed fields to the LLM")
+    streamRefinement: Optional[bool] = Field(False, description="Whether to stream the refinement through the LLM and save records as they arrive (takes precedence over localRefinement)")
+    parallelTools: Optional[bool] = Field(False, description="Whether to run the enabled tools concurrently and merge their outputs")
+    toolDeadlineSeconds: Optional[float] = Field(None, description="Seconds to wait for parallel tools before using partial results")
 
 class SnifferAIResponse(BaseModel):
     success: bool = Field(..., description="Whether the request was successful")
     message: str = Field(..., description="The message from the response")
 
+############################### Crawl Job Schemas ####################################
+class CrawlJobRequest(BaseModel):
+    url: str = Field(..., description="The lender site to crawl")
+    lenderName: Optional[str] = Field(None, description="The lender name used in the extraction prompt")
+    keywordsToSearch: Optional[List[str]] = Field(None, description="The keywords the crawled pages are filtered by")
+    limit: Optional[int] = Field(None, description="Maximum pages to crawl, CRAWL_PAGE_LIMIT by default")
+
 ############################### Analyze Query Schemas ####################################
 class AnalyzeQueryResponse(BaseModel):
     responseContent: str = Field(..., description="The response content")
@@ -0,0 +1,202 @@
+"""
+Token-aware chunking helpers for large page corpora
+"""
+
+import logging
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Values the extraction prompts use for a field that could not be found
+NOT_FOUND_VALUES = ["not found", "not found.", "n/a", "none", "null", ""]
+
+# Rough characters-per-token ratio used when no local tokenizer is available
+CHARS_PER_TOKEN = 4
+
+
+@lru_cache(maxsize=8)
+def get_encoder(model: Optional[str] = None):
+    """
+    Get a local tiktoken encoder for the given model
+
+    Args:
+        model (str): Model name used to pick the encoding
+
+    Returns:
+        Encoding object or None if tiktoken is not installed
+    """
+    try:
+        import tiktoken
+    except ImportError:
+        logger.warning("tiktoken is not installed, falling back to character based token estimates")
+        return None
+
+    try:
+        try:
+            return tiktoken.encoding_for_model(model) if model else tiktoken.get_encoding("o200k_base")
+        except KeyError:
+            return tiktoken.get_encoding("o200k_base")
+    except Exception as e:
+        # Encodings are downloaded on first use, which fails on offline hosts
+        logger.warning(f"tiktoken encoding unavailable ({e}), falling back to character based token estimates")
+        return None
+
+
+def count_tokens(text: str, model: Optional[str] = None) -> int:
+    """
+    Count the tokens in a text using a local tokenizer
+
+    Args:
+        text (str): Text to count
+        model (str): Model name used to pick the encoding
+
+    Returns:
+        int: Number of tokens
+    """
+    if not text:
+        return 0
+
+    encoder = get_encoder(model)
+    if encoder is None:
+        return len(text) // CHARS_PER_TOKEN + 1
+    return len(encoder.encode(text, disallowed_special=()))
+
+
+def build_sections(extracted_data: Dict[str, str]) -> List[str]:
+    """
+    Build one section per source page, dropping lines already seen on earlier pages
+
+    Args:
+        extracted_data (dict): Page text keyed by source url
+
+    Returns:
+        list: Section strings, each prefixed with its source url
+    """
+    seen_lines = set()
+    sections = []
+
+    for url, value in extracted_data.items():
+        lines = []
+        for line in value.split("\n"):
+            cleaned = line.strip()
+            if cleaned and cleaned not in seen_lines:
+                seen_lines.add(cleaned)
+                lines.append(cleaned)
+
+        if lines:
+            sections.append(f"Source: {url}\n" + "\n".join(lines))
+
+    return sections
+
+
+def _split_oversized_section(section: str, max_tokens: int, model: Optional[str] = None) -> List[str]:
+    """Split a single section that does not fit in one chunk on line boundaries"""
+    header, _, body = section.partition("\n")
+    pieces = []
+    header_tokens = count_tokens(header, model)
+    current = [header]
+    current_tokens = header_tokens
+
+    for line in body.split("\n"):
+        line_tokens = count_tokens(line, model) + 1
+
+        # A single line bigger than the budget gets hard split by characters
+        if line_tokens + header_tokens > max_tokens:
+            max_chars = max(max_tokens - header_tokens - 1, 1) * CHARS_PER_TOKEN
+            line_parts = [line[i:i + max_chars] for i in range(0, len(line), max_chars)]
+        else:
+            line_parts = [line]
+
+        for part in line_parts:
+            part_tokens = count_tokens(part, model) + 1
+            if current_tokens + part_tokens > max_tokens and len(current) > 1:
+                pieces.append("\n".join(current))
+                current = [header]
+                current_tokens = header_tokens
+            current.append(part)
+            current_tokens += part_tokens
+
+    if len(current) > 1:
+        pieces.append("\n".join(current))
+    return pieces
+
+
+def chunk_sections(sections: List[str], max_tokens: int, model: Optional[str] = None) -> List[str]:
+    """
+    Pack sections into chunks that fit within a token budget
+
+    Sections are kept whole where possible and only split on line boundaries when
+    a single section is bigger than the budget.
+
+    Args:
+        sections (list): Section strings
+        max_tokens (int): Maximum tokens per chunk
+        model (str): Model name used to pick the encoding
+
+    Returns:
+        list: Chunk strings
+    """
+    chunks = []
+    current = []
+    current_tokens = 0
+
+    for section in sections:
+        section_tokens = count_tokens(section, model)
+
+        if section_tokens > max_tokens:
+            if current:
+                chunks.append("\n\n".join(current))
+                current, current_tokens = [], 0
+            chunks.extend(_split_oversized_section(section, max_tokens, model))
+            continue
+
+        if current_tokens + section_tokens > max_tokens and current:
+            chunks.append("\n\n".join(current))
+            current, current_tokens = [], 0
+
+        current.append(section)
+        current_tokens += section_tokens
+
+    if current:
+        chunks.append("\n\n".join(current))
+
+    logger.info(f"Split {len(sections)} sections into {len(chunks)} chunks of at most {max_tokens} tokens")
+    return chunks
+
+
+def is_not_found(value) -> bool:
+    """Check whether an extracted value is empty or a "Not Found" placeholder"""
+    if value is None:
+        return True
+    if isinstance(value, (list, dict)):
+        return len(value) == 0
+    return str(value).strip().lower() in NOT_FOUND_VALUES
+
+
+def merge_extractions(results: List[dict]) -> dict:
+    """
+    Reconcile per-chunk extraction outputs field by field
+
+    The first value that is not "Not Found" wins for scalar fields, list fields are
+    unioned in order.
+
+    Args:
+        results (list): Per-chunk extraction dicts, in chunk order
+
+    Returns:
+        dict: Merged extraction
+    """
+    merged = {}
+
+    for result in results:
+        if not result:
+            continue
+        for key, value in result.items():
+            if isinstance(value, list):
+                existing = merged.get(key) or []
+                merged[key] = existing + [item for item in value if item not in existing]
+            elif key not in merged or (is_not_found(merged[key]) and not is_not_found(value)):
+                merged[key] = value
+
+    return merged
@@ -0,0 +1,92 @@
+"""
+Shared, lazily-initialized API clients
+
+Clients are built on first use instead of at import, and every service of a provider
+reuses the same client (and therefore the same connection pool).
+"""
+
+import logging
+import threading
+from typing import Callable, Dict
+
+from app.config.settings import settings
+from app.services.replay import offline_api_key
+
+logger = logging.getLogger(__name__)
+
+_clients: Dict[str, object] = {}
+_clients_lock = threading.Lock()
+
+
+def _get_or_create(name: str, factory: Callable):
+    """Return the shared client called `name`, creating it once under a lock"""
+    client = _clients.get(name)
+    if client is None:
+        with _clients_lock:
+            client = _clients.get(name)
+            if client is None:
+                client = factory()
+                _clients[name] = client
+                logger.info(f"Initialized shared {name} client")
+    return client
+
+
+def get_openai_client():
+    """Shared OpenAI client with a tuned keep-alive connection pool"""
+    def create():
+        import httpx
+        from openai import OpenAI, DefaultHttpxClient
+
+        api_key = offline_api_key(settings.OPENAI_API_KEY)
+        if not api_key:
+            raise ValueError("OPENAI_API_KEY is required")
+
+        http_client = DefaultHttpxClient(
+            limits=httpx.Limits(
+                max_connections=settings.HTTP_POOL_MAX_CONNECTIONS,
+                max_keepalive_connections=settings.HTTP_POOL_MAX_KEEPALIVE,
+            ),
+            timeout=settings.OPENAI_TIMEOUT_SECONDS,
+        )
+        # Retries are owned by the shared provider limiter
+        return OpenAI(
+            api_key=api_key,
+            base_url=settings.OPENAI_BASE_URL,
+            max_retries=0,
+            http_client=http_client,
+        )
+
+    return _get_or_create("openai", create)
+
+
+def get_gemini_client():
+    """Shared Google Gemini client"""
+    def create():
+        from google import genai
+
+        api_key = offline_api_key(settings.GEMINI_API_KEY)
+        if not api_key:
+            logger.error("❌ GEMINI_API_KEY not found in environment variables")
+            raise ValueError("GEMINI_API_KEY is required")
+        return genai.Client(api_key=api_key)
+
+    return _get_or_create("gemini", create)
+
+
+def reset_clients():
+    """Drop every shared client so the next call builds a fresh one (used by tests)"""
+    with _clients_lock:
+        _clients.clear()
+
+
+class LazyProxy:
+    """Stands in for a shared service and only builds it when it is first used"""
+
+    def __init__(self, factory: Callable):
+        object.__setattr__(self, "_factory", factory)
+
+    def __getattr__(self, name):
+        return getattr(self._factory(), name)
+
+    def __setattr__(self, name, value):
+        setattr(self._factory(), name, value)
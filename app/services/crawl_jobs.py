@@ -0,0 +1,357 @@
+"""
+Firecrawl crawl jobs consumed page by page while the crawl is still running
+
+A crawl is started asynchronously and its pages are handed to an `on_page`
+callback as soon as Firecrawl reports them, either by polling the crawl status
+with backoff or through the token protected webhook receiver (FIRECRAWL_WEBHOOK_URL). The
+callbacks run on a worker pool, so extraction overlaps with the crawl.
+
+The state of every job (crawl id, pages processed, status) is saved under
+CRAWL_JOBS_DIR. `skip` only moves past pages whose callback has finished, so a
+job interrupted by a restart is resumed from the first page it had not processed
+(pages processed ahead of it may be handed over again). Jobs started with a
+registered `kind` get their callbacks rebuilt from their saved state, which is how
+resume_all() picks them up on startup. Running jobs can be cancelled.
+"""
+
+import os
+import json
+import queue
+import uuid
+import logging
+import tempfile
+import threading
+from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.config.settings import settings
+from app.services.crawlers import firecrawler
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = {"completed", "failed", "cancelled"}
+
+# on_page(page) for every crawled page, on_done(state) once all of them are processed;
+# what on_done returns is saved as the "result" of the job
+Callbacks = Tuple[Callable[[dict], None], Optional[Callable[[dict], Optional[dict]]]]
+
+
+def normalize_page(document: dict) -> dict:
+    """Crawled document as {"url", "markdown", "metadata"}"""
+    metadata = document.get("metadata") or {}
+    return {
+        "url": metadata.get("sourceURL") or metadata.get("url") or document.get("url"),
+        "markdown": document.get("markdown") or "",
+        "metadata": metadata,
+    }
+
+
+class CrawlJobStore:
+    """One JSON file per job under <root>/<job_id>.json"""
+
+    def __init__(self, root: str):
+        self.root = root
+
+    def path(self, job_id: str) -> str:
+        return os.path.join(self.root, f"{job_id}.json")
+
+    def save(self, state: dict):
+        os.makedirs(self.root, exist_ok=True)
+        # Write to a temporary file first so a crash never leaves half a job file
+        with tempfile.NamedTemporaryFile("w", dir=self.root, suffix=".tmp", delete=False, encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(f.name, self.path(state["job_id"]))
+
+    def load(self, job_id: str) -> Optional[dict]:
+        path = self.path(job_id)
+        if not os.path.exists(path):
+            return None
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+
+    def list(self) -> List[dict]:
+        if not os.path.isdir(self.root):
+            return []
+        return [self.load(name[:-5]) for name in sorted(os.listdir(self.root)) if name.endswith(".json")]
+
+
+class CrawlJob:
+    """A running crawl: its persisted state, the pages pushed by the webhook and its cancel flag"""
+
+    def __init__(self, state: dict):
+        self.state = state
+        # Offset of the next document to read; `skip` in the state trails it until the pages are processed
+        self.cursor = state["skip"]
+        self.processed_ahead = set()
+        self.pages: "queue.Queue[dict]" = queue.Queue()
+        self.cancelled = threading.Event()
+        self.done = threading.Event()
+        self.lock = threading.Lock()
+
+    @property
+    def job_id(self) -> str:
+        return self.state["job_id"]
+
+
+class CrawlJobManager:
+    def __init__(self, crawler=None, store: CrawlJobStore = None):
+        self.crawler = crawler or firecrawler
+        self.store = store or CrawlJobStore(settings.CRAWL_JOBS_DIR)
+        self.jobs: Dict[str, CrawlJob] = {}
+        self.by_crawl_id: Dict[str, CrawlJob] = {}
+        self.kinds: Dict[str, Callable[[dict], Callbacks]] = {}
+        self.lock = threading.Lock()
+
+    def register(self, kind: str, callbacks: Callable[[dict], Callbacks]):
+        """Build the (on_page, on_done) callbacks of the jobs of a kind from their state"""
+        self.kinds[kind] = callbacks
+
+    ########################################## Lifecycle ##########################################
+    def start(self, url: str, on_page: Callable[[dict], None] = None, limit: int = None, max_depth: int = 2,
+              on_done: Callable[[dict], Optional[dict]] = None, kind: str = None, params: dict = None) -> dict:
+        """
+        Start a crawl and consume its pages in the background
+
+        Args:
+            url (str): Site to crawl
+            on_page (callable): Called with every crawled page ({"url", "markdown", "metadata"}),
+                from a worker thread
+            limit (int): Maximum pages to crawl
+            max_depth (int): Maximum link depth from `url`
+            on_done (callable): Called with the job state once every page is processed,
+                its return value is saved as the job's "result"
+            kind (str): Registered kind whose callbacks are used (and rebuilt on resume)
+                instead of on_page / on_done
+            params (dict): Saved with the job for the callbacks of its kind
+
+        Returns:
+            dict: Job state, "status" is "failed" when the crawl could not be started
+        """
+        job_id = uuid.uuid4().hex
+        webhook = None
+        if settings.FIRECRAWL_WEBHOOK_URL and not settings.FIRECRAWL_WEBHOOK_TOKEN:
+            # The receiver refuses unauthenticated pushes, so the crawl is polled instead
+            logger.error("FIRECRAWL_WEBHOOK_URL is set without FIRECRAWL_WEBHOOK_TOKEN, polling the crawl instead")
+        elif settings.FIRECRAWL_WEBHOOK_URL:
+            webhook = {
+                "url": settings.FIRECRAWL_WEBHOOK_URL,
+                "headers": {"X-Webhook-Token": settings.FIRECRAWL_WEBHOOK_TOKEN},
+                "metadata": {"job_id": job_id},
+                "events": ["page", "completed", "failed"],
+            }
+
+        response = self.crawler.start_crawl(url, limit=limit or settings.CRAWL_PAGE_LIMIT, max_depth=max_depth, webhook=webhook)
+        now = datetime.now().isoformat()
+        state = {
+            "job_id": job_id,
+            "crawl_id": response.get("id"),
+            "url": url,
+            "kind": kind,
+            "params": params or {},
+            "mode": "webhook" if webhook else "poll",
+            "status": "scraping" if response.get("success") else "failed",
+            "skip": 0,
+            "pages_received": 0,
+            "pages_processed": 0,
+            "pages_failed": 0,
+            "total": None,
+            "error": response.get("error"),
+            "created_at": now,
+            "updated_at": now,
+        }
+        self.store.save(state)
+        if state["status"] == "failed":
+            print(f"❌ Crawl of {url} could not be started: {state['error']}")
+            return state
+
+        print(f"🕷️ Crawl job {job_id} started for {url} ({state['mode']} mode)")
+        if kind:
+            on_page, on_done = self.kinds[kind](state)
+        self._run(CrawlJob(state), on_page, on_done)
+        return dict(state)
+
+    def resume(self, job_id: str, on_page: Callable[[dict], None] = None,
+               on_done: Callable[[dict], Optional[dict]] = None) -> Optional[dict]:
+        """Continue consuming a persisted job from its first unprocessed page, e.g. after a restart"""
+        state = self.store.load(job_id)
+        if not state or (state["status"] in FINAL_STATUSES and state.get("drained")):
+            return state
+        if job_id in self.jobs and not self.jobs[job_id].done.is_set():
+            return dict(self.jobs[job_id].state)
+        if on_page is None:
+            if state.get("kind") not in self.kinds:
+                logger.warning(f"Crawl job {job_id} has no callbacks to resume with")
+                return state
+            on_page, on_done = self.kinds[state["kind"]](state)
+        # Webhook pages sent while nothing was listening are only available by polling;
+        # the webhook count is used as the offset, as both follow the crawl order
+        state["mode"] = "poll"
+        print(f"🕷️ Crawl job {job_id} resumed from page {state['skip']}")
+        self._run(CrawlJob(state), on_page, on_done)
+        return dict(state)
+
+    def resume_all(self) -> List[dict]:
+        """Resume every unfinished job of a registered kind, e.g. on startup"""
+        resumed = []
+        for state in self.store.list():
+            unfinished = state and not (state["status"] in FINAL_STATUSES and state.get("drained"))
+            if unfinished and state.get("crawl_id") and state.get("kind") in self.kinds:
+                resumed.append(self.resume(state["job_id"]))
+        return resumed
+
+    def cancel(self, job_id: str) -> Optional[dict]:
+        """Cancel the crawl on Firecrawl and stop handing its pages to the callback"""
+        job = self.jobs.get(job_id)
+        state = job.state if job else self.store.load(job_id)
+        if not state:
+            return None
+        if state.get("crawl_id") and state["status"] not in FINAL_STATUSES:
+            self.crawler.cancel_crawl(state["crawl_id"])
+        if job:
+            job.cancelled.set()
+            job.pages.put(None)
+        self._update(job, state, status="cancelled")
+        return dict(state)
+
+    def status(self, job_id: str) -> Optional[dict]:
+        job = self.jobs.get(job_id)
+        return dict(job.state) if job else self.store.load(job_id)
+
+    def list(self) -> List[dict]:
+        return self.store.list()
+
+    def wait(self, job_id: str, timeout: float = None) -> Optional[dict]:
+        """Block until every page of the job has been processed"""
+        job = self.jobs.get(job_id)
+        if job:
+            job.done.wait(timeout)
+        return self.status(job_id)
+
+    ########################################## Webhook ##########################################
+    def handle_webhook(self, payload: dict) -> bool:
+        """
+        Route a Firecrawl webhook event to its job
+
+        Returns:
+            bool: Whether the event belonged to a running job
+        """
+        job_id = (payload.get("metadata") or {}).get("job_id")
+        job = self.jobs.get(job_id) or self.by_crawl_id.get(payload.get("id"))
+        if not job or job.done.is_set():
+            return False
+
+        event = (payload.get("type") or "").replace("crawl.", "")
+        if event == "page":
+            for document in payload.get("data") or []:
+                job.pages.put(normalize_page(document))
+        elif event in ("completed", "failed"):
+            self._update(job, job.state, status=event, error=payload.get("error"))
+            job.pages.put(None)
+        return True
+
+    ########################################## Consumption ##########################################
+    def _run(self, job: CrawlJob, on_page: Callable[[dict], None], on_done: Callable[[dict], Optional[dict]] = None):
+        with self.lock:
+            self.jobs[job.job_id] = job
+            if job.state.get("crawl_id"):
+                self.by_crawl_id[job.state["crawl_id"]] = job
+        consume = self._consume_webhook if job.state["mode"] == "webhook" else self._consume_polling
+        threading.Thread(target=self._consume, args=(job, on_page, on_done, consume), name=f"crawl-{job.job_id[:8]}", daemon=True).start()
+
+    def _consume(self, job: CrawlJob, on_page: Callable[[dict], None], on_done: Optional[Callable], consume: Callable):
+        executor = ThreadPoolExecutor(max_workers=settings.CRAWL_PAGE_WORKERS)
+
+        def process(page: dict, offset: int):
+            if job.cancelled.is_set():
+                return
+            try:
+                on_page(page)
+                self._update(job, job.state, increment="pages_processed", processed=offset)
+            except Exception as e:
+                logger.error(f"Crawl job {job.job_id}: processing {page.get('url')} failed: {e}")
+                self._update(job, job.state, increment="pages_failed", processed=offset)
+
+        try:
+            consume(job, lambda page, offset: executor.submit(process, page, offset))
+        except Exception as e:
+            logger.error(f"Crawl job {job.job_id} stopped: {e}")
+            self._update(job, job.state, status="failed", error=str(e))
+        finally:
+            executor.shutdown(wait=True)
+            if on_done and not job.cancelled.is_set():
+                try:
+                    self._update(job, job.state, result=on_done(dict(job.state)))
+                except Exception as e:
+                    logger.error(f"Crawl job {job.job_id}: finishing failed: {e}")
+                    self._update(job, job.state, error=str(e))
+            self._update(job, job.state, drained=True)
+            job.done.set()
+            print(f"🕷️ Crawl job {job.job_id} {job.state['status']}: {job.state['pages_processed']} page(s) processed")
+
+    def _consume_polling(self, job: CrawlJob, submit: Callable[[dict, int], None]):
+        delay = settings.CRAWL_POLL_MIN_SECONDS
+        while not job.cancelled.is_set():
+            try:
+                status = self.crawler.crawl_status_page(job.state["crawl_id"], skip=job.cursor)
+            except Exception as e:
+                logger.warning(f"Crawl job {job.job_id}: status check failed, retrying in {delay:.1f}s: {e}")
+                job.cancelled.wait(delay)
+                delay = min(delay * 2, settings.CRAWL_POLL_MAX_SECONDS)
+                continue
+
+            documents = status.get("data") or []
+            for document in documents:
+                submit(normalize_page(document), job.cursor)
+                job.cursor += 1
+            self._update(job, job.state, status=status.get("status") or job.state["status"], total=status.get("total"),
+                         increment="pages_received", count=len(documents))
+
+            if documents and status.get("next"):
+                # More documents are already available, fetch them without waiting
+                continue
+            if job.state["status"] in FINAL_STATUSES:
+                return
+            # Back off while the crawl makes no progress, poll quickly again once it does
+            delay = settings.CRAWL_POLL_MIN_SECONDS if documents else min(delay * 1.5, settings.CRAWL_POLL_MAX_SECONDS)
+            job.cancelled.wait(delay)
+
+    def _consume_webhook(self, job: CrawlJob, submit: Callable[[dict, int], None]):
+        # Without events for this long, fall back to polling in case the webhook cannot reach us
+        silence_limit = settings.CRAWL_POLL_MAX_SECONDS * 4
+        while not job.cancelled.is_set():
+            try:
+                page = job.pages.get(timeout=silence_limit)
+            except queue.Empty:
+                logger.warning(f"Crawl job {job.job_id}: no webhook events for {silence_limit:.0f}s, polling instead")
+                self._update(job, job.state, mode="poll")
+                return self._consume_polling(job, submit)
+            if page is None:
+                return
+            submit(page, job.cursor)
+            job.cursor += 1
+            self._update(job, job.state, increment="pages_received")
+
+    def _update(self, job: Optional[CrawlJob], state: dict, increment: str = None, count: int = 1,
+                processed: int = None, **changes):
+        lock = job.lock if job else self.lock
+        with lock:
+            if state.get("status") == "cancelled":
+                changes.pop("status", None)
+            state.update({key: value for key, value in changes.items() if value is not None})
+            if increment:
+                state[increment] = state.get(increment, 0) + count
+            if processed is not None and job:
+                # Pages finish out of order, `skip` only covers the unbroken run of processed ones
+                job.processed_ahead.add(processed)
+                while state["skip"] in job.processed_ahead:
+                    job.processed_ahead.remove(state["skip"])
+                    state["skip"] += 1
+            state["updated_at"] = datetime.now().isoformat()
+            try:
+                self.store.save(state)
+            except Exception as e:
+                logger.warning(f"Could not save crawl job {state['job_id']}: {e}")
+
+
+crawl_job_manager = CrawlJobManager()
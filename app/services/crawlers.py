@@ -1,60 +1,196 @@
 import requests
+import threading
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
 from typing import Optional, List
-from firecrawl import FirecrawlApp, ScrapeOptions
 from app.config.settings import settings
+from app.services.clients import LazyProxy
+from app.services.singleflight import coalesced
+from app.services.replay import offline_api_key, replayable
+from app.services.chunking import merge_extractions
+from app.utils.metrics import track_call
+from app.utils.rate_limiter import get_provider_limiter, RETRYABLE_STATUS_CODES
+
+# Extract jobs running at once across every request, Firecrawl's concurrency quota
+_extract_slots = threading.BoundedSemaphore(max(settings.FIRECRAWL_EXTRACT_CONCURRENCY, 1))
+
+
+def merge_extract_payloads(payloads: list):
+    """Merge the `data` of several extract jobs, list payloads are concatenated"""
+    payloads = [payload for payload in payloads if payload]
+    if payloads and all(isinstance(payload, list) for payload in payloads):
+        return [item for payload in payloads for item in payload]
+    return merge_extractions([payload for payload in payloads if isinstance(payload, dict)])
 
 
 class FirecrawlCrawler:
     def __init__(self):
-        self.api_key = settings.FIRECRAWL_API_KEY
+        from firecrawl import FirecrawlApp
+
+        self.api_key = offline_api_key(settings.FIRECRAWL_API_KEY)
         self.app = FirecrawlApp(api_key=self.api_key)
+        self.limiter = get_provider_limiter("firecrawl")
 
         if not self.api_key:
             raise ValueError("FIRECRAWL_API_KEY is not set")
         if not self.app:
             raise ValueError("Failed to initialize FirecrawlApp")
 
+    @coalesced("firecrawl", "scrape_url")
+    @track_call("crawler", "scrape_url")
+    @replayable("firecrawl", "scrape_url")
     def scrape_url(self, url: str, formats= ['markdown', 'html'], json_options=None, only_main_content=True, timeout=30000):
         try:
-            response = self.app.scrape_url(
+            response = self.limiter.run(lambda: self.app.scrape_url(
                 url, 
                 formats=formats, 
                 json_options=json_options, 
                 only_main_content=only_main_content, 
-                timeout=timeout)
+                timeout=timeout))
             return response
         except Exception as e:
             print(f"Error scraping {url}: {e}")
             return None
 
+    @coalesced("firecrawl", "url_map")
+    @track_call("crawler", "url_map")
+    @replayable("firecrawl", "url_map")
     def url_map (self, url: str):
         try:
-            response = self.app.map_url(url)
+            response = self.limiter.run(lambda: self.app.map_url(url))
             return response
         except Exception as e:
             print(f"Error mapping {url}: {e}")
             return None
 
 
+    @track_call("crawler", "url_crawler")
+    @replayable("firecrawl", "url_crawler")
     def url_crawler(self, url: str, limit=10):
+        from firecrawl import ScrapeOptions
+
         try:
-            response = self.app.crawl_url(url, limit=limit, scrape_options=ScrapeOptions(format=['markdown', 'html']))
+            response = self.limiter.run(
+                lambda: self.app.crawl_url(url, limit=limit, scrape_options=ScrapeOptions(formats=['markdown', 'html']))
+            )
             return response
         except Exception as e:
             print(f"Error crawling {url}: {e}")
             return None
 
+    @track_call("crawler", "check_crawl_status")
+    @replayable("firecrawl", "check_crawl_status")
     def check_crawl_status(self, crawl_id: str):
         try:
-            response = self.app.get_crawl_status(crawl_id)
+            response = self.limiter.run(lambda: self.app.check_crawl_status(crawl_id))
             return response
         except Exception as e:
             print(f"Error checking crawl status {crawl_id}: {e}")
             return None
 
+    @track_call("crawler", "start_crawl")
+    @replayable("firecrawl", "start_crawl")
+    def start_crawl(self, url: str, limit: int = 100, max_depth: int = 2, webhook: dict = None):
+        """Start a crawl without waiting for it, the pages are read with crawl_status_page or a webhook"""
+        from firecrawl import ScrapeOptions
+
+        try:
+            response = self.limiter.run(lambda: self.app.async_crawl_url(
+                url,
+                limit=limit,
+                max_discovery_depth=max_depth,
+                scrape_options=ScrapeOptions(formats=['markdown'], onlyMainContent=True),
+                webhook=webhook,
+                ))
+            return {"success": response.success, "id": response.id, "error": response.error}
+        except Exception as e:
+            print(f"Error starting crawl of {url}: {e}")
+            return {"success": False, "id": None, "error": str(e)}
+
+    @track_call("crawler", "crawl_status_page")
+    @replayable("firecrawl", "crawl_status_page")
+    def crawl_status_page(self, crawl_id: str, skip: int = 0):
+        """
+        One page of a crawl's status, starting at the `skip`-th crawled document
+
+        The SDK's check_crawl_status follows every `next` link of a completed crawl,
+        so polling with it downloads all the documents again on every call.
+        """
+        url = f"https://api.firecrawl.dev/v1/crawl/{crawl_id}"
+        headers = {"Authorization": f"Bearer {self.api_key}"}
+        response = self.get_with_retry(url, params={"skip": skip} if skip else None, headers=headers)
+        response.raise_for_status()
+        return response.json()
+
+    @track_call("crawler", "cancel_crawl")
+    @replayable("firecrawl", "cancel_crawl")
+    def cancel_crawl(self, crawl_id: str):
+        try:
+            return self.limiter.run(lambda: self.app.cancel_crawl(crawl_id))
+        except Exception as e:
+            print(f"Error cancelling crawl {crawl_id}: {e}")
+            return None
+
     def extract_data(self, urls: list[str] = None, prompt: str = None, schema: dict = None):
+        """
+        Firecrawl extract of a url list, sharded into jobs of FIRECRAWL_EXTRACT_SHARD_SIZE urls
+
+        The shards run concurrently within FIRECRAWL_EXTRACT_CONCURRENCY (shared by every
+        request), each failed shard is retried on its own and then split in halves, so a
+        bad url only loses itself. The `data` payloads of the shards are merged field by
+        field, list fields are concatenated.
+        """
+        urls = list(urls or [])
+        shard_size = max(settings.FIRECRAWL_EXTRACT_SHARD_SIZE, 1)
+        if len(urls) <= shard_size:
+            return self.extract_shard(urls, prompt=prompt, schema=schema)
+
+        shards = [urls[start:start + shard_size] for start in range(0, len(urls), shard_size)]
+        print(f"🧩 Extracting {len(urls)} urls in {len(shards)} shards of up to {shard_size}")
+        results, failed_urls, errors = [], [], []
+
+        def run(shard):
+            with _extract_slots:
+                return self.extract_shard(shard, prompt=prompt, schema=schema)
+
+        with ThreadPoolExecutor(max_workers=settings.FIRECRAWL_EXTRACT_CONCURRENCY) as executor:
+            pending = {executor.submit(run, shard): (shard, 0) for shard in shards}
+            while pending:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    shard, attempt = pending.pop(future)
+                    result = future.result()
+                    if result["success"]:
+                        results.append(result)
+                    elif attempt < settings.FIRECRAWL_EXTRACT_SHARD_RETRIES:
+                        pending[executor.submit(run, shard)] = (shard, attempt + 1)
+                    elif len(shard) > 1:
+                        # Isolate the url that makes the job fail
+                        middle = len(shard) // 2
+                        for half in (shard[:middle], shard[middle:]):
+                            pending[executor.submit(run, half)] = (half, 0)
+                    else:
+                        failed_urls.extend(shard)
+                        errors.append(f"{shard[0]}: {result['error']}")
+
+        if failed_urls:
+            print(f"⚠️ Extraction failed for {len(failed_urls)} of {len(urls)} urls")
+        return {
+                "success": bool(results),
+                "data": merge_extract_payloads([result["data"] for result in results]),
+                "status": "completed" if not failed_urls else "partial",
+                "token_usage": {"prompt_token": 0, "completion_token": 0, "output_token": 0, "total_token": 0},
+                "error": "; ".join(errors) or None,
+                "failed_urls": failed_urls,
+            }
+
+    @coalesced("firecrawl", "extract_data")
+    @track_call("crawler", "extract_data")
+    @replayable("firecrawl", "extract_data")
+    def extract_shard(self, urls: list[str] = None, prompt: str = None, schema: dict = None):
+        """One Firecrawl extract job over `urls`"""
         try:
-            response = self.app.extract(urls, prompt=prompt, schema=schema)
+            response = self.limiter.run(lambda: self.app.extract(urls, prompt=prompt, schema=schema))
             return {
                         "success": True,
                         "data": response.data,
@@ -71,15 +207,18 @@ class FirecrawlCrawler:
                     "error": str(e)
                     }
 
+    @coalesced("firecrawl", "search_data")
+    @track_call("crawler", "search_data")
+    @replayable("firecrawl", "search_data")
     def search_data(self, input_data: str = None, limit: int = 3, timeout: int = 30000):
         try:
-            response = self.app.search(
+            response = self.limiter.run(lambda: self.app.search(
                 input_data,
                 limit=limit,
                 tbs="qdr:d",
                 timeout=timeout,
                 location="India",
-                )
+                ))
 
             return {
                         "success": response.success, 
@@ -97,6 +236,8 @@ class FirecrawlCrawler:
                     "error": str(e)
                     }
 
+    @track_call("crawler", "search_crawl_api")
+    @replayable("firecrawl", "search_crawl_api")
     def search_crawl_api(self, query: str, location: str, limit: int = 5, timeout: int = 60000):
         url = "https://api.firecrawl.dev/v1/search"
 
@@ -117,7 +258,7 @@ class FirecrawlCrawler:
             "Content-Type": "application/json"
         }
 
-        response = requests.post(url, json=payload, headers=headers)
+        response = self.post_with_retry(url, payload, headers)
         return response.json()
 
     def scrape_url_api():
@@ -151,35 +292,32 @@ class FirecrawlCrawler:
 
         return response.json()
 
-    def crawl_url_api(self, url: str):
+    def post_with_retry(self, url: str, payload: dict, headers: dict):
+        """POST to the Firecrawl REST API through the shared limiter, retrying throttled or failed responses"""
+        def post():
+            response = requests.post(url, json=payload, headers=headers)
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                response.raise_for_status()
+            return response
 
-        url = "https://api.firecrawl.dev/v1/crawl"
+        return self.limiter.run(post)
 
-        payload = {
-            "maxDepth": 2,
-            "ignoreSitemap": False,
-            "ignoreQueryParameters": False,
-            "limit": 10000,
-            "allowBackwardLinks": False,
-            "crawlEntireDomain": False,
-            "allowExternalLinks": False,
-            "allowSubdomains": False,
-            "scrapeOptions": {
-                "formats": ["markdown"],
-                "onlyMainContent": True
-            },
-            "zeroDataRetention": False,
-            "url": url
-        }
-        headers = {
-            "Authorization": f"Bearer {self.api_key}",
-            "Content-Type": "application/json"
-        }
+    def get_with_retry(self, url: str, params: dict = None, headers: dict = None):
+        """GET from the Firecrawl REST API through the shared limiter, retrying throttled or failed responses"""
+        def get():
+            response = requests.get(url, params=params, headers=headers, timeout=60)
+            if response.status_code in RETRYABLE_STATUS_CODES:
+                response.raise_for_status()
+            return response
 
-        response = requests.post(url, json=payload, headers=headers)
+        return self.limiter.run(get)
+
+@lru_cache(maxsize=None)
+def get_firecrawler() -> FirecrawlCrawler:
+    """Shared FirecrawlCrawler, built on first use"""
+    return FirecrawlCrawler()
 
-        return response.json()
 
-firecrawler = FirecrawlCrawler()
+firecrawler = LazyProxy(get_firecrawler)
 
 
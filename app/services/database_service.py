@@ -1,11 +1,14 @@
 import time
 import logging
 import uuid
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Optional, List
 
 from fastapi import HTTPException
 from app.config.settings import settings
-from supabase import create_client, Client
+from app.services.clients import LazyProxy
+from app.utils.metrics import track_call
 from datetime import datetime, timedelta, timezone
 
 
@@ -25,11 +28,14 @@ class DatabaseService:
             self.client = None
         else:
             try:
+                from supabase import create_client
+
                 self.client = create_client(self.supabase_url, self.supabase_service_role_key)
             except Exception as e:
                 logger.error(f"Error initializing Supabase client: {e}")
                 self.client = None
     
+    @track_call("db", "save_data")
     def save_data(self, data: dict, table_name: str):
         """Save data to the database"""
         if not self.client:
@@ -52,6 +58,7 @@ class DatabaseService:
             logger.info(f"Generated UUID for missing primary key '{primary_key}': {data[primary_key]}")
         return data
 
+    @track_call("db", "save_unique_data")
     def save_unique_data(self, data: dict, table_name: str, update_if_exists: bool = True):
         """
         Save data to database with duplicate prevention
@@ -116,6 +123,7 @@ class DatabaseService:
             logger.error(f"Error saving unique data to {table_name}: {e}")
             return {"status": "error", "message": str(e)}
     
+    @track_call("db", "save_batch_unique_data")
     def save_batch_unique_data(self, data_list: List[dict], table_name: str, update_if_exists: bool = True):
         """
         Save multiple records with duplicate prevention
@@ -176,6 +184,7 @@ class DatabaseService:
         logger.info(f"Batch operation completed: {results['inserted']} inserted, {results['updated']} updated, {results['skipped']} skipped, {results['errors']} errors")
         return results
     
+    @track_call("db", "save_with_multiple_key_check")
     def save_with_multiple_key_check(self, data: dict, table_name: str, unique_fields: List[str], update_if_exists: bool = True):
         """
         Save data with multiple field uniqueness check
@@ -251,6 +260,7 @@ class DatabaseService:
             logger.error(f"Error saving data with multiple key check to {table_name}: {e}")
             return {"status": "error", "message": str(e)}
     
+    @track_call("db", "get_existing_records")
     def get_existing_records(self, table_name: str, field_name: str, values: List[str]):
         """
         Get existing records by field values
@@ -283,6 +293,7 @@ class DatabaseService:
             logger.error(f"Error getting existing records from {table_name}: {e}")
             return {}
         
+    @track_call("db", "update_data")
     def update_data(self, data: dict, table_name: str):
         """Update data in the database"""
         if not self.client:
@@ -296,6 +307,7 @@ class DatabaseService:
             logger.error(f"Error updating data in {table_name}: {e}")
             return None
 
+    @track_call("db", "check_table_exists")
     def check_table_exists(self, table_name: str) -> bool:
         """
         Check if a table exists in the database
@@ -374,6 +386,7 @@ class DatabaseService:
             logger.error(f"Error creating table from columns: {e}")
             return {"status": "error", "message": str(e)}
 
+    @track_call("db", "execute_sql_command")
     def execute_sql_command(self, sql_command: str) -> dict:
         """
         Execute a SQL command directly using Supabase RPC
@@ -436,4 +449,67 @@ class DatabaseService:
                 return {"status": "error", "message": str(e)}
 
 
-database_service = DatabaseService()
\ No newline at end of file
+class BatchWriter:
+    """
+    Saves records as they arrive, in small batches on a background thread
+
+    Used for streamed model output so records are persisted while the model is
+    still generating the rest of them.
+    """
+
+    def __init__(self, service: DatabaseService, table_name: str, update_if_exists: bool = True, batch_size: int = None):
+        self.service = service
+        self.table_name = table_name
+        self.update_if_exists = update_if_exists
+        self.batch_size = batch_size or settings.STREAM_SAVE_BATCH_SIZE
+        self.pending = []
+        self.futures = []
+        # A single worker keeps the batches in order
+        self.executor = ThreadPoolExecutor(max_workers=1)
+
+    def add(self, record: dict):
+        """Queue a record, saving the batch once it is full"""
+        self.pending.append(record)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def flush(self):
+        """Hand the queued records to the background writer"""
+        if self.pending:
+            batch, self.pending = self.pending, []
+            self.futures.append(
+                self.executor.submit(self.service.save_batch_unique_data, batch, self.table_name, self.update_if_exists)
+            )
+
+    def close(self) -> dict:
+        """
+        Save what is left, wait for every batch and merge their results
+
+        Returns:
+            dict: Combined batch operation results (without per-record details)
+        """
+        self.flush()
+        results = {"total_records": 0, "inserted": 0, "updated": 0, "skipped": 0, "errors": 0, "batches": len(self.futures)}
+        for future in self.futures:
+            try:
+                batch_result = future.result()
+            except Exception as e:
+                logger.error(f"Error saving batch to {self.table_name}: {e}")
+                results["errors"] += 1
+                continue
+            if batch_result.get("status") == "error":
+                results["errors"] += 1
+                continue
+            for key in ["total_records", "inserted", "updated", "skipped", "errors"]:
+                results[key] += batch_result.get(key, 0)
+        self.executor.shutdown(wait=True)
+        return results
+
+
+@lru_cache(maxsize=None)
+def get_database_service() -> DatabaseService:
+    """Shared DatabaseService, built on first use"""
+    return DatabaseService()
+
+
+database_service = LazyProxy(get_database_service)
\ No newline at end of file
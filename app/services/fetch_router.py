@@ -0,0 +1,172 @@
+"""
+Tiered page fetching: the local fetcher first, Firecrawl only for pages that need a browser
+
+Most lender and directory pages are static and fetch locally in a fraction of a
+second. Pages that come back as an empty shell (little text for a lot of markup,
+a "please enable JavaScript" noscript, an empty SPA root) are escalated to
+Firecrawl. The tier chosen for each domain is remembered for
+FETCH_ROUTE_TTL_SECONDS, so later requests go straight to the right tier.
+"""
+
+import re
+import time
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+from urllib.parse import urlparse
+
+from app.config.settings import settings
+from app.utils.metrics import FETCH_ROUTES, record_cache_lookup
+from app.utils.rate_limiter import get_status_code
+from app.services.webpage import make_request_with_retry, extract_text_from_response
+
+logger = logging.getLogger(__name__)
+
+LOCAL = "local"
+FIRECRAWL = "firecrawl"
+
+BLOCKED_STATUS_CODES = {401, 403, 429}
+
+# Mount points of client-rendered apps (React, Vue, Next.js, Nuxt, Gatsby, Angular) left empty by the server
+SPA_ROOT = re.compile(
+    r"<(?:div|main|app-root)[^>]*\bid=[\"'](?:root|app|__next|__nuxt|___gatsby)[\"'][^>]*>\s*</(?:div|main|app-root)>"
+    r"|<app-root[^>]*>\s*</app-root>",
+    re.IGNORECASE,
+)
+NOSCRIPT_MARKER = re.compile(
+    r"<noscript[^>]*>(?:(?!</noscript>).){0,2000}?(?:enable javascript|javascript is (?:disabled|required)"
+    r"|requires javascript|turn on javascript)",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def detect_js_shell(html: str, text: str) -> Optional[str]:
+    """
+    Why a locally fetched page looks rendered by JavaScript, None when its text is usable
+
+    Args:
+        html (str): Raw markup of the page
+        text (str): Visible text extracted from it
+    """
+    text_length = len((text or "").strip())
+    if text_length < settings.FETCH_ROUTER_MIN_TEXT_CHARS:
+        return "empty"
+    # Pages with plenty of text are usable whatever their markup; a shell with a little
+    # boilerplate text is still a shell when the markers say so
+    if text_length >= settings.FETCH_ROUTER_SHELL_TEXT_CHARS:
+        return None
+    if SPA_ROOT.search(html):
+        return "spa_root"
+    if NOSCRIPT_MARKER.search(html):
+        return "noscript"
+    if html and text_length / len(html) < settings.FETCH_ROUTER_MIN_TEXT_RATIO:
+        return "text_ratio"
+    return None
+
+
+class RouteTable:
+    """Fetch tier per domain, forgotten after `ttl_seconds`"""
+
+    def __init__(self, ttl_seconds: float):
+        self.ttl_seconds = ttl_seconds
+        self.routes: Dict[str, dict] = {}
+        self.lock = threading.Lock()
+
+    def get(self, domain: str) -> Optional[dict]:
+        with self.lock:
+            route = self.routes.get(domain)
+            if route and time.monotonic() - route["decided_at"] > self.ttl_seconds:
+                del self.routes[domain]
+                route = None
+        record_cache_lookup("fetch_route", route is not None)
+        return route
+
+    def set(self, domain: str, tier: str, reason: str):
+        with self.lock:
+            current = self.routes.get(domain)
+            # One page needing a browser is enough to send the whole domain to Firecrawl
+            if current and current["tier"] == FIRECRAWL and tier == LOCAL:
+                return
+            self.routes[domain] = {"tier": tier, "reason": reason, "decided_at": time.monotonic()}
+
+    def snapshot(self) -> Dict[str, dict]:
+        with self.lock:
+            return {domain: {"tier": route["tier"], "reason": route["reason"]} for domain, route in self.routes.items()}
+
+    def clear(self):
+        with self.lock:
+            self.routes.clear()
+
+
+route_table = RouteTable(settings.FETCH_ROUTE_TTL_SECONDS)
+
+
+def fetch_local(url: str, structured_sink: list = None) -> dict:
+    """Fetch one page with the local fetcher and judge whether its text is usable"""
+    try:
+        response = make_request_with_retry(url)
+        text = extract_text_from_response(response, url, structured_sink)
+    except Exception as e:
+        # Sites refusing scripted clients need the browser, other errors may be specific to the page
+        reason = "blocked" if get_status_code(e) in BLOCKED_STATUS_CODES else "fetch_error"
+        return {"url": url, "text": None, "reason": reason, "error": str(e)}
+
+    content_type = (response.headers.get("content-type") or "").lower()
+    if text.startswith("[Unsupported"):
+        reason = "unsupported"
+    elif "html" in content_type:
+        reason = detect_js_shell(response.text, text)
+    else:
+        # Documents without a text layer (scanned PDFs) are left to Firecrawl
+        reason = None if text.strip() else "empty"
+    return {"url": url, "text": None if reason else text, "reason": reason, "error": None}
+
+
+def route_urls(urls: List[str], domain: str = "", structured_sink: list = None) -> dict:
+    """
+    Fetch the pages that do not need a browser and list the ones that do
+
+    Args:
+        urls (list): Pages to read, relative urls are joined to `domain`
+        domain (str): Base url of the site
+        structured_sink (list): When given, the JSON-LD, microdata and tables of the
+            locally fetched html pages are appended to it
+
+    Returns:
+        dict: {"pages": {url: text} fetched locally, "escalate": [urls for Firecrawl],
+            "decisions": {url: {"tier", "reason"}}}
+    """
+    pages, escalate, decisions = {}, [], {}
+    local = []
+    for url in urls or []:
+        if not url.startswith("http"):
+            url = domain.rstrip("/") + "/" + url.lstrip("/")
+        route = route_table.get(urlparse(url).netloc)
+        if route and route["tier"] == FIRECRAWL:
+            escalate.append(url)
+            decisions[url] = {"tier": FIRECRAWL, "reason": "domain_route"}
+            FETCH_ROUTES.labels(FIRECRAWL, "domain_route").inc()
+        else:
+            local.append(url)
+
+    # Hosts keep their own politeness budget in the http limiter, so the pages are fetched together
+    with ThreadPoolExecutor(max_workers=max(1, min(settings.FETCH_ROUTER_WORKERS, len(local)))) as executor:
+        results = list(executor.map(lambda url: fetch_local(url, structured_sink), local))
+
+    for url, result in zip(local, results):
+        host = urlparse(url).netloc
+        if result["reason"]:
+            logger.info(f"Escalating {url} to Firecrawl: {result['reason']} {result['error'] or ''}".strip())
+            if result["reason"] != "fetch_error":
+                route_table.set(host, FIRECRAWL, result["reason"])
+            escalate.append(url)
+            decisions[url] = {"tier": FIRECRAWL, "reason": result["reason"]}
+        else:
+            route_table.set(host, LOCAL, "static")
+            pages[url] = result["text"]
+            decisions[url] = {"tier": LOCAL, "reason": "static"}
+        FETCH_ROUTES.labels(decisions[url]["tier"], decisions[url]["reason"]).inc()
+
+    print(f"🚦 Fetch router: {len(pages)} page(s) fetched locally, {len(escalate)} sent to Firecrawl")
+    return {"pages": pages, "escalate": escalate, "decisions": decisions}
@@ -0,0 +1,133 @@
+"""
+Concurrent resolver for fields the primary extraction model could not find
+"""
+
+import re
+import json
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, List, Optional
+
+from app.config.settings import settings
+from app.utils.prompts import multi_field_search_system_message, multi_field_search_prompt
+from app.utils.rate_limiter import get_provider_limiter
+
+logger = logging.getLogger(__name__)
+
+NOT_FOUND = "Not Found"
+
+# Related keys are searched together, matched on key name fragments in this order
+FIELD_GROUPS = {
+    "rates": ["roi", "interest"],
+    "ratios": ["ltv", "foir"],
+    "charges": ["fee", "charges"],
+    "amounts_and_tenure": ["loan_amount", "tenure", "income"],
+    "timelines": ["approval_time", "processing_time"],
+    "eligibility": ["credit_score", "eligib", "profession", "target_customers", "documents"],
+    "property": ["property", "agreement", "usage"],
+}
+
+
+def group_missing_keys(keys: List[str], max_group_size: int = None) -> List[List[str]]:
+    """
+    Group related missing keys so each group can be resolved with one query
+
+    Args:
+        keys (list): Keys whose value is missing
+        max_group_size (int): Maximum keys per query
+
+    Returns:
+        list: Groups of keys
+    """
+    max_group_size = max_group_size or settings.SEARCH_MAX_FIELDS_PER_QUERY
+    grouped = {name: [] for name in FIELD_GROUPS}
+    grouped["other"] = []
+
+    for key in keys:
+        group = next(
+            (name for name, fragments in FIELD_GROUPS.items() if any(fragment in key.lower() for fragment in fragments)),
+            "other",
+        )
+        grouped[group].append(key)
+
+    # Small groups are packed together, big groups are split to keep answers precise
+    groups = []
+    current = []
+    for group_keys in grouped.values():
+        for start in range(0, len(group_keys), max_group_size):
+            part = group_keys[start:start + max_group_size]
+            if len(current) + len(part) > max_group_size:
+                groups.append(current)
+                current = []
+            current.extend(part)
+    if current:
+        groups.append(current)
+    return groups
+
+
+def parse_json_object(text: str) -> dict:
+    """Parse the first JSON object in a model response, ignoring code fences and prose"""
+    match = re.search(r"\{.*\}", text or "", re.DOTALL)
+    if not match:
+        return {}
+    try:
+        parsed = json.loads(match.group(0))
+    except json.JSONDecodeError:
+        return {}
+    return parsed if isinstance(parsed, dict) else {}
+
+
+def resolve_missing_fields(
+    lender_name: str,
+    missing_keys: List[str],
+    search_fn: Callable[[str, str], str],
+    key_descriptions: Optional[Dict[str, str]] = None,
+    clean_fn: Optional[Callable[[str], str]] = None,
+    max_workers: int = None,
+) -> Dict[str, str]:
+    """
+    Resolve missing fields with grouped, concurrent, rate limited search queries
+
+    Args:
+        lender_name (str): Lender the fields belong to
+        missing_keys (list): Keys to resolve
+        search_fn (callable): Called as search_fn(system_message, prompt) and returns the response text
+        key_descriptions (dict): Optional description per key to sharpen the query
+        clean_fn (callable): Optional cleaner applied to every returned value
+        max_workers (int): Maximum concurrent queries
+
+    Returns:
+        dict: Resolved value per key, NOT_FOUND for keys the search could not answer
+    """
+    if not missing_keys:
+        return {}
+
+    key_descriptions = key_descriptions or {}
+    max_workers = max_workers or settings.SEARCH_MAX_WORKERS
+    groups = group_missing_keys(missing_keys)
+
+    def resolve_group(keys: List[str]) -> dict:
+        key_lines = "\n".join(f"- {key}: {key_descriptions.get(key, key.replace('_', ' '))}" for key in keys)
+        prompt = multi_field_search_prompt.format(lender_name=lender_name, keys=key_lines)
+        try:
+            # The search model shares the OpenAI budgets, its own request rate is the "search" lane
+            response_text = get_provider_limiter("openai").run(
+                lambda: search_fn(multi_field_search_system_message, prompt), key="search"
+            )
+            parsed = parse_json_object(response_text)
+        except Exception as e:
+            logger.error(f"Search failed for keys {keys}: {e}")
+            parsed = {}
+        return {key: parsed.get(key, NOT_FOUND) for key in keys}
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        group_results = list(executor.map(resolve_group, groups))
+
+    resolved = {}
+    for result in group_results:
+        for key, value in result.items():
+            value = str(value) if value is not None else NOT_FOUND
+            resolved[key] = clean_fn(value) if clean_fn else value
+
+    logger.info(f"Resolved {len(missing_keys)} missing fields for {lender_name} in {len(groups)} search queries")
+    return resolved
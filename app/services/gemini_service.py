@@ -1,24 +1,54 @@
+import re
+import json
 import logging
-from google import genai
-from google.genai import types
+from functools import lru_cache
+from pydantic import ValidationError
 from app.config.settings import settings
+from app.services.clients import LazyProxy, get_gemini_client
+from app.services.singleflight import coalesced
+from app.services.replay import replayable
+from app.services.search_cache import get_search_cache
+from app.services.llm_services import estimate_tokens
+from app.utils.metrics import record_token_usage, track_call
+from app.utils.rate_limiter import get_provider_limiter, get_status_code
 
 logger = logging.getLogger(__name__)
 
+JSON_BLOCK = re.compile(r"\{.*\}", re.DOTALL)
+
+structured_prompt_suffix = """
+
+Answer only with a JSON object matching this JSON schema, without any other text:
+{schema}"""
+
+
+def parse_structured_text(text: str, response_format):
+    """Validated dict of `response_format` from a JSON answer (possibly fenced or with text around it), None if invalid"""
+    match = JSON_BLOCK.search(text or "")
+    if not match:
+        return None
+    try:
+        return response_format.model_validate_json(match.group(0)).model_dump()
+    except ValidationError as e:
+        logger.info(f"Gemini answer does not match {response_format.__name__}: {e.error_count()} error(s)")
+        return None
+
+
 class GeminiService:
     """Service for handling Google Gemini AI interactions"""
     
-    def __init__(self):
-        """Initialize Gemini service with API key"""
+    def __init__(self, client=None):
+        """Initialize Gemini service with the shared client, or an injected one"""
+        from google.genai import types
+
         self.api_key = settings.GEMINI_API_KEY
-        if not self.api_key:
-            logger.error("❌ GEMINI_API_KEY not found in environment variables")
-            raise ValueError("GEMINI_API_KEY is required")
-        
 
         # Initialize models
-        self.client = genai.Client(api_key=self.api_key)
-        
+        self.client = client or get_gemini_client()
+        if not self.client:
+            logger.error("❌ Failed to initialize Gemini client")
+            raise ValueError("Failed to initialize Gemini client")
+
         # Define the grounding tool
         self.grounding_tool = types.Tool(
             google_search=types.GoogleSearch()
@@ -28,18 +58,99 @@ class GeminiService:
         self.config = types.GenerateContentConfig(
             tools=[self.grounding_tool]
         )
+        self.limiter = get_provider_limiter("gemini")
+        # Models that rejected a response schema together with the search tool
+        self.schema_with_tools_unsupported = set()
         
         logger.info("✅ Gemini service initialized successfully")
 
+    def search_google(self, prompt, model: str = "gemini-2.0-flash", refresh: bool = False):
+        """
+        Generate a search response using Gemini, from the search cache when it has one
+
+        Args:
+            prompt (str): Fully formatted search prompt
+            model (str): Gemini model
+            refresh (bool): Search again even if the cached answer is fresh
+        """
+        if not settings.SEARCH_CACHE_ENABLED:
+            return self.grounded_search(prompt, model=model)
+        return get_search_cache().get(model, prompt, lambda: self.grounded_search(prompt, model=model), refresh=refresh)
+
+    @coalesced("gemini", "search_google")
+    @track_call("llm", "search_google", provider="gemini")
+    @replayable("gemini", "search_google")
+    def grounded_search(self,prompt, model:str = "gemini-2.0-flash"):
+        """Run the grounded Google search with Gemini"""
+        estimated_tokens = estimate_tokens(prompt)
+        response = self.limiter.run(
+            lambda: self.client.models.generate_content(
+                model=model,
+                contents=prompt,
+                config=self.config,
+            ),
+            tokens=estimated_tokens,
+        )
+        if response.usage_metadata:
+            self.limiter.record_tokens(response.usage_metadata.total_token_count or 0, estimated_tokens)
+            record_token_usage("gemini", model, {"prompt_token": response.usage_metadata.prompt_token_count or 0, "output_token": response.usage_metadata.candidates_token_count or 0})
+        
+        if response.candidates:
+            try:
+                for part in response.candidates[0].content.parts:
+                    if part.text is not None:
+                        return {
+                                "success": True,
+                                "data":part.text,
+                                "status":"completed",
+                                "token_usage":{
+                                    "prompt_token":response.usage_metadata.prompt_token_count,
+                                    "completion_token":response.usage_metadata.candidates_token_count, 
+                                    "output_token":0, 
+                                    "total_token":response.usage_metadata.total_token_count
+                                    },
+                                "error": None
+                            }
+                        
+                else:
+                    return {
+                        "success": False,
+                        "data": None,
+                        "status":"completed",
+                        "token_usage":{"prompt_token":0,"completion_token":0, "output_token":0, "total_token":0},
+                        "error": None
+                    }
+            except Exception as e:
+                logger.error(f"Error searching Google: {e}")
+                return {
+                        "success": False,
+                        "data": None,
+                        "status":"completed",
+                        "token_usage":{"prompt_token":0,"completion_token":0, "output_token":0, "total_token":0},
+                        "error": str(e)
+                    }
+
+
+    @coalesced("gemini", "generate_search_response")
+    @track_call("llm", "generate_search_response", provider="gemini")
+    @replayable("gemini", "generate_search_response")
     def generate_search_response(self,model, prompt):
+        from google.genai import types
 
-        response = self.client.models.generate_content(
+        response = self.limiter.run(
+            lambda: self.client.models.generate_content(
                 model=model,
                 contents=prompt,
                 config=types.GenerateContentConfig(
                     tools=[types.Tool(google_search=types.GoogleSearch())]
                 ),
             )
+        )
+        if response.usage_metadata:
+            record_token_usage("gemini", model, {
+                "prompt_token": response.usage_metadata.prompt_token_count or 0,
+                "output_token": response.usage_metadata.candidates_token_count or 0,
+            })
         
         for part in response.candidates[0].content.parts:
             print(response)
@@ -59,6 +170,70 @@ class GeminiService:
                 }
 
         # return response
+
+    @coalesced("gemini", "generate_structured_search_response")
+    @track_call("llm", "generate_structured_search_response", provider="gemini")
+    @replayable("gemini", "generate_structured_search_response")
+    def generate_structured_search_response(self, model, prompt, response_format):
+        """
+        Grounded search answered directly as a `response_format` object, in one call
+
+        The schema is requested through response_schema alongside the search tool. Models
+        rejecting that combination get the JSON schema in the prompt instead, and are
+        remembered so later calls skip the attempt.
+
+        Args:
+            model (str): Gemini model
+            prompt (str): Search prompt
+            response_format (BaseModel): Pydantic model of the answer
+
+        Returns:
+            dict: {"success", "data" (validated dict or None), "response" (raw text, for a
+                second parse when the answer did not validate), "mode", "model"}
+        """
+        from google.genai import types
+
+        if model not in self.schema_with_tools_unsupported:
+            config = types.GenerateContentConfig(
+                tools=[types.Tool(google_search=types.GoogleSearch())],
+                response_mime_type="application/json",
+                response_schema=response_format,
+            )
+            try:
+                return self._structured_result(self._generate(model, prompt, config), response_format, model, "schema")
+            except Exception as e:
+                if get_status_code(e) != 400:
+                    raise
+                logger.info(f"{model} does not support a response schema with search grounding, using a JSON prompt: {e}")
+                self.schema_with_tools_unsupported.add(model)
+
+        config = types.GenerateContentConfig(tools=[types.Tool(google_search=types.GoogleSearch())])
+        schema = json.dumps(response_format.model_json_schema())
+        response = self._generate(model, prompt + structured_prompt_suffix.format(schema=schema), config)
+        return self._structured_result(response, response_format, model, "prompt")
+
+    def _generate(self, model, prompt, config):
+        response = self.limiter.run(
+            lambda: self.client.models.generate_content(model=model, contents=prompt, config=config)
+        )
+        if response.usage_metadata:
+            record_token_usage("gemini", model, {
+                "prompt_token": response.usage_metadata.prompt_token_count or 0,
+                "output_token": response.usage_metadata.candidates_token_count or 0,
+            })
+        return response
+
+    def _structured_result(self, response, response_format, model, mode):
+        parts = response.candidates[0].content.parts if response.candidates and response.candidates[0].content else None
+        text = "".join(part.text for part in parts or [] if part.text) or None
+        data = parse_structured_text(text, response_format)
+        return {
+            "success": data is not None,
+            "data": data,
+            "response": text,
+            "mode": mode,
+            "model": model,
+        }
     
     # def generate_text(self, 
     #                  prompt: str, 
@@ -297,5 +472,11 @@ class GeminiService:
     #             "model": model
     #         }
     
-# Create a singleton instance
-gemini_service = GeminiService()
+@lru_cache(maxsize=None)
+def get_gemini_service() -> GeminiService:
+    """Shared GeminiService, built on first use (FastAPI dependency)"""
+    return GeminiService()
+
+
+# Singleton instance, created lazily on first use
+gemini_service = LazyProxy(get_gemini_service)
@@ -0,0 +1,176 @@
+"""
+Lender data extracted from a Firecrawl crawl while the crawl is still running
+
+Relevant page text is buffered and a chunk is sent to the LLM as soon as the buffer
+is full, so extraction overlaps with the crawl. Every page and every extracted
+chunk is appended to <CRAWL_JOBS_DIR>/<job_id>.lender.jsonl: a job resumed after a
+restart reloads them, extracts the pages no finished chunk covered, and carries on
+with the rest of the crawl. The merged lender data is saved as the job's result.
+"""
+
+import os
+import json
+import logging
+import threading
+from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+
+from app.config.settings import settings
+from app.models.schemas import LendersExtractSchema
+from app.services.chunking import chunk_sections, merge_extractions, count_tokens
+from app.services.crawl_jobs import crawl_job_manager
+from app.services.pre_extractors import pre_extract
+from app.services.relevance import filter_extracted_data
+from app.services.sniffer_services import LENDERS_EXTRACTION_MODEL, extract_lenders_chunk
+
+logger = logging.getLogger(__name__)
+
+KIND = "lenders"
+
+EMPTY_TOKEN_USAGE = {"prompt_token": 0, "completion_token": 0, "output_token": 0, "total_token": 0}
+
+
+class LenderCrawl:
+    """Streaming extraction of one lender crawl job, journaled next to the job"""
+
+    def __init__(self, state: dict):
+        params = state.get("params") or {}
+        self.job_id = state["job_id"]
+        self.keywords = params.get("keywords")
+        self.lender_name = params.get("lender_name") or f"https://{urlparse(state['url']).netloc}"
+        self.path = os.path.join(settings.CRAWL_JOBS_DIR, f"{self.job_id}.lender.jsonl")
+        self.max_tokens = settings.EXTRACTION_CHUNK_MAX_TOKENS
+
+        self.pages = {}
+        self.buffer, self.buffered_urls, self.buffered_tokens = [], [], 0
+        self.outputs, self.token_usage = [], dict(EMPTY_TOKEN_USAGE)
+        self.futures = []
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=settings.EXTRACTION_MAX_WORKERS)
+        self.load()
+
+    ########################################## Journal ##########################################
+    def load(self):
+        """Pages and chunk outputs of a previous run of the job, pages no chunk covered are extracted again"""
+        if not os.path.exists(self.path):
+            return
+        covered = set()
+        with open(self.path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    entry = json.loads(line)
+                except ValueError:
+                    # The last line may be cut short by the crash
+                    continue
+                if "page" in entry:
+                    self.pages[entry["page"]] = entry["markdown"]
+                else:
+                    covered.update(entry["urls"])
+                    self.add_chunk_result(entry["outputs"], entry["token_usage"])
+        with self.lock:
+            for url, markdown in self.pages.items():
+                if url not in covered:
+                    self.buffer_page(url, markdown)
+        print(f"🕷️ Crawl job {self.job_id}: {len(self.pages)} page(s) reloaded, {len(self.buffered_urls)} to extract again")
+
+    def journal(self, entry: dict):
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+
+    ########################################## Extraction ##########################################
+    def on_page(self, page: dict):
+        if not page["markdown"].strip():
+            return
+        with self.lock:
+            # A resumed job may hand over pages that were processed before the restart
+            if page["url"] in self.pages:
+                return
+            self.pages[page["url"]] = page["markdown"]
+            self.journal({"page": page["url"], "markdown": page["markdown"]})
+            self.buffer_page(page["url"], page["markdown"])
+
+    def buffer_page(self, url: str, markdown: str):
+        # Callers hold self.lock
+        text = filter_extracted_data({url: markdown}, self.keywords).get(url)
+        tokens = count_tokens(text, LENDERS_EXTRACTION_MODEL) if text else 0
+        if not tokens:
+            return
+        if self.buffer and self.buffered_tokens + tokens > self.max_tokens:
+            self.flush()
+        self.buffer.append(f"--- Source: {url} ---\n{text}")
+        self.buffered_urls.append(url)
+        self.buffered_tokens += tokens
+
+    def flush(self):
+        # Callers hold self.lock
+        if self.buffer:
+            self.futures.append(self.executor.submit(self.extract, list(self.buffer), list(self.buffered_urls)))
+        self.buffer, self.buffered_urls, self.buffered_tokens = [], [], 0
+
+    def extract(self, sections: list, urls: list):
+        responses = [
+            extract_lenders_chunk(chunk, self.lender_name)
+            for chunk in chunk_sections(sections, max_tokens=self.max_tokens, model=LENDERS_EXTRACTION_MODEL)
+        ]
+        outputs = [response["data"] for response in responses if response.get("success")]
+        token_usage = dict(EMPTY_TOKEN_USAGE)
+        for response in responses:
+            for key in token_usage:
+                token_usage[key] += response.get("token_usage", {}).get(key, 0)
+        with self.lock:
+            self.add_chunk_result(outputs, token_usage)
+            # Only fully extracted buffers count as covered when the job is resumed
+            self.journal({"urls": urls, "outputs": outputs, "token_usage": token_usage})
+
+    def add_chunk_result(self, outputs: list, token_usage: dict):
+        self.outputs.extend(outputs)
+        for key in self.token_usage:
+            self.token_usage[key] += token_usage.get(key, 0)
+
+    def on_done(self, state: dict) -> dict:
+        """Merge the chunk outputs with the pattern pre-extraction, saved as the job result"""
+        with self.lock:
+            self.flush()
+        for future in self.futures:
+            future.result()
+        self.executor.shutdown()
+        print(f"🕷️ Crawl of {state['url']}: {len(self.pages)} page(s), {len(self.outputs)} chunk(s) extracted")
+
+        prefilled, field_sources = pre_extract(self.pages, min_confidence=settings.PRE_EXTRACTION_MIN_CONFIDENCE)
+        data = merge_extractions([prefilled] + self.outputs)
+        result = {
+            "data": {**{name: "Not Found" for name in LendersExtractSchema.model_fields}, **data, "sourceurls": list(self.pages)},
+            "field_sources": field_sources,
+            "successful_extractions": len(self.pages),
+            "failed_extractions": state.get("pages_failed", 0),
+            "token_usage": self.token_usage,
+        }
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+        return result
+
+
+def lender_crawl_callbacks(state: dict):
+    crawl = LenderCrawl(state)
+    return crawl.on_page, crawl.on_done
+
+
+crawl_job_manager.register(KIND, lender_crawl_callbacks)
+
+
+def start_lenders_crawl(url: str, keywords: list[str] = None, lender_name: str = None, limit: int = None) -> dict:
+    """Start a lender crawl job in the background, its result is in the job state once it is done"""
+    params = {"keywords": keywords, "lender_name": lender_name}
+    return crawl_job_manager.start(url, limit=limit, kind=KIND, params=params)
+
+
+def crawl_lenders_data(url: str, keywords: list[str] = None, lender_name: str = None, limit: int = None) -> dict:
+    """Crawl a lender site and return its data once the crawl is done"""
+    job = start_lenders_crawl(url, keywords=keywords, lender_name=lender_name, limit=limit)
+    if job["status"] == "failed":
+        return {"data": None, "crawl_job": job, "error": job.get("error")}
+    job = crawl_job_manager.wait(job["job_id"])
+    return {**(job.get("result") or {}), "crawl_job": {key: value for key, value in job.items() if key != "result"}}
@@ -1,34 +1,74 @@
+import os
+import json
+import time
+import uuid
 import logging
-from google import genai
-from google.genai import types
-from openai import OpenAI
+import tempfile
+from contextlib import ExitStack
+from functools import lru_cache
+from typing import get_args
+from pydantic import ValidationError
 from app.config.settings import settings
+from app.services.chunking import count_tokens
+from app.services.clients import LazyProxy, get_openai_client
+from app.services.singleflight import coalesced
+from app.services.replay import replayable
+from app.utils.json_stream import JsonArrayItemParser
+from app.utils.metrics import record_token_usage, track_call
+from app.utils.rate_limiter import get_provider_limiter
 
 logger = logging.getLogger(__name__)
 
+
+def estimate_tokens(messages) -> int:
+    """Estimate the prompt tokens of a list of chat messages for rate limiting"""
+    if isinstance(messages, str):
+        return count_tokens(messages)
+    return sum(count_tokens(str(message.get("content", ""))) for message in messages or [])
+
+
+def json_schema_format(response_format) -> dict:
+    """Strict JSON schema of a Pydantic model, named after the model, as structured outputs expect it"""
+    from openai import pydantic_function_tool
+
+    function = pydantic_function_tool(response_format)["function"]
+    return {"name": function["name"], "schema": function["parameters"], "strict": True}
+
+
 class OpenAIAnalyzer:
     
-    def __init__(self):
+    def __init__(self, client=None):
         self.api_key = settings.OPENAI_API_KEY
         self.model = settings.OPENAI_MODEL
         self.temperature = settings.OPENAI_TEMPERATURE
         self.max_tokens = settings.OPENAI_MAX_TOKENS
-        self.client = OpenAI(api_key=self.api_key)
+        # Shared pooled client unless a fake is injected
+        self.client = client or get_openai_client()
+        self.limiter = get_provider_limiter("openai")
 
         if not self.client:
             raise ValueError("Failed to initialize OpenAI client")
 
+    @coalesced("openai", "analyze_context")
+    @track_call("llm", "analyze_context", provider="openai")
+    @replayable("openai", "analyze_context")
     def analyze_context(self, model: str = None, messages: list = None, response_format=None):
         if not model:
             model = self.model
 
         try:
-            response = self.client.chat.completions.parse(
-                model=model,
-                messages=messages,
-                response_format=response_format,
-                # temperature=temperature
+            estimated_tokens = estimate_tokens(messages)
+            response = self.limiter.run(
+                lambda: self.client.chat.completions.parse(
+                    model=model,
+                    messages=messages,
+                    response_format=response_format,
+                    # temperature=temperature
+                ),
+                tokens=estimated_tokens,
             )
+            self.limiter.record_tokens(response.usage.total_tokens, estimated_tokens)
+            record_token_usage("openai", model, {"prompt_token": response.usage.prompt_tokens, "completion_token": response.usage.completion_tokens})
             return {
                     "success": True,
                     "data":response.choices[0].message.parsed.model_dump(),
@@ -48,17 +88,27 @@ class OpenAIAnalyzer:
 
         
     # Function to send a prompt to GPT model for extracting data
+    @coalesced("openai", "get_structured_response")
+    @track_call("llm", "get_structured_response", provider="openai")
+    @replayable("openai", "get_structured_response")
     def get_structured_response(self, system_message, prompt, model: str = None, response_format=None):
         try:
-            response = self.client.beta.chat.completions.parse(
-                model=model,
-                messages=[
-                    {"role": "system", "content": system_message},
-                    {"role": "user", "content": prompt}
-                ],
-                temperature=0,  # creativity
-                response_format=response_format
+            messages = [
+                {"role": "system", "content": system_message},
+                {"role": "user", "content": prompt}
+            ]
+            estimated_tokens = estimate_tokens(messages)
+            response = self.limiter.run(
+                lambda: self.client.beta.chat.completions.parse(
+                    model=model,
+                    messages=messages,
+                    temperature=0,  # creativity
+                    response_format=response_format
+                ),
+                tokens=estimated_tokens,
             )
+            self.limiter.record_tokens(response.usage.total_tokens, estimated_tokens)
+            record_token_usage("openai", model, {"prompt_token": response.usage.prompt_tokens, "completion_token": response.usage.completion_tokens})
             
             return {
                     "success": True,
@@ -81,20 +131,29 @@ class OpenAIAnalyzer:
                     "error": str(e)
                 }
 
+    @coalesced("openai", "structured_output")
+    @track_call("llm", "structured_output", provider="openai")
+    @replayable("openai", "structured_output")
     def structured_output(self, prompt, model: str = None, response_format=None):
         try:
-            response = self.client.responses.parse(
-                model=model,
-                temperature=0.7,
-                input=[
-                        {"role": "system", "content": "Extract entities from the input text"},
-                        {
-                            "role": "user",
-                            "content": prompt,
-                        },
-                    ],
-                text_format=response_format
+            estimated_tokens = estimate_tokens(prompt)
+            response = self.limiter.run(
+                lambda: self.client.responses.parse(
+                    model=model,
+                    temperature=0.7,
+                    input=[
+                            {"role": "system", "content": "Extract entities from the input text"},
+                            {
+                                "role": "user",
+                                "content": prompt,
+                            },
+                        ],
+                    text_format=response_format
+                ),
+                tokens=estimated_tokens,
             )
+            self.limiter.record_tokens(response.usage.total_tokens, estimated_tokens)
+            record_token_usage("openai", model, {"input_token": response.usage.input_tokens, "output_token": response.usage.output_tokens})
             if response.output_parsed:
                 return {
                     "success": True,
@@ -118,79 +177,275 @@ class OpenAIAnalyzer:
                     "error": str(e)
                 }
 
+    ########################################## Streaming Mode ##########################################
+    @track_call("llm", "stream_structured_output", provider="openai")
+    @replayable("openai", "stream_structured_output", callback="on_item")
+    def stream_structured_output(self, prompt, model: str = None, response_format=None, list_field: str = "output",
+                                 on_item=None, collect_items: bool = True):
+        """
+        Stream a structured response whose schema wraps a list, handing over items as they complete
 
-class GeminiService:
-    """Service for handling Google Gemini AI interactions"""
+        Each item of `list_field` is validated against the list's item model as soon as
+        its closing brace is streamed and passed to `on_item`, while the model is still
+        generating the rest of the list.
 
-    def __init__(self):
-        """Initialize Gemini service with API key"""
-        self.api_key = settings.GEMINI_API_KEY
-        if not self.api_key:
-            logger.error("❌ GEMINI_API_KEY not found in environment variables")
-            raise ValueError("GEMINI_API_KEY is required")
+        Args:
+            prompt (str): User prompt
+            model (str): Model to use
+            response_format: Pydantic model with a list field, e.g. SnifferExtractSchema
+            list_field (str): Name of the list field to stream
+            on_item (callable): Called with every validated item as a dict
+            collect_items (bool): Also return the items, disable to keep memory flat
 
-        # Initialize models
-        self.client = genai.Client(api_key=self.api_key)
-        if not self.client:
-            logger.error("❌ Failed to initialize Gemini client")
-            raise ValueError("Failed to initialize Gemini client")
-
-        # Define the grounding tool
-        self.grounding_tool = types.Tool(
-            google_search=types.GoogleSearch()
-        )
-
-        # Configure generation settings
-        self.config = types.GenerateContentConfig(
-            tools=[self.grounding_tool]
-        )
-
-        logger.info("✅ Gemini service initialized successfully")
-
-    def search_google(self,prompt, model:str = "gemini-2.0-flash"):
-        """Generate a search response using Gemini"""
-        response = self.client.models.generate_content(
-                model=model,
-                contents=prompt,
-                config=self.config,
+        Returns:
+            dict: Same shape as structured_output, with item_count and invalid_count
+        """
+        model = model or self.model
+        item_model = get_args(response_format.model_fields[list_field].annotation)[0]
+        parser = JsonArrayItemParser(list_field)
+        items = []
+        item_count = 0
+        invalid_count = 0
+        usage = None
+        status = "incomplete"
+        stack = ExitStack()
+
+        try:
+            estimated_tokens = estimate_tokens(prompt)
+            # Only opening the stream is retried, a retry mid-stream would repeat items
+            stream = self.limiter.run(
+                lambda: stack.enter_context(self.client.responses.stream(
+                    model=model,
+                    temperature=0.7,
+                    input=[
+                        {"role": "system", "content": "Extract entities from the input text"},
+                        {"role": "user", "content": prompt},
+                    ],
+                    text_format=response_format,
+                )),
+                tokens=estimated_tokens,
             )
-        
-        if response.candidates:
-            try:
-                for part in response.candidates[0].content.parts:
-                    if part.text is not None:
-                        return {
-                                "success": True,
-                                "data":part.text,
-                                "status":"completed",
-                                "token_usage":{
-                                    "prompt_token":response.usage_metadata.prompt_token_count,
-                                    "completion_token":response.usage_metadata.candidates_token_count, 
-                                    "output_token":0, 
-                                    "total_token":response.usage_metadata.total_token_count
-                                    },
-                                "error": None
-                            }
-                        
-                else:
-                    return {
-                        "success": False,
-                        "data": None,
-                        "status":"completed",
-                        "token_usage":{"prompt_token":0,"completion_token":0, "output_token":0, "total_token":0},
-                        "error": None
-                    }
-            except Exception as e:
-                logger.error(f"Error searching Google: {e}")
-                return {
-                        "success": False,
-                        "data": None,
-                        "status":"completed",
-                        "token_usage":{"prompt_token":0,"completion_token":0, "output_token":0, "total_token":0},
-                        "error": str(e)
-                    }
-                
+
+            for event in stream:
+                if event.type == "response.output_text.delta":
+                    for raw_item in parser.feed(event.delta):
+                        try:
+                            item = item_model.model_validate_json(raw_item).model_dump()
+                        except ValidationError as e:
+                            invalid_count += 1
+                            logger.warning(f"Skipping invalid streamed item: {e}")
+                            continue
+                        item_count += 1
+                        if on_item:
+                            on_item(item)
+                        if collect_items:
+                            items.append(item)
+                elif event.type in ["response.completed", "response.incomplete", "response.failed"]:
+                    usage = event.response.usage
+                    status = event.response.status
+
+            if usage:
+                self.limiter.record_tokens(usage.total_tokens, estimated_tokens)
+                record_token_usage("openai", model, {"input_token": usage.input_tokens, "output_token": usage.output_tokens})
+            logger.info(f"Streamed {item_count} items ({invalid_count} invalid), status {status}")
+            return {
+                "success": status == "completed",
+                "data": {list_field: items},
+                "status": status,
+                "token_usage": {
+                    "prompt_token": usage.input_tokens if usage else 0,
+                    "completion_token": 0,
+                    "output_token": usage.output_tokens if usage else 0,
+                    "total_token": usage.total_tokens if usage else 0,
+                },
+                "item_count": item_count,
+                "invalid_count": invalid_count,
+                "error": None if status == "completed" else f"Stream ended with status {status}",
+            }
+        except Exception as e:
+            return {
+                "success": False,
+                "data": {list_field: items},
+                "status": "Error",
+                "token_usage": {"prompt_token": 0, "completion_token": 0, "output_token": 0, "total_token": 0},
+                "item_count": item_count,
+                "invalid_count": invalid_count,
+                "error": str(e),
+            }
+        finally:
+            stack.close()
+
+    ############################################ Batch Mode ############################################
+    def build_batch_file(self, prompts: list, file_path: str, model: str = None, response_format=None,
+                         system_message: str = "Extract entities from the input text"):
+        """
+        Write structured-output chat requests to a JSONL batch input file
+
+        Args:
+            prompts (list): User prompts, one request per prompt
+            file_path (str): Path of the JSONL file to write
+            model (str): Model to use for every request
+            response_format: Pydantic model the responses must follow
+            system_message (str): System message sent with every prompt
+
+        Returns:
+            list: custom_id of every request, in the order of the prompts
+        """
+        model = model or self.model
+        body_format = {"type": "json_schema", "json_schema": json_schema_format(response_format)} if response_format else None
+
+        custom_ids = []
+        with open(file_path, "w", encoding="utf-8") as file:
+            for index, prompt in enumerate(prompts):
+                custom_id = f"request-{index}"
+                body = {
+                    "model": model,
+                    "messages": [
+                        {"role": "system", "content": system_message},
+                        {"role": "user", "content": prompt},
+                    ],
+                }
+                if body_format:
+                    body["response_format"] = body_format
+
+                file.write(json.dumps({"custom_id": custom_id, "method": "POST", "url": "/v1/chat/completions", "body": body}) + "\n")
+                custom_ids.append(custom_id)
+
+        logger.info(f"Wrote {len(custom_ids)} batch requests to {file_path}")
+        return custom_ids
+
+    def submit_batch(self, file_path: str, completion_window: str = "24h"):
+        """Upload a JSONL batch input file and create the batch, returning the batch id"""
+        with open(file_path, "rb") as file:
+            batch_file = self.limiter.run(lambda: self.client.files.create(file=file, purpose="batch"))
+
+        batch = self.limiter.run(lambda: self.client.batches.create(
+            input_file_id=batch_file.id,
+            endpoint="/v1/chat/completions",
+            completion_window=completion_window,
+        ))
+        logger.info(f"Submitted batch {batch.id} with input file {batch_file.id}")
+        return batch.id
+
+    def poll_batch(self, batch_id: str, poll_interval: float = None, timeout: float = None):
+        """
+        Poll a batch until it reaches a terminal status
+
+        Args:
+            batch_id (str): Batch to poll
+            poll_interval (float): Seconds between polls
+            timeout (float): Maximum seconds to wait, None to wait for the completion window
+
+        Returns:
+            Batch: The batch object in its final state
+        """
+        poll_interval = poll_interval or settings.OPENAI_BATCH_POLL_SECONDS
+        started_at = time.monotonic()
+
+        while True:
+            batch = self.limiter.run(lambda: self.client.batches.retrieve(batch_id))
+            if batch.status in ["completed", "failed", "expired", "cancelled"]:
+                logger.info(f"Batch {batch_id} finished with status {batch.status}")
+                return batch
+            if timeout and time.monotonic() - started_at > timeout:
+                raise TimeoutError(f"Batch {batch_id} still {batch.status} after {timeout}s")
+            time.sleep(poll_interval)
+
+    def collect_batch_results(self, batch, response_format=None) -> dict:
+        """
+        Download and parse the output of a finished batch
+
+        Args:
+            batch: Finished batch object
+            response_format: Pydantic model used to validate each response
+
+        Returns:
+            dict: Result per custom_id, in the same shape as get_structured_response
+        """
+        results = {}
+        for file_id in [batch.output_file_id, batch.error_file_id]:
+            if not file_id:
+                continue
+            content = self.limiter.run(lambda: self.client.files.content(file_id)).text
+
+            for line in content.splitlines():
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                results[entry["custom_id"]] = self._parse_batch_entry(entry, response_format)
+
+        return results
+
+    def _parse_batch_entry(self, entry: dict, response_format=None) -> dict:
+        """Convert one line of a batch output file into a result dict"""
+        response = entry.get("response") or {}
+        body = response.get("body") or {}
+        usage = body.get("usage") or {}
+        token_usage = {
+            "prompt_token": usage.get("prompt_tokens", 0),
+            "completion_token": usage.get("completion_tokens", 0),
+            "output_token": 0,
+            "total_token": usage.get("total_tokens", 0)
+        }
+        record_token_usage("openai_batch", body.get("model"), token_usage)
+
+        if entry.get("error") or response.get("status_code") != 200:
+            return {"success": False, "data": None, "status": "Error", "token_usage": token_usage,
+                    "error": str(entry.get("error") or body.get("error"))}
+
+        try:
+            content = body["choices"][0]["message"]["content"]
+            data = response_format.model_validate_json(content).model_dump() if response_format else json.loads(content)
+            return {"success": True, "data": data, "status": "completed", "token_usage": token_usage, "error": None}
+        except Exception as e:
+            return {"success": False, "data": None, "status": "Error", "token_usage": token_usage, "error": str(e)}
+
+    @track_call("llm", "batch_structured_output", provider="openai_batch")
+    @replayable("openai", "batch_structured_output")
+    def batch_structured_output(self, prompts: list, model: str = None, response_format=None, file_path: str = None,
+                                poll_interval: float = None, timeout: float = None,
+                                system_message: str = "Extract entities from the input text") -> list:
+        """
+        Run many structured-output requests through the Batch API instead of live calls
+
+        Args:
+            prompts (list): User prompts, one per originating record
+            model (str): Model to use
+            response_format: Pydantic model the responses must follow
+            file_path (str): Where to write the JSONL input file, a temp file by default
+            poll_interval (float): Seconds between status polls
+            timeout (float): Maximum seconds to wait for the batch
+            system_message (str): System message sent with every prompt
+
+        Returns:
+            list: One result dict per prompt, in prompt order
+        """
+        temporary = not file_path
+        if temporary:
+            file_path = os.path.join(tempfile.gettempdir(), f"openai_batch_{uuid.uuid4().hex}.jsonl")
+
+        try:
+            custom_ids = self.build_batch_file(prompts, file_path, model=model, response_format=response_format,
+                                               system_message=system_message)
+            batch_id = self.submit_batch(file_path)
+        finally:
+            # The input file is uploaded by now, or the batch never started
+            if temporary and os.path.exists(file_path):
+                os.remove(file_path)
+
+        batch = self.poll_batch(batch_id, poll_interval=poll_interval, timeout=timeout)
+        results = self.collect_batch_results(batch, response_format=response_format)
+
+        missing = {"success": False, "data": None, "status": batch.status,
+                   "token_usage": {"prompt_token": 0, "completion_token": 0, "output_token": 0, "total_token": 0},
+                   "error": f"No result for request in batch {batch_id}"}
+        return [results.get(custom_id, missing) for custom_id in custom_ids]
+
+
+@lru_cache(maxsize=None)
+def get_openai_analyzer() -> OpenAIAnalyzer:
+    """Shared OpenAIAnalyzer, built on first use (FastAPI dependency)"""
+    return OpenAIAnalyzer()
 
 
-openai_analyzer = OpenAIAnalyzer()
-gemini_service = GeminiService()
+openai_analyzer = LazyProxy(get_openai_analyzer)
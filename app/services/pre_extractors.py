@@ -0,0 +1,202 @@
+"""
+Pattern based pre-extraction of lender rate fields
+
+Fields such as the home loan ROI, LTV, processing fee or minimum credit score follow
+very regular wording on bank pages ("8.50% p.a.", "up to 90% of the property value",
+"CIBIL 750+"). A compiled pattern library scans the crawled corpus once, line by
+line, and emits candidate values with their source url and a confidence score, so
+the LLM only has to be asked for the fields it could not fill.
+"""
+
+import re
+import logging
+from dataclasses import dataclass
+from typing import Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+PERCENT = r"(\d{1,2}(?:\.\d{1,2})?)\s*%"
+PERCENT_RANGE = PERCENT + r"\s*(?:-|–|to)\s*" + PERCENT
+AMOUNT = r"(?:₹|rs\.?|inr)\s*([\d,]+(?:\.\d+)?)\s*(lakhs?|lacs?|crores?|cr)?"
+
+LAP_WORDS = ["loan against property", "lap "]
+PENALTY_WORDS = ["penal", "overdue", "delayed", "default", "bounce", "late payment", "savings", "deposit", "fd "]
+
+
+@dataclass
+class FieldPattern:
+    """Value pattern of one field, only tried on lines containing one of its triggers"""
+    field: str
+    triggers: List[str]
+    pattern: str
+    confidence: float
+    format: Callable[[re.Match], Optional[str]]
+    require: Optional[List[str]] = None
+    exclude: Optional[List[str]] = None
+    boost: Optional[List[str]] = None
+
+
+def _percent_range(match: re.Match, low: float, high: float) -> Optional[str]:
+    values = [float(value) for value in match.groups() if value is not None]
+    if not values or not all(low <= value <= high for value in values):
+        return None
+    if len(values) == 2:
+        return f"{values[0]:g}% - {values[1]:g}%"
+    return f"{values[0]:g}%"
+
+
+def _upto_percent(match: re.Match, low: float, high: float) -> Optional[str]:
+    value = float(match.group(1))
+    return f"Up to {value:g}%" if low <= value <= high else None
+
+
+def _fee(match: re.Match) -> Optional[str]:
+    text = re.sub(r"\s+", " ", match.group(0)).strip(" ,.;")
+    return text[0].upper() + text[1:] if text else None
+
+
+def _credit_score(match: re.Match) -> Optional[str]:
+    value = int(match.group(1))
+    return str(value) if 600 <= value <= 900 else None
+
+
+def _tenure(match: re.Match) -> Optional[str]:
+    low, high, upto = match.group(1), match.group(2), match.group(3)
+    if low and high:
+        return f"{int(low)} - {int(high)} years" if 0 < int(low) < int(high) <= 40 else None
+    return f"Up to {int(upto)} years" if upto and 1 <= int(upto) <= 40 else None
+
+
+def _amount(match: re.Match) -> Optional[str]:
+    number, unit = match.group(1).replace(",", ""), (match.group(2) or "").lower()
+    if not number:
+        return None
+    unit = "lakh" if unit.startswith("la") else "crore" if unit.startswith("cr") else ""
+    return f"Rs {number} {unit}".strip()
+
+
+def _phone(match: re.Match) -> Optional[str]:
+    digits = re.sub(r"\D", "", match.group(0))
+    return digits if 10 <= len(digits) <= 12 else None
+
+
+INTEREST_WORDS = ["interest rate", "rate of interest", "roi", "interest rates", "% p.a", "% per annum"]
+LTV_WORDS = ["ltv", "loan to value", "loan-to-value", "of the property value", "of property value", "of the market value", "funding"]
+
+PATTERNS: List[FieldPattern] = [
+    FieldPattern("homeloanroi", INTEREST_WORDS, PERCENT_RANGE + "|" + PERCENT, 0.6,
+                 lambda match: _percent_range(match, 5, 20),
+                 exclude=LAP_WORDS + PENALTY_WORDS, boost=["home loan", "housing loan"]),
+    FieldPattern("laproi", INTEREST_WORDS, PERCENT_RANGE + "|" + PERCENT, 0.6,
+                 lambda match: _percent_range(match, 6, 25),
+                 require=LAP_WORDS, exclude=PENALTY_WORDS, boost=["interest"]),
+    FieldPattern("homeloanltv", LTV_WORDS, r"(?:up\s*to|upto|maximum of|max\.?)\s*" + PERCENT, 0.7,
+                 lambda match: _upto_percent(match, 50, 95),
+                 exclude=LAP_WORDS, boost=["home loan", "ltv", "loan to value"]),
+    FieldPattern("lapltv", LTV_WORDS, r"(?:up\s*to|upto|maximum of|max\.?)\s*" + PERCENT, 0.7,
+                 lambda match: _upto_percent(match, 30, 80), require=LAP_WORDS),
+    FieldPattern("processingfees", ["processing fee", "processing charge"],
+                 r"(?:up\s*to\s*|upto\s*)?(?:" + PERCENT + r"|" + AMOUNT + r")(?:\s*of\s*(?:the\s*)?loan\s*amount)?(?:\s*(?:\+|plus)\s*(?:gst|taxes|applicable taxes))?|\bnil\b",
+                 0.75, _fee),
+    FieldPattern("prepaymentcharges", ["prepayment", "pre-payment", "part payment"],
+                 r"\bnil\b|" + PERCENT + r"(?:\s*of\s*(?:the\s*)?(?:amount prepaid|principal outstanding|outstanding))?", 0.65, _fee,
+                 exclude=["foreclosure"]),
+    FieldPattern("foreclosurecharges", ["foreclosure", "fore-closure", "pre-closure", "preclosure"],
+                 r"\bnil\b|" + PERCENT + r"(?:\s*of\s*(?:the\s*)?(?:principal outstanding|outstanding))?", 0.65, _fee),
+    FieldPattern("minimumcreditscore", ["credit score", "cibil"], r"\b(\d{3})\s*(?:\+|and above|or above|or more)?", 0.7,
+                 _credit_score, boost=["minimum", "above", "+"]),
+    FieldPattern("loantenurerange", ["tenure", "repayment period", "loan term"],
+                 r"(?:(\d{1,2})\s*(?:-|–|to)\s*(\d{1,2})|(?:up\s*to|upto|maximum of|max\.?)\s*(\d{1,2}))\s*(?:years|yrs)", 0.7,
+                 _tenure),
+    FieldPattern("maximumloanamount", ["loan amount", "loan of up to", "loans up to", "maximum loan"],
+                 r"(?:up\s*to|upto|maximum of|max\.?)\s*" + AMOUNT, 0.6, _amount, exclude=["minimum"]),
+    FieldPattern("minimumloanamount", ["loan amount", "minimum loan", "starting from", "as low as"],
+                 r"(?:minimum(?: of)?|starting from|as low as|from)\s*" + AMOUNT, 0.6, _amount),
+    FieldPattern("customersupportcontactnumbers", ["toll free", "toll-free", "customer care", "helpline", "call us", "customer support"],
+                 r"1800[\s-]?\d{3,4}[\s-]?\d{3,4}|(?<!\d)[6-9]\d{9}(?!\d)", 0.85, _phone),
+]
+
+_COMPILED = [(pattern, re.compile(pattern.pattern, re.IGNORECASE)) for pattern in PATTERNS]
+# One alternation of every trigger, so each line is scanned once to find the fields worth trying
+_TRIGGERS = re.compile("|".join(sorted({re.escape(trigger) for pattern in PATTERNS for trigger in pattern.triggers}, key=len, reverse=True)),
+                       re.IGNORECASE)
+
+
+def scan_text(text: str, url: str = None) -> List[dict]:
+    """
+    Candidate values of the lender fields in one page
+
+    Args:
+        text (str): Page text, one passage per line
+        url (str): Source url of the text
+
+    Returns:
+        list: Candidates as {"field", "value", "url", "confidence", "snippet"}
+    """
+    candidates = []
+    for line in text.splitlines():
+        lower = line.lower()
+        triggers = {match.group(0).lower() for match in _TRIGGERS.finditer(lower)}
+        if not triggers:
+            continue
+        for pattern, compiled in _COMPILED:
+            if not any(trigger in triggers for trigger in pattern.triggers):
+                continue
+            if pattern.require and not any(word in lower for word in pattern.require):
+                continue
+            if pattern.exclude and any(word in lower for word in pattern.exclude):
+                continue
+            for match in compiled.finditer(line):
+                value = pattern.format(match)
+                if not value:
+                    continue
+                confidence = pattern.confidence
+                if pattern.boost and any(word in lower for word in pattern.boost):
+                    confidence += 0.15
+                if len(line) > 400:
+                    # Values in long passages are more likely to belong to another product
+                    confidence -= 0.1
+                candidates.append({
+                    "field": pattern.field,
+                    "value": value,
+                    "url": url,
+                    "confidence": round(min(confidence, 0.95), 2),
+                    "snippet": line.strip()[:200],
+                })
+                break
+    return candidates
+
+
+def pre_extract(extracted_data: Dict[str, str], min_confidence: float = 0.8) -> Tuple[Dict[str, str], Dict[str, dict]]:
+    """
+    Fill the lender fields the patterns are confident about
+
+    The same value found on several pages or lines reinforces its confidence
+    (1 - product of the misses); the best value per field is kept.
+
+    Args:
+        extracted_data (dict): Page text keyed by source url
+        min_confidence (float): Minimum combined confidence to fill a field
+
+    Returns:
+        tuple: (values by field, best candidate by field including the unconfident ones)
+    """
+    grouped: Dict[Tuple[str, str], dict] = {}
+    for url, text in extracted_data.items():
+        for candidate in scan_text(text, url):
+            key = (candidate["field"], candidate["value"].lower())
+            entry = grouped.setdefault(key, {**candidate, "miss": 1.0, "urls": []})
+            entry["miss"] *= 1 - candidate["confidence"]
+            if url not in entry["urls"]:
+                entry["urls"].append(url)
+
+    best: Dict[str, dict] = {}
+    for (field, _), entry in grouped.items():
+        combined = round(1 - entry["miss"], 3)
+        if field not in best or combined > best[field]["confidence"]:
+            best[field] = {"value": entry["value"], "url": entry["url"], "urls": entry["urls"],
+                           "confidence": combined, "snippet": entry["snippet"]}
+
+    values = {field: candidate["value"] for field, candidate in best.items() if candidate["confidence"] >= min_confidence}
+    logger.info(f"Pre-extracted {len(values)} of {len(best)} candidate fields with confidence >= {min_confidence}")
+    return values, best
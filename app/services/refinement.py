@@ -0,0 +1,366 @@
+"""
+Rule-based refinement of scraped records
+
+Applies the normalization rules of refinement_prompt / refinement_prompt_v2 to whole
+batches of records with vectorized pandas string operations: currency and units
+stripped from numbers, percentages to numbers, months to years, digit-only phones
+and PINs, trimmed text and de-duplicated lists. The type of each field of the target
+Pydantic model decides which rule applies to it; text fields holding rates, amounts,
+tenures or scores are recognized by their name (or REFINEMENT_NUMBER_FIELDS) and
+get the number rules too. Cells the rules cannot parse are kept as they are and
+reported, so only those are sent to the LLM.
+"""
+
+import re
+import json
+import logging
+from typing import Dict, List, Optional, Tuple, Union, get_args, get_origin
+
+from pydantic import create_model
+
+from app.config.settings import settings
+from app.utils.prompts import refinement_prompt_v2
+
+logger = logging.getLogger(__name__)
+
+PLACEHOLDERS = ["", "n/a", "na", "not found", "not available", "none", "null", "-", "--"]
+
+PHONE_FIELD = re.compile(r"phone|mobile|telephone|whatsapp|contact_?numbers?", re.IGNORECASE)
+PIN_FIELD = re.compile(r"pin_?code|^pin$|postal|zip", re.IGNORECASE)
+EMAIL_FIELD = re.compile(r"e_?mail", re.IGNORECASE)
+# Text fields holding numbers, e.g. homeloanroi, minimum_loan_amount, loantenurerange, minimumcreditscore
+NUMBER_FIELD = re.compile(r"roi|rate|ltv|foir|interest|amount|income|fees?|charges|price|cost|salary|tenure|experience|duration|score",
+                          re.IGNORECASE)
+INTEGER_FIELD = re.compile(r"score", re.IGNORECASE)
+
+CURRENCY = r"₹|\brs\b\.?|\binr\b|\busd\b|\$|\brupees?\b"
+QUALIFIERS = r"\bup\s*to\b|\bupto\b|\babout\b|\bapprox(?:imately|\.)?|\baround\b|~|\bp\.?\s?a\.?(?=\s|$)|\bper annum\b|\bonwards\b|\+"
+NUMBER = re.compile(
+    r"^(?P<value>-?\d+(?:\.\d+)?)\s*(?P<unit>%|percent|lakhs?|lacs?|crores?|cr|k|thousand|million|mn|months?|mos?|years?|yrs?)?$")
+ZERO_WORDS = r"^(?:nil|zero|free|no charges?)$"
+RANGE = re.compile(r"^(?P<low>.+?)\s*(?:-|–|—|\bto\b)\s*(?P<high>.+)$")
+PHONE_NUMBER = r"\+?\d[\d\s\-()]{6,}\d"
+EMAIL = r"[\w.+-]+@[\w-]+(?:\.[\w-]+)+"
+
+UNIT_MULTIPLIERS = {
+    "lakh": 1e5, "lakhs": 1e5, "lac": 1e5, "lacs": 1e5,
+    "crore": 1e7, "crores": 1e7, "cr": 1e7,
+    "k": 1e3, "thousand": 1e3, "million": 1e6, "mn": 1e6,
+    "month": 1 / 12, "months": 1 / 12, "mo": 1 / 12, "mos": 1 / 12,
+}
+
+
+def field_kind(annotation) -> Tuple[str, bool]:
+    """Rule family of a field annotation and whether it accepts None"""
+    optional = False
+    if get_origin(annotation) is Union:
+        arguments = [argument for argument in get_args(annotation) if argument is not type(None)]
+        optional = len(arguments) < len(get_args(annotation))
+        annotation = arguments[0] if len(arguments) == 1 else str
+    if annotation is bool:
+        return "bool", optional
+    if annotation is int:
+        return "int", optional
+    if annotation is float:
+        return "float", optional
+    if get_origin(annotation) is list or annotation is list:
+        return "list", optional
+    if annotation is str:
+        return "str", optional
+    return "other", optional
+
+
+def number_rule(name: str) -> Optional[str]:
+    """"integer" or "number" for text fields that hold numbers, None for plain text"""
+    configured = {field.strip().lower() for field in settings.REFINEMENT_NUMBER_FIELDS.split(",") if field.strip()}
+    if name.lower() in configured or NUMBER_FIELD.search(name):
+        return "integer" if INTEGER_FIELD.search(name) else "number"
+    return None
+
+
+########################################## Column Rules ##########################################
+def _text(column):
+    """String view of a column with whitespace collapsed, None where empty"""
+    import pandas as pd
+
+    text = column.where(column.notna(), None).astype("string").str.strip().str.replace(r"\s+", " ", regex=True)
+    return text.mask(text.str.lower().isin(PLACEHOLDERS), pd.NA)
+
+
+def _parse_numbers(text):
+    """Value and unit of the cells of a lower-cased text column holding a single number"""
+    import pandas as pd
+
+    stripped = (text.str.replace(CURRENCY, "", regex=True)
+                    .str.replace(QUALIFIERS, "", regex=True)
+                    .str.replace(r"(?<=\d),(?=\d)", "", regex=True)
+                    .str.strip())
+    parts = stripped.str.extract(NUMBER)
+    values = pd.to_numeric(parts["value"], errors="coerce")
+    values = values.mask(stripped.str.fullmatch(ZERO_WORDS).fillna(False).astype(bool), 0.0)
+    return values, parts["unit"]
+
+
+def _apply_units(values, units):
+    """Lakh/crore expanded and months as years"""
+    return values * units.map(UNIT_MULTIPLIERS).fillna(1.0).astype(float)
+
+
+def _round(values, integer: bool):
+    import numpy as np
+
+    if integer:
+        # Only clearly integral values are kept, the others are left to the LLM
+        return values.where(np.isclose(values, values.round()), np.nan).round()
+    return values.round(2)
+
+
+def refine_number(column, integer: bool = False):
+    """Numbers without currency, separators or units; lakh/crore expanded and months as years"""
+    import pandas as pd
+
+    text = _text(column).str.lower()
+    values = _round(_apply_units(*_parse_numbers(text)), integer)
+
+    # Already numeric inputs pass through
+    numeric_input = pd.to_numeric(column, errors="coerce").where(column.map(lambda value: isinstance(value, (int, float)) and not isinstance(value, bool)))
+    values = values.fillna(numeric_input)
+
+    unresolved = text.notna() & values.isna()
+    cast = int if integer else float
+    output = pd.Series([cast(value) if pd.notna(value) else None for value in values], index=values.index, dtype=object)
+    return output, unresolved.fillna(False).astype(bool)
+
+
+def refine_number_text(column, integer: bool = False):
+    """
+    Number rules for fields typed as text: single values, or "low - high" ranges, as number text
+
+    "8.50% - 9.20% p.a." becomes "8.5 - 9.2", "Rs. 5 - 10 lakh" becomes "500000 - 1000000"
+    and "up to 360 months" becomes "30"; a unit written once applies to both ends of a range.
+    """
+    import pandas as pd
+
+    text = _text(column).str.lower()
+    single = _round(_apply_units(*_parse_numbers(text)), integer)
+
+    ranges = text.str.extract(RANGE)
+    low, low_units = _parse_numbers(ranges["low"])
+    high, high_units = _parse_numbers(ranges["high"])
+    low = _round(_apply_units(low, low_units.fillna(high_units)), integer)
+    high = _round(_apply_units(high, high_units), integer)
+
+    def render(value):
+        return str(int(value)) if float(value).is_integer() else f"{value:.2f}".rstrip("0").rstrip(".")
+
+    values = pd.Series([
+        render(value) if pd.notna(value)
+        else f"{render(lower)} - {render(upper)}" if pd.notna(lower) and pd.notna(upper)
+        else None
+        for value, lower, upper in zip(single, low, high)
+    ], index=column.index, dtype=object)
+    unresolved = text.notna() & values.isna()
+    return values, unresolved.fillna(False).astype(bool)
+
+
+def refine_bool(column):
+    import pandas as pd
+
+    mapping = {"yes": True, "true": True, "y": True, "1": True, "no": False, "false": False, "n": False, "0": False}
+    text = _text(column).str.lower()
+    values = text.map(mapping, na_action="ignore")
+    values = values.where(values.notna(), column.where(column.map(lambda value: isinstance(value, bool))))
+    unresolved = text.notna() & values.isna()
+    return values.astype(object).where(values.notna(), None), unresolved.fillna(False).astype(bool)
+
+
+def refine_phone(column, as_list: bool = False):
+    """Digit-only phone numbers, several numbers in one text field are joined with ", " """
+    text = _text(column)
+    numbers = text.str.findall(PHONE_NUMBER).map(
+        lambda found: [re.sub(r"\D", "", number) for number in found] if isinstance(found, list) else [])
+    numbers = numbers.map(lambda found: list(dict.fromkeys(number for number in found if 8 <= len(number) <= 13)))
+    unresolved = text.notna() & (numbers.map(len) == 0)
+    if as_list:
+        return numbers.map(lambda found: found or None), unresolved.fillna(False).astype(bool)
+    return numbers.map(lambda found: ", ".join(found) or None), unresolved.fillna(False).astype(bool)
+
+
+def refine_pin(column):
+    """6 digit Indian PIN codes, null when there is none"""
+    text = _text(column)
+    pins = text.str.replace(r"(?<=\d)\s+(?=\d)", "", regex=True).str.extract(r"(?<!\d)(\d{6})(?!\d)")[0]
+    return pins.astype(object).where(pins.notna(), None), (text.notna() & pins.isna()).fillna(False).astype(bool)
+
+
+def refine_email(column):
+    text = _text(column)
+    emails = text.str.lower().str.extract(f"({EMAIL})")[0]
+    return emails.astype(object).where(emails.notna(), None), (text.notna() & emails.isna()).fillna(False).astype(bool)
+
+
+def refine_text(column):
+    text = _text(column).str.replace(r"[\s,;:.]+$", "", regex=True)
+    return text.astype(object).where(text.notna(), None), text.isna() & False
+
+
+def refine_list(column):
+    """Trimmed, de-duplicated lists from lists or delimited text"""
+    def to_list(value):
+        if value is None or (isinstance(value, float) and value != value):
+            return None
+        if isinstance(value, str):
+            value = value.strip()
+            if value.startswith("["):
+                try:
+                    value = json.loads(value)
+                except json.JSONDecodeError:
+                    value = re.split(r"[,;|\n]", value.strip("[]"))
+            else:
+                value = re.split(r"[,;|\n]", value)
+        if not isinstance(value, (list, tuple, set)):
+            value = [value]
+
+        items, seen = [], set()
+        for item in value:
+            item = re.sub(r"\s+", " ", str(item)).strip().strip("'\"") if isinstance(item, str) else item
+            key = item.lower() if isinstance(item, str) else item
+            if item in (None, "") or (isinstance(item, str) and item.lower() in PLACEHOLDERS) or key in seen:
+                continue
+            seen.add(key)
+            items.append(item)
+        return items or None
+
+    values = column.map(to_list)
+    return values, values.isna() & False
+
+
+########################################## Engine ##########################################
+def refine_records(records: List[dict], record_model, fill_text: Optional[str] = None) -> Tuple[List[dict], Dict[int, List[str]]]:
+    """
+    Normalize a batch of records to the fields of `record_model`
+
+    Args:
+        records (list): Scraped records
+        record_model: Pydantic model of a single record
+        fill_text (str): Unstructured text the tools returned next to the records; when
+            present, empty fields are reported so the LLM can fill them from it
+
+    Returns:
+        tuple: (refined records, field names per record index that still need the LLM)
+    """
+    import pandas as pd
+
+    if not records:
+        return [], {}
+
+    frame = pd.DataFrame.from_records(records)
+    unresolved = pd.DataFrame(False, index=frame.index, columns=[])
+
+    for name, field in record_model.model_fields.items():
+        if name not in frame.columns:
+            frame[name] = None
+        column = frame[name].astype(object)
+        kind, optional = field_kind(field.annotation)
+
+        if kind in ("int", "float"):
+            values, failed = refine_number(column, integer=kind == "int")
+        elif kind == "bool":
+            values, failed = refine_bool(column)
+        elif kind == "list":
+            values, failed = refine_phone(column, as_list=True) if PHONE_FIELD.search(name) else refine_list(column)
+        elif kind == "str" and PHONE_FIELD.search(name):
+            values, failed = refine_phone(column)
+        elif kind == "str" and PIN_FIELD.search(name):
+            values, failed = refine_pin(column)
+        elif kind == "str" and EMAIL_FIELD.search(name):
+            values, failed = refine_email(column)
+        elif kind == "str" and number_rule(name):
+            values, failed = refine_number_text(column, integer=number_rule(name) == "integer")
+        elif kind == "str":
+            values, failed = refine_text(column)
+        else:
+            continue
+
+        if kind == "str":
+            # Text the rules could not parse is kept for the LLM, and for the reader if it fails
+            values = values.where(values.notna() | ~failed, _text(column).astype(object))
+        if kind == "str" and not optional:
+            # Required text keeps its placeholder instead of an invalid null
+            values = values.where(values.notna(), column.where(column.notna(), "Not Found"))
+        if fill_text:
+            failed = failed | values.isna() | values.map(lambda value: isinstance(value, str) and value.lower() in PLACEHOLDERS)
+        frame[name] = values
+        unresolved[name] = failed
+
+    # Fields outside the schema are only kept on the records that had them
+    refined = [
+        {
+            key: (None if isinstance(value, float) and value != value else value)
+            for key, value in record.items()
+            if key in record_model.model_fields or key in original
+        }
+        for record, original in zip(frame.astype(object).to_dict(orient="records"), records)
+    ]
+    flagged = unresolved[unresolved.any(axis=1)]
+    needs_llm = {
+        index: [name for name in flagged.columns if row[name]]
+        for index, row in flagged.iterrows()
+    }
+    cells = sum(len(names) for names in needs_llm.values())
+    logger.info(f"Refined {len(refined)} records locally, {cells} of {len(refined) * len(unresolved.columns)} fields need the LLM")
+    return refined, needs_llm
+
+
+def build_partial_model(record_model, field_names: List[str]):
+    """List schema asking only for `field_names` of the records, keyed by record_index"""
+    fields = {"record_index": (int, ...)}
+    for name in field_names:
+        fields[name] = (Optional[record_model.model_fields[name].annotation], None)
+    item_model = create_model(f"{record_model.__name__}Partial", **fields)
+    return create_model(f"{record_model.__name__}PartialRefinement", output=(List[item_model], ...))
+
+
+def refine_records_with_fallback(records: List[dict], record_model, analyzer, model: str = "gpt-4o-2024-08-06",
+                                 text_field: str = "other_data") -> List[dict]:
+    """
+    Refine records locally and send only the unresolved fields to the LLM
+
+    Args:
+        records (list): Scraped records, `text_field` may hold unstructured tool output
+        record_model: Pydantic model of a single record
+        analyzer: OpenAIAnalyzer used for the remaining fields
+        model (str): Model for the remaining fields
+        text_field (str): Record field holding unstructured text to fill empty fields from
+
+    Returns:
+        list: Refined records
+    """
+    fill_text = "\n".join(str(record.pop(text_field)) for record in records if record.get(text_field))
+    refined, needs_llm = refine_records(records, record_model, fill_text=fill_text or None)
+    if not needs_llm:
+        return refined
+
+    field_names = sorted({name for names in needs_llm.values() for name in names})
+    data = [
+        {"record_index": index, **{name: records[index].get(name) for name in names}}
+        for index, names in needs_llm.items()
+    ]
+    prompt = refinement_prompt_v2 + f"\nData: {json.dumps(data, ensure_ascii=False, default=str)}"
+    if fill_text:
+        prompt += f"\nAdditional data to fill the empty fields from: {fill_text}"
+
+    response = analyzer.structured_output(
+        prompt=prompt, response_format=build_partial_model(record_model, field_names), model=model)
+    if not response or not response.get("success"):
+        logger.error(f"LLM refinement of the unresolved fields failed, keeping the local values: {(response or {}).get('error')}")
+        return refined
+
+    for item in (response.get("data") or {}).get("output", []):
+        index = item.get("record_index")
+        if index not in needs_llm:
+            continue
+        for name in needs_llm[index]:
+            if item.get(name) is not None:
+                refined[index][name] = item[name]
+    return refined
@@ -0,0 +1,215 @@
+"""
+Local relevance ranking used to shrink crawled text before it reaches an LLM
+"""
+
+import re
+import math
+import logging
+from collections import Counter
+from functools import lru_cache
+from typing import Dict, List, Optional
+
+from app.config.settings import settings
+from app.services.chunking import count_tokens
+
+logger = logging.getLogger(__name__)
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# Passages are built from consecutive lines up to this many words
+PASSAGE_MAX_WORDS = 30
+
+# Neighbouring passages kept around a match so labels keep their values (e.g. table cells)
+CONTEXT_WINDOW = 1
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercase word tokens used for BM25 scoring"""
+    return TOKEN_PATTERN.findall(text.lower())
+
+
+class BM25:
+    """Okapi BM25 over an in-memory list of passages"""
+
+    def __init__(self, passages: List[str], k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.term_frequencies = [Counter(tokenize(passage)) for passage in passages]
+        self.lengths = [sum(tf.values()) for tf in self.term_frequencies]
+        self.average_length = (sum(self.lengths) / len(self.lengths)) if self.lengths else 0
+
+        document_frequency = Counter()
+        for tf in self.term_frequencies:
+            document_frequency.update(tf.keys())
+
+        total = len(passages)
+        self.idf = {
+            term: math.log(1 + (total - frequency + 0.5) / (frequency + 0.5))
+            for term, frequency in document_frequency.items()
+        }
+
+    def scores(self, query_terms: List[str]) -> List[float]:
+        """Score every passage against the query terms"""
+        query_terms = set(query_terms)
+        results = []
+        for tf, length in zip(self.term_frequencies, self.lengths):
+            score = 0.0
+            norm = self.k1 * (1 - self.b + self.b * length / self.average_length) if self.average_length else self.k1
+            for term in query_terms:
+                frequency = tf.get(term)
+                if frequency:
+                    score += self.idf[term] * frequency * (self.k1 + 1) / (frequency + norm)
+            results.append(score)
+        return results
+
+
+@lru_cache(maxsize=2)
+def get_embedding_model(model_name: str):
+    """Load a small local sentence-transformers model, if installed"""
+    try:
+        from sentence_transformers import SentenceTransformer
+    except ImportError:
+        logger.warning("sentence-transformers is not installed, ranking with BM25 only")
+        return None
+    return SentenceTransformer(model_name, device="cpu")
+
+
+def embedding_scores(passages: List[str], query: str, model_name: str) -> Optional[List[float]]:
+    """Cosine similarity between each passage and the query using local embeddings"""
+    model = get_embedding_model(model_name)
+    if model is None:
+        return None
+
+    vectors = model.encode([query] + passages, normalize_embeddings=True, show_progress_bar=False)
+    query_vector = vectors[0]
+    return [float(vector @ query_vector) for vector in vectors[1:]]
+
+
+def split_passages(text: str, max_words: int = PASSAGE_MAX_WORDS) -> List[str]:
+    """
+    Group consecutive lines of page text into passages of bounded size
+
+    Args:
+        text (str): Page text with one element per line
+        max_words (int): Maximum words per passage
+
+    Returns:
+        list: Passage strings
+    """
+    passages = []
+    current = []
+    current_words = 0
+
+    for line in text.split("\n"):
+        line = line.strip()
+        if not line:
+            continue
+        words = len(line.split())
+        if current and current_words + words > max_words:
+            passages.append("\n".join(current))
+            current, current_words = [], 0
+        current.append(line)
+        current_words += words
+
+    if current:
+        passages.append("\n".join(current))
+    return passages
+
+
+def rank_passages(passages: List[str], keywords: List[str]) -> List[float]:
+    """
+    Rank passages against the use-case keywords
+
+    BM25 is always used; when RELEVANCE_EMBEDDING_MODEL is set and the model can be
+    loaded, its cosine similarity is blended in with the normalized BM25 score.
+
+    Args:
+        passages (list): Passage strings
+        keywords (list): Use-case keywords from config.yaml
+
+    Returns:
+        list: One relevance score per passage
+    """
+    query_terms = [term for keyword in keywords for term in tokenize(keyword)]
+    scores = BM25(passages).scores(query_terms)
+
+    if settings.RELEVANCE_EMBEDDING_MODEL:
+        semantic = embedding_scores(passages, " ".join(keywords), settings.RELEVANCE_EMBEDDING_MODEL)
+        if semantic:
+            top = max(scores) or 1.0
+            scores = [0.5 * (score / top) + 0.5 * max(similarity, 0.0) for score, similarity in zip(scores, semantic)]
+
+    return scores
+
+
+def filter_extracted_data(
+    extracted_data: Dict[str, str],
+    keywords: List[str],
+    token_budget: int = None,
+    top_k: int = None,
+) -> Dict[str, str]:
+    """
+    Keep only the most relevant passages of the crawled pages
+
+    Passages are ranked across all pages, the top-K are kept until the token budget
+    is spent, and the survivors are returned grouped by their source url in the
+    original order.
+
+    Args:
+        extracted_data (dict): Page text keyed by source url
+        keywords (list): Use-case keywords from config.yaml
+        token_budget (int): Maximum tokens to keep
+        top_k (int): Maximum passages to keep
+
+    Returns:
+        dict: Filtered page text keyed by source url
+    """
+    token_budget = token_budget or settings.RELEVANCE_TOKEN_BUDGET
+    top_k = top_k or settings.RELEVANCE_TOP_K
+
+    if not keywords or not extracted_data:
+        return extracted_data
+
+    passages = []
+    for url, text in extracted_data.items():
+        for passage in split_passages(text):
+            passages.append((url, passage))
+
+    if not passages:
+        return extracted_data
+
+    scores = rank_passages([passage for _, passage in passages], keywords)
+    ranked = sorted(range(len(passages)), key=lambda index: scores[index], reverse=True)
+
+    kept = set()
+    used_tokens = 0
+    for index in ranked[:top_k]:
+        if scores[index] <= 0:
+            break
+        window = [
+            neighbour for neighbour in range(index - CONTEXT_WINDOW, index + CONTEXT_WINDOW + 1)
+            if 0 <= neighbour < len(passages) and neighbour not in kept and passages[neighbour][0] == passages[index][0]
+        ]
+        window_tokens = sum(count_tokens(passages[neighbour][1]) for neighbour in window)
+        if used_tokens + window_tokens > token_budget:
+            continue
+        kept.update(window)
+        used_tokens += window_tokens
+
+    # Nothing matched the keywords, so keep the original text instead of dropping it all
+    if not kept:
+        logger.info("No passage matched the use-case keywords, skipping relevance filter")
+        return extracted_data
+
+    filtered_data = {}
+    for index, (url, passage) in enumerate(passages):
+        if index in kept:
+            filtered_data[url] = filtered_data[url] + "\n" + passage if url in filtered_data else passage
+
+    logger.info(f"Relevance filter kept {len(kept)}/{len(passages)} passages ({used_tokens} tokens)")
+    return filtered_data
+
+
+def filter_text(text: str, keywords: List[str], token_budget: int = None, top_k: int = None) -> str:
+    """Relevance filter a single block of text, see filter_extracted_data"""
+    return filter_extracted_data({"text": text}, keywords, token_budget, top_k).get("text", "")
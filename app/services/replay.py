@@ -0,0 +1,270 @@
+"""
+Record/replay of LLM and Firecrawl calls for offline load tests
+
+With REPLAY_MODE=record every call of a @replayable service method is stored on
+disk under REPLAY_DIR, keyed by a hash of its canonical arguments. With
+REPLAY_MODE=replay the stored response is returned instead of calling the
+provider, after a synthetic delay drawn from REPLAY_LATENCY, so the whole
+pipeline runs without network or API keys.
+
+REPLAY_LATENCY is a ";" separated list of `provider=distribution` entries, with
+`default=` for the rest:
+
+    recorded            the latency measured while recording
+    none                no delay
+    fixed:S             S seconds
+    uniform:A,B         between A and B seconds
+    normal:MU,SIGMA     gaussian, clipped at 0
+    lognormal:MEDIAN,SIGMA
+
+e.g. REPLAY_LATENCY="openai=lognormal:4,0.5;firecrawl=uniform:2,8;default=recorded".
+Delays are drawn from a generator seeded with REPLAY_SEED and the request key, so
+the same request always waits the same time whatever the concurrency.
+"""
+
+import os
+import json
+import math
+import time
+import random
+import inspect
+import hashlib
+import logging
+import tempfile
+import functools
+import threading
+from datetime import datetime
+from typing import Dict, Optional
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+# Any non-empty key lets the SDK clients be built when nothing is sent to the providers
+OFFLINE_API_KEY = "replay-offline"
+
+TYPE_MARKER = "__replay_type__"
+
+
+class ReplayMissError(LookupError):
+    """Raised in replay mode when a call was never recorded"""
+
+
+class ReplayedObject(dict):
+    """Recorded SDK response object, readable both as a dict and through attributes"""
+
+    def __getattr__(self, name):
+        try:
+            return self[name]
+        except KeyError:
+            raise AttributeError(name) from None
+
+
+def is_replaying() -> bool:
+    return settings.REPLAY_MODE == "replay"
+
+
+def offline_api_key(api_key: Optional[str]) -> Optional[str]:
+    """The configured API key, or a placeholder while replaying without one"""
+    if not api_key and is_replaying():
+        return OFFLINE_API_KEY
+    return api_key
+
+
+########################################## Serialization ##########################################
+def to_jsonable(value):
+    """Convert a service argument or response into JSON, keeping the type name of objects"""
+    if value is None or isinstance(value, (str, int, float, bool)):
+        return value
+    if isinstance(value, dict):
+        return {str(key): to_jsonable(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple, set)):
+        return [to_jsonable(item) for item in value]
+    if inspect.isclass(value) and hasattr(value, "model_json_schema"):
+        # Response formats are pydantic classes, their schema is what reaches the provider
+        return {TYPE_MARKER: "schema", "name": value.__name__, "schema": value.model_json_schema()}
+    if hasattr(value, "model_dump"):
+        return {TYPE_MARKER: type(value).__name__, **to_jsonable(value.model_dump())}
+    if hasattr(value, "__dict__"):
+        public = {key: item for key, item in vars(value).items() if not key.startswith("_")}
+        return {TYPE_MARKER: type(value).__name__, **to_jsonable(public)}
+    return str(value)
+
+
+def from_jsonable(value):
+    """Rebuild a recorded response, objects come back as ReplayedObject"""
+    if isinstance(value, list):
+        return [from_jsonable(item) for item in value]
+    if isinstance(value, dict):
+        items = {key: from_jsonable(item) for key, item in value.items() if key != TYPE_MARKER}
+        return ReplayedObject(items) if TYPE_MARKER in value else items
+    return value
+
+
+def request_key(provider: str, operation: str, arguments: dict) -> str:
+    """Hash of the canonical JSON of a call"""
+    canonical = json.dumps(
+        {"provider": provider, "operation": operation, "arguments": to_jsonable(arguments)},
+        sort_keys=True, separators=(",", ":"), ensure_ascii=False,
+    )
+    return hashlib.sha256(canonical.encode()).hexdigest()
+
+
+########################################## Latency ##########################################
+def parse_latency_spec(spec: str) -> Dict[str, str]:
+    """Distribution per provider from a REPLAY_LATENCY string"""
+    distributions = {}
+    for entry in (spec or "").split(";"):
+        entry = entry.strip()
+        if not entry:
+            continue
+        provider, separator, distribution = entry.partition("=")
+        if not separator:
+            provider, distribution = "default", entry
+        distributions[provider.strip()] = distribution.strip()
+    return distributions
+
+
+def synthetic_latency(provider: str, key: str, recorded: float) -> float:
+    """Seconds to wait before returning a replayed response"""
+    distributions = parse_latency_spec(settings.REPLAY_LATENCY)
+    distribution = distributions.get(provider) or distributions.get("default") or "recorded"
+    name, _, params = distribution.partition(":")
+    values = [float(value) for value in params.split(",") if value.strip()]
+    rng = random.Random(f"{settings.REPLAY_SEED}:{key}")
+
+    if name == "recorded":
+        latency = recorded or 0.0
+    elif name == "none":
+        latency = 0.0
+    elif name == "fixed":
+        latency = values[0]
+    elif name == "uniform":
+        latency = rng.uniform(values[0], values[1])
+    elif name == "normal":
+        latency = rng.gauss(values[0], values[1])
+    elif name == "lognormal":
+        latency = rng.lognormvariate(math.log(values[0]), values[1])
+    else:
+        raise ValueError(f"Unknown replay latency distribution: {distribution}")
+    return max(latency, 0.0) * settings.REPLAY_LATENCY_SCALE
+
+
+########################################## Store ##########################################
+class ReplayStore:
+    """One JSON file per recorded call under <root>/<provider>/<operation>/<key>.json"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.cache: Dict[str, dict] = {}
+        self.lock = threading.Lock()
+
+    def path(self, provider: str, operation: str, key: str) -> str:
+        return os.path.join(self.root, provider, operation, f"{key}.json")
+
+    def load(self, provider: str, operation: str, key: str) -> Optional[dict]:
+        path = self.path(provider, operation, key)
+        entry = self.cache.get(path)
+        if entry is None and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            with self.lock:
+                self.cache[path] = entry
+        return entry
+
+    def save(self, provider: str, operation: str, key: str, entry: dict):
+        path = self.path(provider, operation, key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write to a temporary file first so concurrent replays never read half a recording
+        with tempfile.NamedTemporaryFile("w", dir=os.path.dirname(path), suffix=".tmp",
+                                         delete=False, encoding="utf-8") as f:
+            json.dump(entry, f, ensure_ascii=False, indent=2)
+        os.replace(f.name, path)
+        with self.lock:
+            self.cache[path] = entry
+
+
+_stores: Dict[str, ReplayStore] = {}
+
+
+def get_store() -> ReplayStore:
+    root = settings.REPLAY_DIR
+    if root not in _stores:
+        _stores[root] = ReplayStore(root)
+    return _stores[root]
+
+
+########################################## Decorator ##########################################
+def replayable(provider: str, operation: str, callback: str = None):
+    """
+    Decorator recording or replaying the calls of a service method
+
+    Args:
+        provider (str): "openai", "gemini" or "firecrawl", also used to pick the latency
+        operation (str): Operation name, e.g. "get_structured_response"
+        callback (str): Argument holding a per-item callback (e.g. "on_item"); the items
+            it receives are recorded and handed to it again on replay
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        def call_key(args, kwargs):
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            arguments.pop("self", None)
+            handler = arguments.pop(callback, None) if callback else None
+            return request_key(provider, operation, arguments), arguments, handler
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            mode = settings.REPLAY_MODE
+            if mode not in ("record", "replay"):
+                return fn(*args, **kwargs)
+
+            key, arguments, handler = call_key(args, kwargs)
+            store = get_store()
+
+            if mode == "replay":
+                entry = store.load(provider, operation, key)
+                if entry is None:
+                    raise ReplayMissError(f"No recording of {provider}.{operation} ({key[:12]})")
+                latency = synthetic_latency(provider, key, entry.get("elapsed"))
+                items = entry.get("items") or []
+                if handler and items:
+                    # Spread the delay over the items like a streamed response
+                    for item in items:
+                        time.sleep(latency / (len(items) + 1))
+                        handler(item)
+                    time.sleep(latency / (len(items) + 1))
+                else:
+                    time.sleep(latency)
+                return from_jsonable(entry["response"])
+
+            items = []
+            if handler:
+                def recording_handler(item):
+                    items.append(to_jsonable(item))
+                    return handler(item)
+                bound = signature.bind(*args, **kwargs)
+                bound.arguments[callback] = recording_handler
+                args, kwargs = bound.args, bound.kwargs
+
+            started_at = time.monotonic()
+            result = fn(*args, **kwargs)
+            elapsed = time.monotonic() - started_at
+            try:
+                store.save(provider, operation, key, {
+                    "provider": provider,
+                    "operation": operation,
+                    "request": to_jsonable(arguments),
+                    "response": to_jsonable(result),
+                    "items": items,
+                    "elapsed": elapsed,
+                    "recorded_at": datetime.now().isoformat(),
+                })
+            except Exception as e:
+                logger.warning(f"Could not record {provider}.{operation}: {e}")
+            return result
+        return wrapper
+    return decorator
@@ -0,0 +1,134 @@
+"""
+Cache of grounded Gemini search answers
+
+The grounded search of a source domain returns essentially the same answer for a
+day, yet used to run on every sniffer request. Answers are kept per (model,
+formatted prompt) in memory and under SEARCH_CACHE_DIR:
+
+    younger than SEARCH_CACHE_TTL_SECONDS         served as is
+    younger than SEARCH_CACHE_MAX_STALE_SECONDS   served at once, refreshed in the background
+    older, or missing                             searched before answering
+
+Only successful answers are cached, a failed refresh keeps the previous answer.
+"""
+
+import os
+import json
+import time
+import hashlib
+import logging
+import tempfile
+import threading
+from typing import Callable, Dict, Optional
+
+from app.config.settings import settings
+from app.utils.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+EMPTY_TOKEN_USAGE = {"prompt_token": 0, "completion_token": 0, "output_token": 0, "total_token": 0}
+
+
+def search_key(model: str, prompt: str) -> str:
+    return hashlib.sha256(f"{model}\n{prompt}".encode("utf-8")).hexdigest()
+
+
+class SearchCache:
+    """Search answers per key in <root>/<key>.json"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.entries: Dict[str, dict] = {}
+        self.refreshing = set()
+        self.lock = threading.Lock()
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.root, f"{key}.json")
+
+    def load(self, key: str) -> Optional[dict]:
+        entry = self.entries.get(key)
+        if entry is None and os.path.exists(self.path(key)):
+            try:
+                with open(self.path(key), "r", encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Ignoring unreadable search cache entry {key}: {e}")
+                return None
+            with self.lock:
+                self.entries[key] = entry
+        return entry
+
+    def save(self, key: str, entry: dict):
+        with self.lock:
+            self.entries[key] = entry
+        try:
+            os.makedirs(self.root, exist_ok=True)
+            # Write to a temporary file first so concurrent readers never see half an entry
+            with tempfile.NamedTemporaryFile("w", dir=self.root, suffix=".tmp", delete=False, encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(f.name, self.path(key))
+        except OSError as e:
+            logger.warning(f"Could not persist search cache entry {key}: {e}")
+
+    def get(self, model: str, prompt: str, search: Callable[[], dict], refresh: bool = False) -> dict:
+        """
+        Cached answer of a grounded search, searching when there is no usable one
+
+        Args:
+            model (str): Gemini model of the search
+            prompt (str): Fully formatted search prompt
+            search (callable): Runs the search, returns the search_google result dict
+            refresh (bool): Search again even if the cached answer is fresh
+
+        Returns:
+            dict: The search_google result, with "cached" set and no token usage on a hit
+        """
+        key = search_key(model, prompt)
+        entry = None if refresh else self.load(key)
+        age = time.time() - entry["stored_at"] if entry else None
+
+        if entry and age < settings.SEARCH_CACHE_MAX_STALE_SECONDS:
+            record_cache_lookup("gemini_search", True)
+            if age >= settings.SEARCH_CACHE_TTL_SECONDS:
+                self.refresh_in_background(key, model, prompt, search)
+            # The tokens were spent by the search that filled the entry, not by this request
+            return {**entry["result"], "token_usage": dict(EMPTY_TOKEN_USAGE), "cached": True}
+
+        record_cache_lookup("gemini_search", False)
+        return self.store(key, model, prompt, search())
+
+    def store(self, key: str, model: str, prompt: str, result: dict) -> dict:
+        if result and result.get("success"):
+            self.save(key, {"model": model, "prompt": prompt, "stored_at": time.time(), "result": result})
+        return result
+
+    def refresh_in_background(self, key: str, model: str, prompt: str, search: Callable[[], dict]):
+        with self.lock:
+            if key in self.refreshing:
+                return
+            self.refreshing.add(key)
+
+        def refresh():
+            try:
+                self.store(key, model, prompt, search())
+            except Exception as e:
+                logger.warning(f"Background refresh of a cached {model} search failed: {e}")
+            finally:
+                with self.lock:
+                    self.refreshing.discard(key)
+
+        threading.Thread(target=refresh, name=f"search-refresh-{key[:8]}", daemon=True).start()
+
+    def clear(self):
+        with self.lock:
+            self.entries.clear()
+
+
+_caches: Dict[str, SearchCache] = {}
+
+
+def get_search_cache() -> SearchCache:
+    root = settings.SEARCH_CACHE_DIR
+    if root not in _caches:
+        _caches[root] = SearchCache(root)
+    return _caches[root]
@@ -0,0 +1,256 @@
+"""
+Single-flight coalescing of identical concurrent work
+
+When the batch driver and an interactive user ask for the same lender at the same
+time, the second caller waits for the computation already in flight and gets its
+result instead of running the whole chain again. Two levels use it:
+
+    whole sniffer_ai requests   keyed by the canonical urls, prompt and flags
+    fetch and LLM calls         keyed like the replay recordings (@coalesced)
+
+With SINGLEFLIGHT_CROSS_PROCESS the request level also coalesces across the
+workers of a deployment: a lock file per key under SINGLEFLIGHT_DIR elects the
+leader, which writes its result next to it for the workers that were waiting.
+"""
+
+import os
+import copy
+import json
+import time
+import inspect
+import logging
+import functools
+import threading
+from typing import Any, Callable, Dict
+
+from app.config.settings import settings
+from app.services.replay import request_key
+from app.utils.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+
+class _Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+        self.followers = 0
+
+
+def _copy(result):
+    # Callers may mutate what they get back, so followers receive their own copy
+    try:
+        return copy.deepcopy(result)
+    except Exception:
+        return result
+
+
+class SingleFlight:
+    """In-flight computations of one kind, keyed by what makes two of them identical"""
+
+    def __init__(self, name: str):
+        self.name = name
+        self.calls: Dict[str, _Call] = {}
+        self.lock = threading.Lock()
+
+    def do(self, key: str, fn: Callable[[], Any], cross_process: bool = False):
+        """
+        Run `fn`, or wait for the identical call already running and return its result
+
+        Args:
+            key (str): Identity of the computation
+            fn (callable): The computation
+            cross_process (bool): Also coalesce with the other worker processes
+                (the result must be JSON serializable)
+        """
+        if not settings.SINGLEFLIGHT_ENABLED:
+            return fn()
+
+        with self.lock:
+            call = self.calls.get(key)
+            leader = call is None
+            if leader:
+                call = self.calls[key] = _Call()
+            else:
+                call.followers += 1
+        record_cache_lookup(f"singleflight_{self.name}", not leader)
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return _copy(call.result)
+
+        try:
+            call.result = FileLock(self.name, key).run(fn) if cross_process else fn()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self.lock:
+                self.calls.pop(key, None)
+                shared = call.followers > 0
+            if shared and call.error is None:
+                # Snapshot before the leader's caller gets to change it
+                call.result = _copy(call.result)
+            call.done.set()
+
+
+class FileLock:
+    """
+    Cross-process leader election: <dir>/<name>/<key>.lock, the leader's result in <key>.json
+
+    The leader removes its lock file before releasing it, waiters that wake up on the
+    removed file take the result or elect again on the current one. Results are only
+    useful to waiters that arrived before them, so once no waiter can still be waiting
+    (SINGLEFLIGHT_WAIT_SECONDS) they are swept together with lock files left by crashes.
+    """
+
+    def __init__(self, name: str, key: str):
+        self.directory = os.path.join(settings.SINGLEFLIGHT_DIR, name)
+        os.makedirs(self.directory, exist_ok=True)
+        self.lock_path = os.path.join(self.directory, f"{key}.lock")
+        self.result_path = os.path.join(self.directory, f"{key}.json")
+        self.name = name
+
+    def run(self, fn: Callable[[], Any]):
+        import fcntl
+
+        arrived_at = time.time()
+        deadline = time.monotonic() + settings.SINGLEFLIGHT_WAIT_SECONDS
+        while True:
+            with open(self.lock_path, "a") as lock_file:
+                while True:
+                    try:
+                        fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                        break
+                    except BlockingIOError:
+                        if time.monotonic() > deadline:
+                            logger.warning(f"Gave up waiting for the {self.name} leader after {settings.SINGLEFLIGHT_WAIT_SECONDS:.0f}s")
+                            return fn()
+                        time.sleep(0.1)
+                leader = False
+                try:
+                    # A result finished after this call arrived belongs to the computation it waited for
+                    finished = self.read_result()
+                    if finished and finished["finished_at"] >= arrived_at:
+                        record_cache_lookup(f"singleflight_{self.name}_process", True)
+                        return finished["result"]
+                    if not self.holds(lock_file):
+                        # The previous leader removed this lock file, elect again on the current one
+                        continue
+                    leader = True
+                    record_cache_lookup(f"singleflight_{self.name}_process", False)
+                    sweep(self.directory)
+                    result = fn()
+                    self.write_result(result)
+                    return result
+                finally:
+                    if leader:
+                        remove_file(self.lock_path)
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def holds(self, lock_file) -> bool:
+        """Whether the locked file is still the one at lock_path"""
+        try:
+            return os.fstat(lock_file.fileno()).st_ino == os.stat(self.lock_path).st_ino
+        except OSError:
+            return False
+
+    def read_result(self):
+        try:
+            with open(self.result_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write_result(self, result):
+        try:
+            with open(self.result_path, "w", encoding="utf-8") as f:
+                json.dump({"finished_at": time.time(), "result": result}, f, ensure_ascii=False, default=str)
+        except (OSError, TypeError, ValueError) as e:
+            logger.warning(f"Could not share the {self.name} result with the other workers: {e}")
+
+
+SWEEP_INTERVAL_SECONDS = 60
+
+_swept_at: Dict[str, float] = {}
+
+
+def remove_file(path: str):
+    try:
+        os.remove(path)
+    except OSError:
+        pass
+
+
+def sweep(directory: str):
+    """Remove the results and unheld lock files no waiter can still need, at most once a minute per directory"""
+    import fcntl
+
+    now = time.time()
+    if now - _swept_at.get(directory, 0) < SWEEP_INTERVAL_SECONDS:
+        return
+    _swept_at[directory] = now
+
+    expired_before = now - settings.SINGLEFLIGHT_WAIT_SECONDS
+    for entry in os.scandir(directory):
+        try:
+            if entry.stat().st_mtime >= expired_before:
+                continue
+        except OSError:
+            continue
+        if entry.name.endswith(".json"):
+            remove_file(entry.path)
+        elif entry.name.endswith(".lock"):
+            try:
+                # Without O_CREAT, a lock file removed in the meantime is not brought back
+                fd = os.open(entry.path, os.O_RDONLY)
+            except OSError:
+                continue
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+                remove_file(entry.path)
+            except BlockingIOError:
+                # A leader is still running
+                pass
+            finally:
+                os.close(fd)
+
+
+_flights: Dict[str, SingleFlight] = {}
+_flights_lock = threading.Lock()
+
+
+def get_flight(name: str) -> SingleFlight:
+    with _flights_lock:
+        if name not in _flights:
+            _flights[name] = SingleFlight(name)
+        return _flights[name]
+
+
+def coalesced(provider: str, operation: str):
+    """
+    Decorator coalescing identical concurrent calls of a service method
+
+    Calls are identical when they go through the same service instance with the same
+    canonical arguments (the replay request key).
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+        flight = get_flight(f"{provider}_{operation}")
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            if not settings.SINGLEFLIGHT_ENABLED:
+                return fn(*args, **kwargs)
+            bound = signature.bind(*args, **kwargs)
+            bound.apply_defaults()
+            arguments = dict(bound.arguments)
+            owner = arguments.pop("self", None)
+            key = f"{id(owner)}:{request_key(provider, operation, arguments)}"
+            return flight.do(key, lambda: fn(*args, **kwargs))
+        return wrapper
+    return decorator
@@ -1,28 +1,33 @@
 from urllib.parse import urlparse
+from concurrent.futures import ThreadPoolExecutor
+from pydantic import create_model
+from app.config.settings import settings
 from app.models.schemas import LendersExtractSchema
-from app.utils.prompts import (
-    lenders_data_prompt, lenders_data_system_message
-)
+from app.utils.prompts import lenders_data_system_message, get_lenders_data_prompt
 from app.services.llm_services import openai_analyzer
 from app.services.webpage import (
     extract_webpage_content, extract_urls_from_website, 
-    filter_urls_by_keywords, normalize_urls, extract_content_from_url
+    filter_urls_by_keywords, normalize_urls, extract_content_from_url,
+    map_structured_records, structured_coverage
 )
+from app.services.chunking import build_sections, chunk_sections, merge_extractions
+from app.services.relevance import filter_extracted_data
+from app.services.pre_extractors import pre_extract
+from app.services.url_inventory import get_url_inventory
+
+LENDERS_EXTRACTION_MODEL = "gpt-4.1-mini-2025-04-14"
 
 ################################# Lenders Data Service Functions ####################################
 # 1. Lenders data based on the custom method
-def get_lenders_data(url: str, multiple_urls: list[str] = None, keywords: list[str] = None) -> dict:
+def get_lenders_data(url: str, multiple_urls: list[str] = None, keywords: list[str] = None, lender_name: str = None) -> dict:
 
-    # a. Extract the urls from the website
-    urls = extract_urls_from_website(url)
     try:
         domain = f"https://{urlparse(url).netloc}"
     except Exception as e:
         print(f"❌ Error parsing url: {e}")
-        
 
-    # b. Filter the urls by keywords
-    filtered_urls = filter_urls_by_keywords(urls.get("hrefs", []), keywords)
+    # a, b. Candidate pages from the domain's url inventory (map_url, anchors as fallback), filtered by keywords
+    filtered_urls = get_url_inventory().candidates(url, keywords, fallback=extract_urls_from_website)
     print("FILTERED URLS: ", filtered_urls)
     print("DOMAIN:------------------ ", domain)
 
@@ -39,9 +44,10 @@ def get_lenders_data(url: str, multiple_urls: list[str] = None, keywords: list[s
     failed_extractions = 0
 
     filtered_urls = list(set(normalized_urls))
+    structured_pages = []
     for url in filtered_urls:
         try:
-            text = extract_content_from_url(url, domain=domain)
+            text = extract_content_from_url(url, domain=domain, structured_sink=structured_pages)
             if text and len(text.strip()) > 0:
                 extracted_data[url] = text
                 successful_extractions += 1
@@ -49,45 +55,105 @@ def get_lenders_data(url: str, multiple_urls: list[str] = None, keywords: list[s
             failed_extractions += 1
             print(f"❌ Error scraping {url}: {e}")
 
-    # e. Flatten and de-duplicate data
-    final_data = []
-    total_lines_processed = 0
-    
-    for url, value in extracted_data.items():
-        lines = value.split("\n")
-        total_lines_processed += len(lines)
-        for line in lines:
-            cleaned = line.strip()
-            if cleaned and cleaned not in final_data:
-                final_data.append(cleaned)
-    
-    final_data = ", ".join(final_data)
-    print(f"📄 Total processed data: {len(final_data)} characters")
-
-    if not final_data:
+    # Structured data (JSON-LD, microdata, label/value tables) mapped onto the schema
+    structured_records = map_structured_records(structured_pages, LendersExtractSchema, single_record=True)
+    structured_record = structured_records[0] if structured_records else {}
+    # Every lender field is required but may be "Not Found", so coverage is the share filled
+    coverage = structured_coverage(structured_records, LendersExtractSchema, require_fields=False)
+    if coverage >= settings.STRUCTURED_COVERAGE_THRESHOLD:
+        print(f"🧩 Structured data covers {coverage:.0%} of the lender schema, skipping the LLM")
+        return {
+            "data": {
+                **{name: "Not Found" for name in LendersExtractSchema.model_fields},
+                **structured_record,
+                "sourceurls": filtered_urls,
+            },
+            "successful_extractions": successful_extractions,
+            "failed_extractions": failed_extractions,
+            "token_usage": {"prompt_token": 0, "completion_token": 0, "output_token": 0, "total_token": 0}
+            }
+
+    # Rate fields with regular wording (ROI, LTV, fees, credit score...) are read by patterns
+    prefilled, field_sources = pre_extract(extracted_data, min_confidence=settings.PRE_EXTRACTION_MIN_CONFIDENCE)
+    prefilled = {name: value for name, value in prefilled.items() if name not in structured_record}
+    missing_fields = [
+        name for name in LendersExtractSchema.model_fields
+        if name not in structured_record and name not in prefilled
+    ]
+    print(f"🔎 Pre-extracted {len(prefilled)} field(s), asking the LLM for {len(missing_fields)}")
+    empty_usage = {"prompt_token": 0, "completion_token": 0, "output_token": 0, "total_token": 0}
+    if set(missing_fields) <= {"sourceurls"}:
+        return {
+            "data": {**structured_record, **prefilled, "sourceurls": filtered_urls},
+            "field_sources": field_sources,
+            "successful_extractions": successful_extractions,
+            "failed_extractions": failed_extractions,
+            "token_usage": empty_usage
+            }
+
+    # e. Keep only the passages relevant to the use-case keywords
+    extracted_data = filter_extracted_data(extracted_data, keywords)
+
+    # f. Split the de-duplicated page text into token sized chunks on page boundaries
+    sections = build_sections(extracted_data)
+    if not sections:
         print("⚠️ No usable data extracted after cleaning. Skipping.")
         return ""
 
-    # Prepare and call GPT model
-    cleaned_data = final_data.replace("{", "(").replace("}", ")")
-    
-    # Data for prompt
-    system_message = lenders_data_system_message
-    prompt = lenders_data_prompt.format(lender_name="IDBI Bank", final_data=cleaned_data)  # TODO: Add the lender name
-    primary_model_response, primary_token_usage = openai_analyzer.gpt_model_structured_response(
-        system_message,
-        prompt,
-        model="gpt-4.1-mini-2025-04-14",
-        response_format=LendersExtractSchema
-        )
-    
-    # Primary Model Parsed Response
-    parsed_response = primary_model_response.choices[0].message.content
+    chunks = chunk_sections(sections, max_tokens=extraction_chunk_tokens(), model=LENDERS_EXTRACTION_MODEL)
+    print(f"📄 Total processed data: {sum(len(section) for section in sections)} characters in {len(chunks)} chunk(s)")
+
+    # g. Map: run the extraction on every chunk in parallel
+    lender_name = lender_name or domain
+    with ThreadPoolExecutor(max_workers=settings.EXTRACTION_MAX_WORKERS) as executor:
+        chunk_responses = list(executor.map(lambda chunk: extract_lenders_chunk(chunk, lender_name, missing_fields), chunks))
+
+    # h. Reduce: reconcile the per-chunk outputs field by field
+    chunk_outputs = [response["data"] for response in chunk_responses if response.get("success")]
+    token_usage = dict(empty_usage)
+    for response in chunk_responses:
+        for key in token_usage:
+            token_usage[key] += response.get("token_usage", {}).get(key, 0)
 
-    # Check if the response is valid
+    if not chunk_outputs:
+        print(f"❌ Extraction failed for all {len(chunks)} chunk(s): {chunk_responses[0].get('error')}")
 
+    # Values read from structured data win over the patterns, which win over the model's
+    data = merge_extractions([structured_record, prefilled] + chunk_outputs)
     return {
-        "data": parsed_response.get("output", []), 
-        "successful_extractions": successful_extractions, 
-        "failed_extractions": failed_extractions
+        "data": {**{name: "Not Found" for name in LendersExtractSchema.model_fields}, **data},
+        "field_sources": field_sources,
+        "successful_extractions": successful_extractions,
+        "failed_extractions": failed_extractions,
+        "token_usage": token_usage
         }
+
+
+# Chunk size of the relevance filtered corpus: at most RELEVANCE_TOKEN_BUDGET tokens survive the
+# filter, so the chunks are sized to spread them over the extraction workers
+def extraction_chunk_tokens() -> int:
+    per_worker = -(-settings.RELEVANCE_TOKEN_BUDGET // max(settings.EXTRACTION_MAX_WORKERS, 1))
+    return min(settings.EXTRACTION_CHUNK_MAX_TOKENS, per_worker)
+
+
+# 2. Extract the lenders data from a single chunk of the crawled corpus
+def extract_lenders_chunk(chunk: str, lender_name: str, fields: list[str] = None) -> dict:
+    prompt = get_lenders_data_prompt(lender_name, chunk, fields)
+    return openai_analyzer.get_structured_response(
+        lenders_data_system_message,
+        prompt,
+        model=LENDERS_EXTRACTION_MODEL,
+        response_format=lenders_response_format(fields)
+        )
+
+
+# 3. Response format restricted to the requested lender fields
+def lenders_response_format(fields: list[str] = None):
+    if fields is None or set(fields) >= set(LendersExtractSchema.model_fields):
+        return LendersExtractSchema
+    definitions = {
+        name: (info.annotation, info)
+        for name, info in LendersExtractSchema.model_fields.items()
+        if name in fields
+    }
+    return create_model("LendersPartialExtractSchema", **definitions)
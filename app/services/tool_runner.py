@@ -0,0 +1,179 @@
+"""
+Concurrent execution of the first-stage sniffer tools with a shared deadline
+"""
+
+import re
+import json
+import time
+import logging
+import contextvars
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Callable, Dict, List, Optional, Tuple
+
+from app.config.settings import settings
+from app.services.chunking import merge_extractions
+from app.services.field_resolver import parse_json_object
+from app.utils.rate_limiter import call_deadline
+
+logger = logging.getLogger(__name__)
+
+
+def run_tools(tools: Dict[str, Callable[[], dict]], deadline_seconds: float = None) -> Dict[str, dict]:
+    """
+    Run every tool at the same time and collect whatever finished before the deadline
+
+    A request already in flight cannot be interrupted, so a tool that misses the deadline
+    finishes its current provider call in the background; every call it would make after
+    that (next request, retry) is refused by the shared provider limiters.
+
+    Args:
+        tools (dict): Zero-argument callables keyed by tool name, each returning the
+            usual {"success", "data", "status", "token_usage", "error"} dict
+        deadline_seconds (float): Seconds to wait before using partial results
+
+    Returns:
+        dict: Result per tool name, tools that missed the deadline or raised get a
+            failed result with status "Timeout" or "Error"
+    """
+    deadline_seconds = deadline_seconds or settings.TOOL_DEADLINE_SECONDS
+    started_at = time.monotonic()
+
+    executor = ThreadPoolExecutor(max_workers=max(len(tools), 1))
+    # Each tool runs in a copy of the caller's context so its token usage reaches the pipeline
+    # tracker, with the deadline its provider calls are checked against
+    futures = {}
+    for name, tool in tools.items():
+        context = contextvars.copy_context()
+        context.run(call_deadline.set, started_at + deadline_seconds)
+        futures[name] = executor.submit(context.run, tool)
+    wait(futures.values(), timeout=deadline_seconds)
+    # Late tools stop at their next provider call, their results are dropped
+    executor.shutdown(wait=False, cancel_futures=True)
+
+    results = {}
+    for name, future in futures.items():
+        if not future.done():
+            logger.warning(f"Tool {name} missed the {deadline_seconds}s deadline, using partial results")
+            results[name] = {"success": False, "data": None, "status": "Timeout", "error": "Deadline exceeded"}
+            continue
+        try:
+            results[name] = future.result()
+        except Exception as e:
+            logger.error(f"Tool {name} failed: {e}")
+            results[name] = {"success": False, "data": None, "status": "Error", "error": str(e)}
+
+    logger.info(f"Ran {len(tools)} tools in {time.monotonic() - started_at:.1f}s")
+    return results
+
+
+def to_records(data, list_field: Optional[str] = "output") -> Tuple[List[dict], str]:
+    """
+    Normalize a tool's data into records and free text
+
+    Args:
+        data: Tool data, a dict (optionally wrapping `list_field`), a list of dicts or text
+        list_field (str): Field of the schema holding the list of records
+
+    Returns:
+        tuple: (records, text) where text is whatever could not be parsed into records
+    """
+    if isinstance(data, str):
+        text = data.strip()
+        # Search answers may carry the records as JSON, possibly inside a code fence
+        parsed = None
+        match = re.search(r"\[.*\]", text, re.DOTALL)
+        if match:
+            try:
+                parsed = json.loads(match.group(0))
+            except json.JSONDecodeError:
+                parsed = None
+        if not isinstance(parsed, list):
+            parsed = parse_json_object(text) or None
+        if parsed is None:
+            return [], text
+        data = parsed
+
+    if hasattr(data, "model_dump"):
+        data = data.model_dump()
+    if isinstance(data, dict) and list_field and isinstance(data.get(list_field), list):
+        data = data[list_field]
+    if isinstance(data, dict):
+        return ([data] if data else []), ""
+    if isinstance(data, list):
+        return [record for record in data if isinstance(record, dict)], ""
+    return [], str(data) if data else ""
+
+
+def conflicting_keys(first: dict, second: dict, unique_key: Optional[str]) -> bool:
+    """Whether both records carry `unique_key` with different values"""
+    if not unique_key or not first.get(unique_key) or not second.get(unique_key):
+        return False
+    return str(first[unique_key]).strip().lower() != str(second[unique_key]).strip().lower()
+
+
+def merge_records(record_lists: List[List[dict]], unique_key: Optional[str] = None) -> List[dict]:
+    """
+    Merge the records of several tools field by field
+
+    Records are matched on `unique_key` when both carry it; two single-record outputs
+    are merged unless their keys differ. Earlier lists win on conflicting values, empty and "Not Found"
+    fields are filled from later lists, unmatched records are appended.
+
+    Args:
+        record_lists (list): Records per tool, in priority order
+        unique_key (str): Field identifying the same record across tools
+
+    Returns:
+        list: Merged records
+    """
+    merged: List[dict] = []
+    for records in record_lists:
+        if not records:
+            continue
+        if not merged:
+            merged = [dict(record) for record in records]
+            continue
+        if len(merged) == 1 and len(records) == 1 and not conflicting_keys(merged[0], records[0], unique_key):
+            merged[0] = merge_extractions([merged[0], records[0]])
+            continue
+
+        index = {
+            str(record.get(unique_key)).strip().lower(): position
+            for position, record in enumerate(merged)
+            if unique_key and record.get(unique_key)
+        }
+        for record in records:
+            key = str(record.get(unique_key)).strip().lower() if unique_key and record.get(unique_key) else None
+            if key in index:
+                merged[index[key]] = merge_extractions([merged[index[key]], record])
+            else:
+                merged.append(dict(record))
+    return merged
+
+
+def merge_tool_results(results: Dict[str, dict], priority: List[str], list_field: Optional[str] = "output",
+                       unique_key: Optional[str] = None) -> Tuple[List[dict], str]:
+    """
+    Merge the outputs of the first-stage tools
+
+    Args:
+        results (dict): Result per tool name, from run_tools
+        priority (list): Tool names, most trusted first
+        list_field (str): Field of the schema holding the list of records
+        unique_key (str): Field identifying the same record across tools
+
+    Returns:
+        tuple: (merged records, free text the tools returned that could not be parsed)
+    """
+    record_lists = []
+    texts = []
+    for name in priority:
+        result = results.get(name) or {}
+        if not result.get("success") or not result.get("data"):
+            continue
+        records, text = to_records(result["data"], list_field)
+        record_lists.append(records)
+        if text:
+            texts.append(text)
+
+    return merge_records(record_lists, unique_key), "\n\n".join(texts)
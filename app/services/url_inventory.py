@@ -0,0 +1,168 @@
+"""
+Per-domain URL inventory built from Firecrawl's map_url
+
+Discovering the candidate pages of a lender used to scrape the anchors of its home
+page (or crawl it again) on every request. The inventory keeps the url list of each
+domain on disk under URL_INVENTORY_DIR and only calls map_url again once it is
+older than URL_INVENTORY_TTL_SECONDS. Every refresh stores the urls added and
+removed since the previous one, so site changes can be followed over time. When
+map_url is unavailable the anchors of the page are used instead.
+"""
+
+import os
+import json
+import time
+import logging
+import tempfile
+import threading
+from datetime import datetime
+from typing import Callable, Dict, List, Optional
+from urllib.parse import urlparse
+
+from app.config.settings import settings
+from app.services.crawlers import firecrawler
+from app.services.webpage import extract_urls_from_website, filter_urls_by_keywords, normalize_urls
+from app.utils.metrics import record_cache_lookup
+
+logger = logging.getLogger(__name__)
+
+
+def domain_key(url: str) -> str:
+    netloc = urlparse(url if "//" in url else f"https://{url}").netloc.lower()
+    return netloc[4:] if netloc.startswith("www.") else netloc
+
+
+class UrlInventory:
+    """Url list per domain in <root>/<domain>.json, with the diffs between its refreshes"""
+
+    def __init__(self, root: str):
+        self.root = root
+        self.cache: Dict[str, dict] = {}
+        self.lock = threading.Lock()
+        self.domain_locks: Dict[str, threading.Lock] = {}
+
+    def path(self, domain: str) -> str:
+        return os.path.join(self.root, f"{domain}.json")
+
+    def load(self, domain: str) -> Optional[dict]:
+        inventory = self.cache.get(domain)
+        if inventory is None and os.path.exists(self.path(domain)):
+            with open(self.path(domain), "r", encoding="utf-8") as f:
+                inventory = json.load(f)
+            with self.lock:
+                self.cache[domain] = inventory
+        return inventory
+
+    def save(self, inventory: dict):
+        os.makedirs(self.root, exist_ok=True)
+        # Write to a temporary file first so concurrent readers never see half an inventory
+        with tempfile.NamedTemporaryFile("w", dir=self.root, suffix=".tmp", delete=False, encoding="utf-8") as f:
+            json.dump(inventory, f, ensure_ascii=False, indent=2)
+        os.replace(f.name, self.path(inventory["domain"]))
+        with self.lock:
+            self.cache[inventory["domain"]] = inventory
+
+    def is_fresh(self, inventory: Optional[dict]) -> bool:
+        return bool(inventory) and time.time() - inventory["refreshed_at"] < settings.URL_INVENTORY_TTL_SECONDS
+
+    def get(self, url: str, refresh: bool = False, fallback: Callable[[str], dict] = None) -> dict:
+        """
+        Inventory of the domain of `url`, refreshed when missing, expired or asked for
+
+        Args:
+            url (str): Any url of the site
+            refresh (bool): Map the site again even if the inventory is fresh
+            fallback (callable): Anchor scraper used when map_url fails, defaults to
+                extract_urls_from_website
+
+        Returns:
+            dict: {"domain", "urls", "source", "refreshed_at", "history"}
+        """
+        domain = domain_key(url)
+        inventory = self.load(domain)
+        if not refresh and self.is_fresh(inventory):
+            record_cache_lookup("url_inventory", True)
+            return inventory
+
+        with self.lock:
+            domain_lock = self.domain_locks.setdefault(domain, threading.Lock())
+        with domain_lock:
+            # Another request may have refreshed it while this one waited
+            inventory = self.load(domain)
+            if not refresh and self.is_fresh(inventory):
+                record_cache_lookup("url_inventory", True)
+                return inventory
+            record_cache_lookup("url_inventory", False)
+            return self.refresh(url, inventory, fallback or extract_urls_from_website)
+
+    def refresh(self, url: str, previous: Optional[dict], fallback: Callable[[str], dict]) -> dict:
+        domain = domain_key(url)
+        base_url = f"{urlparse(url).scheme or 'https'}://{urlparse(url).netloc or domain}"
+        urls, source = map_site(base_url), "map"
+        if urls is None:
+            urls, source = normalize_urls(fallback(url).get("hrefs", []), base_url), "anchors"
+        urls = sorted({
+            link.split("#")[0] for link in urls
+            if link.startswith("http") and domain_key(link) == domain
+        })
+
+        if not urls and previous:
+            # A failed refresh keeps the last known inventory rather than emptying it
+            logger.warning(f"URL inventory refresh of {domain} found no urls, keeping the previous one")
+            return previous
+
+        history = list((previous or {}).get("history", []))
+        old = set((previous or {}).get("urls", []))
+        entry = {"refreshed_at": datetime.now().isoformat(), "source": source, "count": len(urls)}
+        if previous:
+            entry["added"] = sorted(set(urls) - old)
+            entry["removed"] = sorted(old - set(urls))
+        history = (history + [entry])[-settings.URL_INVENTORY_HISTORY:]
+
+        inventory = {"domain": domain, "urls": urls, "source": source, "refreshed_at": time.time(), "history": history}
+        self.save(inventory)
+        changes = f" (+{len(entry['added'])} / -{len(entry['removed'])})" if previous else ""
+        print(f"🗺️ URL inventory of {domain}: {len(urls)} urls from {source}{changes}")
+        return inventory
+
+    def candidates(self, url: str, keywords: List[str] = None, fallback: Callable[[str], dict] = None) -> List[str]:
+        """
+        Urls of the domain whose path matches one of the keywords
+
+        A mapped site has many more matches than the anchors of one page, so the urls
+        matching the most keywords (then the shortest) are kept, up to URL_INVENTORY_MAX_CANDIDATES.
+        """
+        keywords = [keyword.lower() for keyword in keywords or []]
+        matched = filter_urls_by_keywords(self.get(url, fallback=fallback)["urls"], keywords)
+
+        def rank(link):
+            parsed = urlparse(link)
+            searchable_text = (parsed.path + " " + parsed.query).lower()
+            return -sum(keyword in searchable_text for keyword in keywords), len(link)
+
+        return sorted(matched, key=rank)[:settings.URL_INVENTORY_MAX_CANDIDATES]
+
+
+def map_site(base_url: str) -> Optional[List[str]]:
+    """Links of a site from Firecrawl's map_url, None when it is unavailable"""
+    try:
+        response = firecrawler.url_map(base_url)
+    except Exception as e:
+        logger.info(f"map_url unavailable for {base_url}: {e}")
+        return None
+    if not response:
+        return None
+    links = getattr(response, "links", None)
+    if links is None and isinstance(response, dict):
+        links = response.get("links")
+    return list(links) if links else None
+
+
+_inventories: Dict[str, UrlInventory] = {}
+
+
+def get_url_inventory() -> UrlInventory:
+    root = settings.URL_INVENTORY_DIR
+    if root not in _inventories:
+        _inventories[root] = UrlInventory(root)
+    return _inventories[root]
@@ -2,22 +2,26 @@
 Simple Webpage Content Extractor
 """
 
+import re
+import json
 import requests
-from bs4 import BeautifulSoup
 import time
 import io
-import pandas as pd
-
-from PyPDF2 import PdfReader
-import pytz
-import time
 import urllib3
-from urllib.parse import urlparse, urljoin
+from zoneinfo import ZoneInfo
+from urllib.parse import urlparse, urljoin, parse_qsl, urlencode
+from app.services.singleflight import get_flight
+from app.utils.rate_limiter import get_provider_limiter, get_status_code
+from app.utils.metrics import record_fetch
+
+# BeautifulSoup, PyPDF2 and pandas are heavy, so they are imported on the code path
+# that needs them instead of at startup
+
 # Disable SSL warnings when verification is disabled
 urllib3.disable_warnings(urllib3.exceptions.InsecureRequestWarning)
 
 # Set timezone (e.g., Asia/Kolkata, UTC, US/Eastern)
-timezone = pytz.timezone('Asia/Kolkata')
+timezone = ZoneInfo('Asia/Kolkata')
 
 # SSL Configuration - you can modify these based on your needs
 SSL_VERIFY = False  # Set to True if you want to enable SSL verification
@@ -39,6 +43,7 @@ def get_ssl_config():
 
 def extract_response_content(response):
     # Parse the HTML
+    from bs4 import BeautifulSoup
     soup = BeautifulSoup(response.text, 'html.parser')
 
     # Remove script and style elements
@@ -113,42 +118,41 @@ def add_request_delay(delay_seconds=1):
 
 # Helper function to make requests with retry logic
 def make_request_with_retry(url, max_retries=3, delay_between_retries=2):
-    """Make HTTP request with retry logic for handling temporary failures"""
+    """Make HTTP request through the shared limiter, retrying temporary failures with backoff"""
+    # Concurrent fetches of the same url share one request
+    return get_flight("fetch").do(url, lambda: _request_with_retry(url, max_retries, delay_between_retries))
+
+
+def _request_with_retry(url, max_retries, delay_between_retries):
     headers = get_browser_headers()
     ssl_config = get_ssl_config()
     
     print(f"🌐 Making HTTP request to: {url}")
-    
-    for attempt in range(max_retries):
+
+    def fetch():
         try:
             response = requests.get(url, headers=headers, **ssl_config)
-            response.raise_for_status()
-            print(f"✅ HTTP {response.status_code} - Content-Type: {response.headers.get('content-type', 'Unknown')}")
-            return response
         except requests.exceptions.SSLError as ssl_error:
-            print(f"🔒 SSL Error on attempt {attempt + 1} for {url}: {ssl_error}")
-            if attempt < max_retries - 1:
-                print(f"🔄 Retrying with different SSL configuration...")
-                # Try with different SSL settings on retry
-                try:
-                    response = requests.get(url, headers=headers, verify=False, timeout=TIMEOUT_SECONDS)
-                    response.raise_for_status()
-                    print(f"✅ HTTP {response.status_code} - Content-Type: {response.headers.get('content-type', 'Unknown')} (SSL verification disabled)")
-                    return response
-                except Exception as retry_error:
-                    print(f"❌ Retry attempt {attempt + 1} also failed: {retry_error}")
-                    if attempt < max_retries - 1:
-                        time.sleep(delay_between_retries)
-            else:
-                print(f"❌ All {max_retries} attempts failed for {url} due to SSL errors")
-                raise ssl_error
-        except requests.exceptions.RequestException as e:
-            if attempt < max_retries - 1:
-                print(f"⚠️ Attempt {attempt + 1} failed for {url}: {e}. Retrying in {delay_between_retries} seconds...")
-                time.sleep(delay_between_retries)
-            else:
-                print(f"❌ All {max_retries} attempts failed for {url}: {e}")
-                raise e
+            # Try with different SSL settings on retry
+            print(f"🔒 SSL Error for {url}: {ssl_error}")
+            print(f"🔄 Retrying with different SSL configuration...")
+            response = requests.get(url, headers=headers, verify=False, timeout=TIMEOUT_SECONDS)
+        response.raise_for_status()
+        print(f"✅ HTTP {response.status_code} - Content-Type: {response.headers.get('content-type', 'Unknown')}")
+        return response
+
+    host = urlparse(url).netloc or "unknown"
+    started_at = time.monotonic()
+    try:
+        # One breaker and politeness budget per host, a dead site does not stop the others
+        response = get_provider_limiter("http").run(fetch, max_retries=max_retries - 1, base_delay=delay_between_retries, key=host.lower())
+    except Exception as e:
+        record_fetch("local", get_status_code(e), time.monotonic() - started_at)
+        print(f"❌ All attempts failed for {url}: {e}")
+        raise e
+
+    record_fetch("local", response.status_code, time.monotonic() - started_at, len(response.content))
+    return response
 
 
 
@@ -169,6 +173,7 @@ def extract_webpage_content(url, timeout=30):
         response.raise_for_status()
 
         # Parse the HTML
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(response.text, 'html.parser')
 
         # Remove script and style elements
@@ -279,6 +284,7 @@ def extract_urls_from_website(homeloan_website):
         # Add delay to avoid rate limiting
         add_request_delay(1)
         
+        from bs4 import BeautifulSoup
         soup = BeautifulSoup(response.text, 'html.parser')
         # Step 1: Extract all <a href="..."> links
         hrefs = [a['href'] for a in soup.find_all('a', href=True)]
@@ -337,8 +343,25 @@ def normalize_urls(raw_urls, base_domain):
         print(f"❌ Error normalizing urls: {e}")
         return []
 
+# Canonical form of a url, so the same page written differently compares equal
+def canonical_url(url):
+    parsed = urlparse(url.strip())
+    path = parsed.path.rstrip('/') or '/'
+    query = urlencode(sorted(parse_qsl(parsed.query, keep_blank_values=True)))
+    return parsed._replace(scheme=(parsed.scheme or 'https').lower(), netloc=parsed.netloc.lower(),
+                           path=path, query=query, fragment='').geturl()
+
 # Supported extensions and their handlers for extracting content from urls
-def extract_content_from_url(url,domain):
+def extract_content_from_url(url,domain, structured_sink=None):
+    """
+    Extract the text of a page or document
+
+    Args:
+        url (str): Page url, relative urls are joined to `domain`
+        domain (str): Base url of the site
+        structured_sink (list): When given, the JSON-LD, microdata and tables of html
+            pages are appended to it (see extract_structured_data)
+    """
     if not url.startswith("http"):
         url = domain +"/"+ url
     try:
@@ -347,54 +370,327 @@ def extract_content_from_url(url,domain):
         
         # Add delay to avoid rate limiting
         add_request_delay(0.5)
-        
-        content = response.content
 
-        # Determine file extension
-        path = urlparse(url).path
-        extension = path.split('.')[-1].lower()
+        return extract_text_from_response(response, url, structured_sink)
+
+    except Exception as e:
+        return f"❌ Error processing {url}: {e}"
+
 
-        if extension == 'pdf':
-            with io.BytesIO(content) as f:
-                reader = PdfReader(f)
-                return '\n'.join([page.extract_text() or '' for page in reader.pages])
+def extract_text_from_response(response, url, structured_sink=None):
+    """Text of a fetched page or document, parsed according to the url's extension"""
+    content = response.content
 
-        elif extension in ['xls', 'xlsx']:
-            with io.BytesIO(content) as f:
-                df = pd.read_excel(f, dtype=str)
-                return df.to_string(index=False)
+    # Determine file extension
+    path = urlparse(url).path
+    extension = path.split('.')[-1].lower()
 
-        elif extension == 'csv':
-            with io.BytesIO(content) as f:
-                df = pd.read_csv(f, dtype=str)
-                return df.to_string(index=False)
+    if extension == 'pdf':
+        from PyPDF2 import PdfReader
+        with io.BytesIO(content) as f:
+            reader = PdfReader(f)
+            return '\n'.join([page.extract_text() or '' for page in reader.pages])
 
-        elif extension == 'txt':
-            return content.decode('utf-8', errors='ignore')
+    elif extension in ['xls', 'xlsx']:
+        import pandas as pd
+        with io.BytesIO(content) as f:
+            df = pd.read_excel(f, dtype=str)
+            return df.to_string(index=False)
 
-        elif extension in ['html', 'htm'] or '.' not in path:
-            # Handle normal HTML pages or URLs with no extension
-            soup = BeautifulSoup(response.text, 'html.parser')
-            # Step 1: Extract all <a href="..."> links
-            hrefs = [a['href'] for a in soup.find_all('a', href=True)]
+    elif extension == 'csv':
+        import pandas as pd
+        with io.BytesIO(content) as f:
+            df = pd.read_csv(f, dtype=str)
+            return df.to_string(index=False)
 
-            # Step 2: Extract all <p> paragraph text
-            paragraphs = [p.get_text(strip=True) for p in soup.find_all('p')]
+    elif extension == 'txt':
+        return content.decode('utf-8', errors='ignore')
 
-            # Step 3: Remove script/style tags and extract clean visible text
-            for tag in soup(['script', 'style', 'noscript']):
-                tag.decompose()
-            visible_text = soup.get_text(separator='\n')
-            visible_text_lines = [line.strip() for line in visible_text.splitlines()]
-            visible_text_cleaned = '\n'.join(line for line in visible_text_lines if line)
+    elif extension in ['html', 'htm'] or '.' not in path:
+        # Handle normal HTML pages or URLs with no extension
+        from bs4 import BeautifulSoup
+        soup = BeautifulSoup(response.text, 'html.parser')
+        if structured_sink is not None:
+            structured_sink.append({"url": url, **extract_structured_data(soup)})
+        # Step 1: Extract all <a href="..."> links
+        hrefs = [a['href'] for a in soup.find_all('a', href=True)]
 
-            return visible_text_cleaned
+        # Step 2: Extract all <p> paragraph text
+        paragraphs = [p.get_text(strip=True) for p in soup.find_all('p')]
 
-        else:
-            return f"[Unsupported file type: .{extension}]"
+        # Step 3: Remove script/style tags and extract clean visible text
+        for tag in soup(['script', 'style', 'noscript']):
+            tag.decompose()
+        visible_text = soup.get_text(separator='\n')
+        visible_text_lines = [line.strip() for line in visible_text.splitlines()]
+        visible_text_cleaned = '\n'.join(line for line in visible_text_lines if line)
+
+        return visible_text_cleaned
+
+    else:
+        return f"[Unsupported file type: .{extension}]"
+
+
+################################################### Structured Data ###################################################
+# schema.org types that describe the page or site rather than the listed entities
+NON_ENTITY_TYPES = {"website", "webpage", "breadcrumblist", "searchaction", "imageobject", "sitenavigationelement",
+                    "collectionpage", "listitem", "entrypoint", "readaction"}
+
+# Labels (lowercase alphanumerics) that name a schema field, beyond the field name itself
+FIELD_SYNONYMS = {
+    "name": ["legalname", "fullname", "businessname", "advisorname", "dealername", "outletname"],
+    "phone": ["telephone", "mobile", "phonenumber", "mobilenumber", "contactnumber", "contactno", "phoneno"],
+    "email": ["emailaddress", "emailid", "mail"],
+    "city": ["addresslocality", "locality", "town", "district"],
+    "address": ["streetaddress", "fulladdress", "location", "officeaddress"],
+    "specialization": ["speciality", "specialty", "knowsabout", "expertise", "jobtitle", "services", "category"],
+    "experience": ["yearsofexperience", "yearsinbusiness", "totalexperience"],
+    "lender": ["legalname", "organization", "bankname", "lendername"],
+    "officialwebsite": ["url", "website"],
+    "homeloanroi": ["interestrate", "rateofinterest", "roi", "homeloaninterestrate", "homeloanrate"],
+    "laproi": ["loanagainstpropertyinterestrate", "lapinterestrate", "laprate"],
+    "homeloanltv": ["ltv", "loantovalue", "loantovalueratio", "fundinglimit"],
+    "lapltv": ["lapltv", "loanagainstpropertyltv"],
+    "processingfees": ["processingfee", "processingcharges", "loanprocessingfee"],
+    "prepaymentcharges": ["prepaymentcharge", "partprepaymentcharges", "prepaymentpenalty"],
+    "foreclosurecharges": ["foreclosurecharge", "foreclosure", "preclosurecharges"],
+    "loantenurerange": ["tenure", "loantenure", "maximumtenure", "repaymenttenure"],
+    "minimumcreditscore": ["creditscore", "cibilscore", "minimumcibilscore"],
+    "minimumloanamount": ["minimumloanamount", "minloanamount"],
+    "maximumloanamount": ["maximumloanamount", "maxloanamount"],
+    "loanapprovaltime": ["approvaltime", "sanctiontime", "turnaroundtime"],
+    "customersupportcontactnumbers": ["customercare", "tollfree", "tollfreenumber", "helpline", "customersupport"],
+}
+
+
+def normalize_label(label):
+    return re.sub(r"[^a-z0-9]", "", str(label).lower())
+
+
+def _flatten_entity(item):
+    """Flat {label: text} view of a JSON-LD or microdata entity"""
+    flat = {}
+    for key, value in item.items():
+        if key.startswith("@"):
+            continue
+        if isinstance(value, dict):
+            nested = _flatten_entity(value)
+            flat.update({nested_key: nested_value for nested_key, nested_value in nested.items() if nested_key not in flat})
+            if key == "address" or "streetaddress" in map(normalize_label, value):
+                parts = [value.get(part) for part in ["streetAddress", "addressLocality", "addressRegion", "postalCode"]]
+                flat[key] = ", ".join(str(part).strip() for part in parts if part)
+            elif value.get("name"):
+                flat[key] = str(value["name"]).strip()
+        elif isinstance(value, list):
+            texts = [str(entry.get("name") or entry.get("telephone") or "") if isinstance(entry, dict) else str(entry) for entry in value]
+            flat[key] = ", ".join(text.strip() for text in texts if text and text.strip())
+            for entry in value:
+                if isinstance(entry, dict):
+                    nested = _flatten_entity(entry)
+                    flat.update({nested_key: nested_value for nested_key, nested_value in nested.items() if nested_key not in flat})
+        elif value is not None:
+            flat[key] = str(value).strip()
+    return flat
+
+
+def _jsonld_entities(soup):
+    """Entities of the JSON-LD blocks, list items first when the page is a listing"""
+    entities, listed = [], []
+
+    def visit(node, in_list=False):
+        if isinstance(node, list):
+            for entry in node:
+                visit(entry, in_list)
+            return
+        if not isinstance(node, dict):
+            return
+        if "@graph" in node:
+            visit(node["@graph"], in_list)
+        types = node.get("@type") or []
+        types = [types] if isinstance(types, str) else types
+        if any(normalize_label(kind) == "itemlist" for kind in types):
+            for element in node.get("itemListElement") or []:
+                visit(element.get("item", element) if isinstance(element, dict) else element, True)
+            return
+        if types and all(normalize_label(kind) in NON_ENTITY_TYPES for kind in types):
+            return
+        if node.get("name") or node.get("telephone"):
+            (listed if in_list else entities).append(_flatten_entity(node))
+
+    for script in soup.find_all("script", type="application/ld+json"):
+        text = (script.string or script.get_text() or "").strip()
+        try:
+            visit(json.loads(text))
+        except ValueError:
+            # Some sites leave trailing commas or several objects in one block
+            try:
+                visit(json.loads(re.sub(r",\s*([}\]])", r"\1", text)))
+            except ValueError:
+                continue
+    return listed or entities
+
+
+def _microdata_entities(soup):
+    """Top level itemscope entities with their itemprop values"""
+    def value_of(element):
+        if element.has_attr("itemscope"):
+            return properties(element)
+        for attribute in ["content", "href", "src", "datetime", "value"]:
+            if element.has_attr(attribute):
+                return element[attribute].replace("tel:", "").replace("mailto:", "")
+        return element.get_text(" ", strip=True)
+
+    def properties(scope):
+        values = {}
+        for element in scope.find_all(attrs={"itemprop": True}):
+            # Only properties that belong to this scope, not to a nested one
+            if element.find_parent(attrs={"itemscope": True}) is not scope:
+                continue
+            for name in element["itemprop"].split():
+                values.setdefault(name, value_of(element))
+        return values
+
+    entities = []
+    for scope in soup.find_all(attrs={"itemscope": True}):
+        if scope.has_attr("itemprop"):
+            continue
+        kind = scope.get("itemtype", "").rstrip("/").split("/")[-1]
+        if normalize_label(kind) in NON_ENTITY_TYPES:
+            continue
+        flat = _flatten_entity(properties(scope))
+        if flat.get("name") or flat.get("telephone"):
+            entities.append(flat)
+    return entities
+
+
+def _table_rows(soup):
+    """Rows of the header tables as {header: cell} and the label/value pairs of two column tables"""
+    rows, pairs = [], {}
+    for table in soup.find_all("table"):
+        grid = []
+        for tr in table.find_all("tr"):
+            cells = [cell.get_text(" ", strip=True) for cell in tr.find_all(["th", "td"])]
+            if any(cells):
+                grid.append(cells)
+        if not grid:
+            continue
+
+        header_row = table.find("tr")
+        has_header = bool(header_row and header_row.find("th") and not header_row.find("td")) or bool(table.find("thead"))
+        if has_header and len(grid) > 1:
+            headers = grid[0]
+            for cells in grid[1:]:
+                if len(cells) == len(headers):
+                    rows.append(dict(zip(headers, cells)))
+        elif all(len(cells) == 2 for cells in grid):
+            for label, value in grid:
+                pairs.setdefault(label, value)
+    return rows, pairs
+
+
+def extract_structured_data(soup):
+    """
+    Structured data embedded in an html page
 
-    except Exception as e:
-        return f"❌ Error processing {url}: {e}"
+    Args:
+        soup: Parsed page (BeautifulSoup)
+
+    Returns:
+        dict: "entities" from JSON-LD and microdata, "rows" of header tables and
+            "pairs" of two column label/value tables
+    """
+    entities = _jsonld_entities(soup) + _microdata_entities(soup)
+    rows, pairs = _table_rows(soup)
+    return {"entities": entities, "rows": rows, "pairs": pairs}
+
+
+def map_to_fields(values: dict, field_names: list) -> dict:
+    """Map {label: value} onto the schema fields, by field name, synonym or contained synonym"""
+    by_label = {normalize_label(label): value for label, value in values.items() if value not in (None, "")}
+    mapped = {}
+    for field in field_names:
+        candidates = [normalize_label(field)] + FIELD_SYNONYMS.get(normalize_label(field), [])
+        value = next((by_label[candidate] for candidate in candidates if candidate in by_label), None)
+        if value is None:
+            # Longer labels such as "Processing fee (salaried)"
+            value = next((label_value for label, label_value in by_label.items()
+                          for candidate in candidates if len(candidate) >= 5 and candidate in label), None)
+        if value is not None:
+            mapped[field] = value
+    return mapped
+
+
+def structured_coverage(records: list, record_model, require_fields: bool = True) -> float:
+    """Mean share of the schema fields filled per record, 0 when a required field is missing"""
+    if not records:
+        return 0.0
+    fields = record_model.model_fields
+    scores = []
+    for record in records:
+        if require_fields and any(field.is_required() and not record.get(name) for name, field in fields.items()):
+            scores.append(0.0)
+            continue
+        scores.append(sum(1 for name in fields if record.get(name)) / len(fields))
+    return sum(scores) / len(scores)
+
+
+def map_structured_records(structured_pages: list, record_model, single_record: bool = False) -> list:
+    """
+    Records of `record_model` from the structured data of pages
+
+    Args:
+        structured_pages (list): Outputs of extract_structured_data
+        record_model: Pydantic model of a record
+        single_record (bool): Merge everything into one record (e.g. one lender) instead
+            of a record per entity or table row
+
+    Returns:
+        list: Mapped records, those without any schema field are dropped
+    """
+    field_names = [name for name in record_model.model_fields if name != "sourceurls"]
+    if single_record:
+        record = {}
+        for page in structured_pages:
+            for values in [page.get("pairs", {})] + page.get("entities", []):
+                for name, value in map_to_fields(values, field_names).items():
+                    record.setdefault(name, value)
+        # Rate grids have one row per slab, their values are kept together
+        grid_values = {}
+        for page in structured_pages:
+            for row in page.get("rows", []):
+                for name, value in map_to_fields(row, field_names).items():
+                    grid_values.setdefault(name, [])
+                    if value not in grid_values[name]:
+                        grid_values[name].append(value)
+        for name, values in grid_values.items():
+            record.setdefault(name, " / ".join(values))
+        return [record] if record else []
+
+    records = []
+    for page in structured_pages:
+        for values in page.get("entities", []) + page.get("rows", []):
+            record = map_to_fields(values, field_names)
+            if record:
+                records.append(record)
+    return records
+
+
+def extract_structured_records(structured_pages: list, record_model, single_record: bool = False) -> tuple:
+    """
+    Map the structured data collected while fetching pages onto `record_model`
+
+    Args:
+        structured_pages (list): Entries appended to a `structured_sink` by the fetchers
+        record_model: Pydantic model of a record
+        single_record (bool): Merge the pages into one record
+
+    Returns:
+        tuple: (records, coverage) where coverage is from structured_coverage
+    """
+    records = map_structured_records(structured_pages, record_model, single_record)
+    coverage = structured_coverage(records, record_model)
+    print(f"🧩 Structured data: {len(records)} record(s) with {coverage:.0%} coverage from {len(structured_pages)} page(s)")
+    return records, coverage
 
 
 
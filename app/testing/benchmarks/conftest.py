@@ -0,0 +1,155 @@
+"""
+Benchmark suite for the scrape -> extract -> save path
+
+Runs entirely offline on recorded fixtures: lender pages, PDF and rate cards are
+served from fixtures/, the LLM returns the canned responses in
+fixtures/llm_responses.json and Supabase is replaced by the local PostgREST
+stand-in in app.testing.fake_postgrest.
+
+    pip install pytest pytest-benchmark
+    pytest app/testing/benchmarks --benchmark-only
+
+Every benchmark fails when its mean time exceeds the budget in thresholds.json,
+scaled by BENCHMARK_THRESHOLD_SCALE (e.g. 2 on slow CI runners). To compare against
+a saved baseline instead:
+
+    pytest app/testing/benchmarks --benchmark-autosave
+    pytest app/testing/benchmarks --benchmark-compare --benchmark-compare-fail=mean:25%
+"""
+
+import os
+import json
+from pathlib import Path
+from types import SimpleNamespace
+from urllib.parse import urlparse
+
+import pytest
+
+pytest.importorskip("pytest_benchmark")
+
+FIXTURES_DIR = Path(__file__).parent / "fixtures"
+THRESHOLDS = json.loads((Path(__file__).parent / "thresholds.json").read_text())
+THRESHOLD_SCALE = float(os.getenv("BENCHMARK_THRESHOLD_SCALE", "1"))
+
+LENDER_DOMAIN = "https://www.samplehfc.example"
+
+# Recorded file served for each url extension, pages without one get the lender html
+FIXTURE_BY_EXTENSION = {
+    "pdf": "schedule_of_charges.pdf",
+    "xlsx": "rate_card.xlsx",
+    "xls": "rate_card.xlsx",
+    "csv": "rate_card.csv",
+}
+
+
+def load_fixture(name: str) -> bytes:
+    return (FIXTURES_DIR / name).read_bytes()
+
+
+class RecordedResponse:
+    """The parts of requests.Response the extractors use"""
+
+    def __init__(self, content: bytes, content_type: str):
+        self.content = content
+        self.text = content.decode("utf-8", errors="ignore")
+        self.status_code = 200
+        self.headers = {"content-type": content_type}
+
+    def raise_for_status(self):
+        pass
+
+
+def recorded_fetch(url, max_retries=3, delay_between_retries=2):
+    """Drop-in for make_request_with_retry serving the recorded fixtures"""
+    path = urlparse(url).path
+    extension = path.split(".")[-1].lower() if "." in path else ""
+    name = FIXTURE_BY_EXTENSION.get(extension, "lender_home.html")
+    return RecordedResponse(load_fixture(name), "text/html" if name.endswith(".html") else "application/octet-stream")
+
+
+@pytest.fixture
+def recorded_web(monkeypatch):
+    """Serve every page fetch from the fixtures, without the politeness delays"""
+    from app.services import webpage
+
+    monkeypatch.setattr(webpage, "make_request_with_retry", recorded_fetch)
+    monkeypatch.setattr(webpage, "add_request_delay", lambda delay_seconds=1: None)
+    return webpage
+
+
+class CannedCompletions:
+    """chat.completions stand-in answering every parse() with the recorded output"""
+
+    def __init__(self, responses: dict):
+        self.responses = responses
+
+    def parse(self, model=None, messages=None, response_format=None, **kwargs):
+        usage = self.responses["usage"]
+        # Formats restricted to some fields (e.g. the missing lender fields) answer from the full schema
+        recorded = self.responses.get(response_format.__name__) or self.responses[response_format.__name__.replace("Partial", "")]
+        parsed = response_format(**{name: recorded[name] for name in response_format.model_fields})
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(parsed=parsed))],
+            usage=SimpleNamespace(**usage),
+        )
+
+
+class CannedOpenAIClient:
+    """OpenAI client stand-in for OpenAIAnalyzer(client=...)"""
+
+    def __init__(self, responses: dict):
+        completions = CannedCompletions(responses)
+        self.chat = SimpleNamespace(completions=completions)
+        self.beta = SimpleNamespace(chat=SimpleNamespace(completions=completions))
+
+
+@pytest.fixture
+def canned_openai_analyzer():
+    from app.services.llm_services import OpenAIAnalyzer
+
+    responses = json.loads(load_fixture("llm_responses.json"))
+    return OpenAIAnalyzer(client=CannedOpenAIClient(responses))
+
+
+@pytest.fixture(scope="session")
+def fake_postgrest():
+    pytest.importorskip("supabase")
+    from app.testing import fake_postgrest as postgrest
+
+    server = postgrest.start_server()
+    yield postgrest, f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture
+def database_service(fake_postgrest, monkeypatch):
+    """DatabaseService talking to an empty local PostgREST stand-in"""
+    from app.config.settings import settings
+    from app.services.database_service import DatabaseService
+
+    postgrest, url = fake_postgrest
+    postgrest.reset()
+    monkeypatch.setattr(settings, "SUPABASE_URL", url)
+    monkeypatch.setattr(settings, "SUPABASE_SERVICE_ROLE_KEY", postgrest.FAKE_SERVICE_ROLE_KEY)
+    service = DatabaseService()
+    if not service.client:
+        pytest.skip("Supabase client could not be created")
+    return service
+
+
+@pytest.fixture
+def bench(benchmark, request):
+    """
+    Benchmark a callable and fail when its mean time exceeds the budget
+
+    The budget is looked up in thresholds.json under the test name.
+    """
+    def run(fn, *args, **kwargs):
+        result = benchmark(fn, *args, **kwargs)
+        budget = THRESHOLDS.get(request.node.name)
+        if budget is not None and benchmark.stats is not None:
+            mean = benchmark.stats.stats.mean
+            limit = budget * THRESHOLD_SCALE
+            assert mean <= limit, f"{request.node.name} regressed: mean {mean * 1000:.1f}ms > budget {limit * 1000:.1f}ms"
+        return result
+    return run
@@ -0,0 +1,19 @@
+"""
+Parsing throughput of extract_content_from_url on the recorded lender documents
+"""
+
+import pytest
+
+from app.testing.benchmarks.conftest import LENDER_DOMAIN
+
+
+@pytest.mark.parametrize("path, expected", [
+    ("/home-loan/interest-rates", "Interest Rates"),
+    ("/downloads/schedule-of-charges.pdf", "Processing fee"),
+    ("/downloads/rate_card.xlsx", "Balance Transfer"),
+    ("/downloads/rate_card.csv", "Balance Transfer"),
+], ids=["html", "pdf", "xlsx", "csv"])
+def test_extract_content(bench, recorded_web, path, expected):
+    pytest.importorskip({"html": "bs4", "pdf": "PyPDF2"}.get(path.rsplit(".", 1)[-1] if "." in path else "html", "pandas"))
+    text = bench(recorded_web.extract_content_from_url, LENDER_DOMAIN + path, domain=LENDER_DOMAIN)
+    assert expected in text
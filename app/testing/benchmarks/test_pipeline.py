@@ -0,0 +1,104 @@
+"""
+Benchmarks of the steps between scraping and saving: dedup, prompt assembly,
+schema generation, batch save and the full lender extraction on recorded data
+"""
+
+import json
+
+import pytest
+
+from app.testing.benchmarks.conftest import LENDER_DOMAIN, load_fixture, recorded_fetch
+
+pytest.importorskip("bs4")
+
+KEYWORDS = ["interest", "roi", "foir", "ltv", "lap", "eligibility", "processing", "charges", "property"]
+
+
+@pytest.fixture(scope="module")
+def crawled_pages():
+    """Forty pages of the recorded site, sharing navigation and footer like a real crawl"""
+    from app.services.webpage import extract_content_from_url
+    import app.services.webpage as webpage
+
+    original = webpage.make_request_with_retry, webpage.add_request_delay
+    webpage.make_request_with_retry, webpage.add_request_delay = recorded_fetch, lambda delay_seconds=1: None
+    try:
+        page = extract_content_from_url(LENDER_DOMAIN + "/home-loan", domain=LENDER_DOMAIN)
+    finally:
+        webpage.make_request_with_retry, webpage.add_request_delay = original
+
+    pages = {}
+    for index in range(40):
+        unique = "\n".join(f"Page {index} detail {line}: rate revised to {8 + index / 100:.2f}%" for line in range(30))
+        pages[f"{LENDER_DOMAIN}/page-{index}"] = page + "\n" + unique
+    return pages
+
+
+def test_dedup_sections(bench, crawled_pages):
+    from app.services.chunking import build_sections
+
+    sections = bench(build_sections, crawled_pages)
+    assert len(sections) == len(crawled_pages)
+    # Shared boilerplate only survives on the first page
+    assert sum("Customer care" in section for section in sections) == 1
+
+
+def test_prompt_assembly(bench, crawled_pages):
+    from app.config.settings import settings
+    from app.services.chunking import build_sections, chunk_sections
+    from app.services.relevance import filter_extracted_data
+    from app.utils.prompts import get_lenders_data_prompt
+
+    def assemble():
+        filtered = filter_extracted_data(crawled_pages, KEYWORDS)
+        chunks = chunk_sections(build_sections(filtered), max_tokens=settings.EXTRACTION_CHUNK_MAX_TOKENS)
+        return [get_lenders_data_prompt(LENDER_DOMAIN, chunk) for chunk in chunks]
+
+    prompts = bench(assemble)
+    assert prompts and all(LENDER_DOMAIN in prompt for prompt in prompts)
+
+
+def test_schema_generation(bench):
+    from app.api.endpoints.sniffer import generate_output_format
+
+    columns = [{"column_name": f"field_{index}", "column_type": kind}
+               for index, kind in enumerate(["str", "int", "float", "bool", "list", "optional_str"] * 10)]
+
+    def generate():
+        model = generate_output_format(columns)
+        return model.model_json_schema()
+
+    schema = bench(generate)
+    assert len(schema["properties"]) == len(columns)
+
+
+def test_batch_save(bench, database_service):
+    records = [{"lender": f"Lender {index}", "homeloanroi": "8.50%", "lendertype": "HFC"} for index in range(50)]
+
+    def save():
+        # Fresh ids every round so each run inserts the full batch
+        return database_service.save_batch_unique_data([dict(record) for record in records], "bench_lenders")
+
+    result = bench(save)
+    assert result["inserted"] == len(records)
+
+
+def test_lenders_extraction(bench, recorded_web, canned_openai_analyzer, monkeypatch, tmp_path):
+    from app.config.settings import settings
+    from app.services import sniffer_services
+
+    # Start from an empty url inventory, the first round discovers the pages from the anchors
+    monkeypatch.setattr(settings, "URL_INVENTORY_DIR", str(tmp_path / "url_inventory"))
+    monkeypatch.setattr(sniffer_services, "extract_urls_from_website", recorded_web.extract_urls_from_website)
+    monkeypatch.setattr(sniffer_services, "extract_content_from_url", recorded_web.extract_content_from_url)
+    monkeypatch.setattr(sniffer_services, "openai_analyzer", canned_openai_analyzer)
+
+    result = bench(
+        sniffer_services.get_lenders_data,
+        LENDER_DOMAIN + "/home-loan",
+        multiple_urls=["/downloads/schedule-of-charges.pdf", "/downloads/rate_card.xlsx"],
+        keywords=KEYWORDS,
+    )
+    assert result["successful_extractions"] > 0
+    canned = json.loads(load_fixture("llm_responses.json"))["LendersExtractSchema"]
+    assert result["data"]["homeloanroi"] == canned["homeloanroi"]
@@ -1,3 +1,6 @@
+import sys
+import time
+import argparse
 import requests
 import io
 import re
@@ -13,15 +16,25 @@ from PyPDF2 import PdfReader
 # import textract
 from bs4 import BeautifulSoup
 from urllib.parse import urlparse, urljoin
-from prompts import prompt, system_message, search_system_message
 from supabase import create_client, Client
 from datetime import datetime
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
 import pytz
 
-from openai import OpenAI
 import os
 from dotenv import load_dotenv
 
+# Add the project root to Python path
+sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))))
+
+from app.services.clients import get_openai_client
+from app.services.field_resolver import resolve_missing_fields
+from app.services.llm_services import get_openai_analyzer
+from app.utils.rate_limiter import get_provider_limiter
+from app.utils.prompts import (
+    lenders_data_system_message as system_message, search_system_message, get_lenders_data_prompt
+)
+
 # Load environment variables
 load_dotenv()
 
@@ -38,8 +51,11 @@ if not OPENAI_API_KEY:
 if not SUPABASE_URL or not SUPABASE_KEY or not SUPABASE_TABLE:
     raise ValueError("Missing Supabase environment variables. Please check your .env file.")
 
-# Initialize OpenAI client
-client = OpenAI(api_key=OPENAI_API_KEY)
+# Shared OpenAI client, one connection pool for every worker thread
+client = get_openai_client()
+
+# Model of the lender data extraction, live or batched
+LENDERS_DATA_MODEL = "gpt-4.1-mini-2025-04-14"
 
 
 # Initialize Supabase client
@@ -105,6 +121,37 @@ key_prompt_map = {
 #     input_data = pd.read_excel(data_path, sheet_name="Sheet1")
 #     return input_data
 
+class DeadlineExceeded(Exception):
+    """A lender ran past its time budget (not retried by the provider limiters)"""
+
+
+def time_left(deadline, cap=None):
+    """
+    Seconds until the lender deadline, at most `cap`
+
+    Args:
+        deadline (float): time.monotonic() deadline of the lender, None for no deadline
+        cap (float): Upper bound, e.g. the usual request timeout
+
+    Returns:
+        float: Seconds to give the next call, `cap` without a deadline
+
+    Raises:
+        DeadlineExceeded: Once the deadline has passed
+    """
+    if deadline is None:
+        return cap
+    left = deadline - time.monotonic()
+    if left <= 0:
+        raise DeadlineExceeded("Lender time budget exhausted")
+    return min(left, cap) if cap else left
+
+
+def llm_client(deadline=None):
+    """The shared OpenAI client, with the request timeout cut to the time the lender has left"""
+    return client if deadline is None else client.with_options(timeout=time_left(deadline))
+
+
 def extract_base_url(full_url):
     parsed = urlparse(full_url)
     base_url = f"{parsed.scheme}://{parsed.netloc}/"
@@ -150,8 +197,8 @@ def normalize_urls(raw_urls, base_domain):
 
 
 
-def extract_urls_from_website(homeloan_website):
-    response = requests.get(homeloan_website, timeout=15)
+def extract_urls_from_website(homeloan_website, timeout=15):
+    response = requests.get(homeloan_website, timeout=timeout)
     response.raise_for_status()
     content = response.content
     soup = BeautifulSoup(response.text, 'html.parser')
@@ -189,11 +236,11 @@ def filter_urls_by_keywords(urls, domain, keywords):
 
 
 # Supported extensions and their handlers
-def extract_content_from_url(url,domain):
+def extract_content_from_url(url,domain, timeout=15):
     if not url.startswith("http"):
         url = domain +"/"+ url
     try:
-        response = requests.get(url, timeout=15)
+        response = requests.get(url, timeout=timeout)
         response.raise_for_status()
         content = response.content
 
@@ -261,29 +308,36 @@ def extract_content_from_url(url,domain):
 
 
 # Function to send a prompt to GPT model
-def gpt_model_response(prompt, model="gpt-4.1-mini-2025-04-14"):
+def gpt_model_response(prompt, model=LENDERS_DATA_MODEL, deadline=None):
     try:
-        response = client.beta.chat.completions.parse(
-            model=model,
-            messages=[
-                {"role": "system", "content": system_message},
-                {"role": "user", "content": prompt}
-            ],
-            temperature=0,  # creativity
+        response = get_provider_limiter("openai").run(
+            lambda: llm_client(deadline).beta.chat.completions.parse(
+                model=model,
+                messages=[
+                    {"role": "system", "content": system_message},
+                    {"role": "user", "content": prompt}
+                ],
+                temperature=0,  # creativity
+            )
         )
         return response
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         return f"Error: {e}"
 
 
-def gpt_search_response(search_prompt, model="gpt-4o-mini-search-preview-2025-03-11"):
+def gpt_search_response(search_prompt, model="gpt-4o-mini-search-preview-2025-03-11", system_message=search_system_message,
+                        deadline=None):
     try:
-        response = client.chat.completions.create(
+        response = llm_client(deadline).chat.completions.create(
             model=model,
-            messages=[{"role": "system", "content": search_system_message},
+            messages=[{"role": "system", "content": system_message},
              {"role": "user", "content": search_prompt}],
         )
         return response
+    except DeadlineExceeded:
+        raise
     except Exception as e:
         return f"Error: {e}"
 
@@ -545,109 +599,158 @@ def update_row(table_name, update_data, match_column, match_value):
 
 
 
-# Get all rows from the table where data is not updated
-lender_data = fetch_lenders_with_null_updated_at()
-print("Total rows fetched:-",len(lender_data))
+def scrape_lender(row, deadline=None):
+    """
+    Scrape the keyword pages of a lender and build its extraction prompt
+
+    Args:
+        row (dict): Lender row from the lenders table
+        deadline (float): time.monotonic() deadline of the lender, None for no deadline
 
-# Iterate through each lender row
-for row in lender_data:
+    Returns:
+        str: Extraction prompt, empty when nothing usable was scraped
+    """
     lender_name = str(row.get("lender"))
     homeloan_website = str(row.get("homeloan_website"))
-    official_website = str(row.get("official_website"))
     domain = extract_base_url(homeloan_website)
 
     print(f"\n➡️ Lender: {lender_name}")
     print("🌐 Domain:", domain)
     print("🔗 Website:", homeloan_website)
 
-    try:
-        # Extract URLs and paragraph text from homepage
+    # Extract URLs and paragraph text from homepage
 
-        # Filtering the urls to get the first url
-        homeloan_urls = [url.strip() for url in homeloan_website.strip().splitlines() if url.strip()]
-        homeloan_website = homeloan_urls[0] if homeloan_urls else None
-        filtered = homeloan_urls[1:] if len(homeloan_urls) > 1 else []
+    # Filtering the urls to get the first url
+    homeloan_urls = [url.strip() for url in homeloan_website.strip().splitlines() if url.strip()]
+    homeloan_website = homeloan_urls[0] if homeloan_urls else None
+    filtered = homeloan_urls[1:] if len(homeloan_urls) > 1 else []
 
-        extracted_urls = extract_urls_from_website(homeloan_website)
-        hrefs = extracted_urls.get("hrefs", [])
-        paragraphs = extracted_urls.get("paragraphs", [])
-        other_urls = filter_urls_by_keywords(hrefs, domain, keywords)
+    extracted_urls = extract_urls_from_website(homeloan_website, timeout=time_left(deadline, 15))
+    hrefs = extracted_urls.get("hrefs", [])
+    paragraphs = extracted_urls.get("paragraphs", [])
+    other_urls = filter_urls_by_keywords(hrefs, domain, keywords)
 
-        # combine the other urls with the filtered urls
-        filtered = filtered + other_urls
+    # combine the other urls with the filtered urls
+    filtered = filtered + other_urls
 
-        if not filtered:
-            print("⚠️ No URLs matched the keywords. Skipping.")
-            continue
-        filtered = normalize_urls(filtered, homeloan_website)
+    if not filtered:
+        print("⚠️ No URLs matched the keywords. Skipping.")
+        return ""
+    filtered = normalize_urls(filtered, homeloan_website)
 
-        # Remove duplicate urls from the filtered urls
-        filtered = list(set(filtered))
+    # Remove duplicate urls from the filtered urls
+    filtered = list(set(filtered))
 
-        # Extract data from filtered URLs
-        extracted_data = {}
-        for url in filtered[:50]:
-            try:
-                print(f"🔍 Scraping URL: {url}")
-                text = extract_content_from_url(url, domain=domain)
-                extracted_data[url] = text
-            except Exception as e:
-                print(f"❌ Error scraping {url}: {e}")
-
-        if not extracted_data:
-            print("⚠️ No data extracted from filtered URLs. Skipping.")
-            continue
-
-        # Flatten and de-duplicate data
-        print("Extracting data from filtered URLs:")
-        final_data = []
-        for value in extracted_data.values():
-            for line in value.split("\n"):
-                cleaned = line.strip()
-                if cleaned and cleaned not in final_data:
-                    final_data.append(cleaned)
-        final_data = ", ".join(final_data)
-
-        if not final_data:
-            print("⚠️ No usable data extracted after cleaning. Skipping.")
-            continue
-
-        # Prepare and call GPT model
-        cleaned_data = final_data.replace("{", "(").replace("}", ")")
-        prompt_data = prompt.format(lender_name=lender_name, final_data=cleaned_data)
-        model_response = gpt_model_response(prompt_data)
-        parsed_response = model_response.choices[0].message.content
-        
+    # Extract data from filtered URLs
+    extracted_data = {}
+    for url in filtered[:50]:
+        timeout = time_left(deadline, 15)
         try:
-            model_response_data = json.loads(parsed_response)
+            print(f"🔍 Scraping URL: {url}")
+            text = extract_content_from_url(url, domain=domain, timeout=timeout)
+            extracted_data[url] = text
         except Exception as e:
-            print(f"❌ Failed to parse model response JSON: {e}")
-            continue
+            print(f"❌ Error scraping {url}: {e}")
+
+    if not extracted_data:
+        print("⚠️ No data extracted from filtered URLs. Skipping.")
+        return ""
+
+    # Flatten and de-duplicate data
+    print("Extracting data from filtered URLs:")
+    final_data = []
+    for value in extracted_data.values():
+        for line in value.split("\n"):
+            cleaned = line.strip()
+            if cleaned and cleaned not in final_data:
+                final_data.append(cleaned)
+    final_data = ", ".join(final_data)
+
+    if not final_data:
+        print("⚠️ No usable data extracted after cleaning. Skipping.")
+        return ""
+
+    return get_lenders_data_prompt(lender_name, final_data)
+
+
+def refresh_lender(row, prompt=None, batch_result=None, deadline=None):
+    """
+    Scrape, extract and save the data of a single lender
+
+    Args:
+        row (dict): Lender row from the lenders table
+        prompt: scrape_lender result (or the exception it raised) when already scraped
+        batch_result (dict): batch_structured_output result of the prompt, None to call the model live
+        deadline (float): time.monotonic() deadline, every fetch and model call is cut to the time left
+
+    Returns:
+        dict: Lender name, status and total tokens used
+    """
+    lender_name = str(row.get("lender"))
+    homeloan_urls = [url.strip() for url in str(row.get("homeloan_website")).strip().splitlines() if url.strip()]
+    homeloan_website = homeloan_urls[0] if homeloan_urls else None
+    official_website = str(row.get("official_website"))
+    total_tokens = [0]
+
+    def count_usage(response):
+        usage = getattr(response, "usage", None)
+        if usage:
+            total_tokens[0] += usage.total_tokens
+
+    def search_text(system_message, search_prompt):
+        search_response = gpt_search_response(search_prompt, system_message=system_message, deadline=deadline)
+        count_usage(search_response)
+        return search_response.choices[0].message.content
+
+    try:
+        if isinstance(prompt, Exception):
+            raise prompt
+        if prompt is None:
+            prompt = scrape_lender(row, deadline=deadline)
+        if not prompt:
+            return {"lender": lender_name, "status": "skipped", "tokens": total_tokens[0]}
+
+        if batch_result is None:
+            # Prepare and call GPT model
+            model_response = gpt_model_response(prompt, deadline=deadline)
+            count_usage(model_response)
+            parsed_response = model_response.choices[0].message.content
+
+            try:
+                model_response_data = json.loads(parsed_response)
+            except Exception as e:
+                print(f"❌ Failed to parse model response JSON: {e}")
+                return {"lender": lender_name, "status": "failed", "tokens": total_tokens[0]}
+        else:
+            total_tokens[0] += batch_result["token_usage"].get("total_token", 0)
+            if not batch_result["success"]:
+                raise RuntimeError(f"Batch request failed: {batch_result['error']}")
+            model_response_data = batch_result["data"]
 
         print("✅ Primary model responded successfully.")
         
-        # Fill missing fields using GPT search
-        missing_fields = 0
-        for key, value in model_response_data.items():
-            if value in ["Not Found","Not Found.","Not found","Not found."]:
-                search_prompt = (
-                f"Please provide the real financial data related to the housing loans "
-                f"provided by the lenders.\nKEY: Search for {key} detail from the Lender/Bank: {lender_name}\n"
-                "Your response should include only the values related to the key in numerical data or words less than 10."
-                "STRICTLY: Do not provide any source information or urls."
-                )
-                try:
-                    search_response = gpt_search_response(search_prompt)
-                    parsed_search = search_response.choices[0].message.content
-                    model_response_data[key] = clean_model_response(str(parsed_search))
-                    missing_fields += 1
-                except Exception as e:
-                    print(f"❌ GPT Search failed for key '{key}': {e}")
+        # Fill missing fields using grouped, concurrent GPT search
+        missing_keys = [
+            key for key, value in model_response_data.items()
+            if value in ["Not Found","Not Found.","Not found","Not found."]
+        ]
+        resolved_fields = resolve_missing_fields(
+            lender_name,
+            missing_keys,
+            search_fn=search_text,
+            key_descriptions=key_prompt_map,
+            clean_fn=clean_model_response,
+        )
+        model_response_data.update(resolved_fields)
+        missing_fields = len(resolved_fields)
 
         model_response_data["updated_at"] = datetime.now(timezone)
         model_response_data['homeloan_website'] = homeloan_website
         model_response_data['official_website'] = official_website
 
+        # A lender past its deadline is reported as timed out, so it must not be saved late
+        time_left(deadline)
+
         # Save to database
         update_row(
             table_name="lenders_data",
@@ -656,9 +759,14 @@ for row in lender_data:
             match_value=lender_name
         )
         print(f"✅ Data saved for: {lender_name} | 🔍 Missing fields filled: {missing_fields}")
-        pass
+        return {"lender": lender_name, "status": "saved", "tokens": total_tokens[0]}
+
+    except Exception as e:
+        # Calls cut short by the deadline fail with their own timeout errors too
+        if isinstance(e, DeadlineExceeded) or (deadline is not None and time.monotonic() >= deadline):
+            print(f"⏱️ Stopped {lender_name}, it ran out of time")
+            return {"lender": lender_name, "status": "timeout", "tokens": total_tokens[0]}
 
-    except:
         # temporary_filter = ["AU Small Finance Bank Ltd.","Bank of Baroda","Central Bank of India","ICICI Bank Ltd.",
         # "IFL Housing Finance Limited", "Manappuram Home Finance Limited","PNB Housing Finance Limited","Punjab & Sind Bank",
         # "South Indian Bank Ltd.","UCO Bank","Union Bank of India","Yes Bank Ltd."]
@@ -679,19 +787,18 @@ for row in lender_data:
             model_response_data["alias"] = ""
             model_response_data["other_urls"] = ""
 
-            for key, value in key_prompt_map.items():
-                search_prompt = f"""Please provide the real financial data related to the housing loans.
-                Find {value} from the Lender/Bank: {lender_name}
-                STRICTLY: Do not provide any source information or urls and keep the response very short and concise."""
-                try:
-                        search_response = gpt_search_response(search_prompt)
-                        parsed_search = search_response.choices[0].message.content
-                        model_response_data[key] = clean_model_response(str(parsed_search))
-                except Exception as e:
-                    print(f"❌ GPT Search failed for key '{key}': {e}")
-                print(f"✅ GPT Search successful for key '{key}'")
+            resolved_fields = resolve_missing_fields(
+                lender_name,
+                list(key_prompt_map.keys()),
+                search_fn=search_text,
+                key_descriptions=key_prompt_map,
+                clean_fn=clean_model_response,
+            )
+            model_response_data.update(resolved_fields)
+            print(f"✅ GPT Search successful for {len(resolved_fields)} keys")
 
             model_response_data["updated_at"] = datetime.now(timezone)
+            time_left(deadline)
             update_row(
                 table_name="lenders_data",
                 update_data=model_response_data,
@@ -699,9 +806,227 @@ for row in lender_data:
                 match_value=lender_name
             )
             print(f"✅ Data saved for: {lender_name} using search model.")
-        else:
-            pass
+            return {"lender": lender_name, "status": "saved", "tokens": total_tokens[0]}
+
+        return {"lender": lender_name, "status": "failed", "tokens": total_tokens[0]}
 
     finally:
         print(f"✅ Finished processing lender: {lender_name}")
 
+
+################################################### REFRESH RUNNER ###################################################
+# Statuses that are written to the checkpoint and not retried on restart
+CHECKPOINT_DONE_STATUSES = ["saved", "skipped"]
+
+# Extra seconds a lender past its deadline gets to return, for work no timeout reaches (e.g. parsing a large PDF)
+LENDER_TIMEOUT_GRACE_SECONDS = 60
+
+
+def load_checkpoint(checkpoint_path):
+    """
+    Load the lenders already completed by a previous run.
+
+    Args:
+        checkpoint_path (str): Path to the JSONL checkpoint file
+
+    Returns:
+        set: Completed lender names
+    """
+    completed = set()
+    if not os.path.exists(checkpoint_path):
+        return completed
+
+    with open(checkpoint_path, "r", encoding="utf-8") as file:
+        for line in file:
+            try:
+                entry = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if entry.get("status") in CHECKPOINT_DONE_STATUSES:
+                completed.add(entry.get("lender"))
+    return completed
+
+
+def append_checkpoint(checkpoint_path, result):
+    """Append a finished lender to the checkpoint file"""
+    entry = dict(result, finished_at=datetime.now(timezone).isoformat())
+    with open(checkpoint_path, "a", encoding="utf-8") as file:
+        file.write(json.dumps(entry) + "\n")
+
+
+def run_refresh(lender_rows, workers=4, lender_timeout=600, checkpoint_path="lender_refresh_checkpoint.jsonl"):
+    """
+    Refresh lenders concurrently with per-lender timeouts and a resumable checkpoint.
+
+    Lenders that exceed the timeout are reported as timed out and left out of the
+    checkpoint so the next run retries them. Every fetch and model call of a lender
+    is cut to the time it has left, so its worker stops at the deadline and is
+    free for the next lender; one still busy after LENDER_TIMEOUT_GRACE_SECONDS is
+    given up on.
+
+    Args:
+        lender_rows (list): Lender rows to refresh
+        workers (int): Number of lenders processed in parallel
+        lender_timeout (int): Seconds a single lender may run
+        checkpoint_path (str): Path to the JSONL checkpoint file
+
+    Returns:
+        dict: Run summary with counts and throughput
+    """
+    completed = load_checkpoint(checkpoint_path)
+    pending_rows = [row for row in lender_rows if str(row.get("lender")) not in completed]
+    print(f"🔁 Resuming refresh: {len(completed)} lenders already done, {len(pending_rows)} pending")
+
+    started_at = {}
+    statuses = {}
+    total_tokens = 0
+    run_start = time.monotonic()
+
+    def run_one(row):
+        started_at[str(row.get("lender"))] = time.monotonic()
+        return refresh_lender(row, deadline=started_at[str(row.get("lender"))] + lender_timeout)
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = {executor.submit(run_one, row): str(row.get("lender")) for row in pending_rows}
+    pending = set(futures)
+
+    try:
+        while pending:
+            done, pending = wait(pending, timeout=1, return_when=FIRST_COMPLETED)
+            for future in done:
+                lender_name = futures[future]
+                try:
+                    result = future.result()
+                except Exception as e:
+                    print(f"❌ Refresh failed for {lender_name}: {e}")
+                    result = {"lender": lender_name, "status": "failed", "tokens": 0}
+                statuses[lender_name] = result["status"]
+                total_tokens += result.get("tokens", 0)
+                if result["status"] in CHECKPOINT_DONE_STATUSES:
+                    append_checkpoint(checkpoint_path, result)
+
+            now = time.monotonic()
+            for future in list(pending):
+                lender_name = futures[future]
+                if lender_name in started_at and now - started_at[lender_name] > lender_timeout + LENDER_TIMEOUT_GRACE_SECONDS:
+                    print(f"⏱️ Lender {lender_name} still running {LENDER_TIMEOUT_GRACE_SECONDS}s after its {lender_timeout}s timeout")
+                    statuses[lender_name] = "timeout"
+                    pending.discard(future)
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+
+    return summarize_refresh(statuses, total_tokens, run_start)
+
+
+def run_batch_refresh(lender_rows, workers=4, batch_timeout=None, checkpoint_path="lender_refresh_checkpoint.jsonl"):
+    """
+    Refresh lenders with a single OpenAI Batch API request for all extraction prompts.
+
+    The lenders are scraped concurrently, their prompts are sent as one batch (half
+    the price of live calls, done within the 24h completion window), then the
+    missing fields of each lender are resolved and saved concurrently.
+
+    Args:
+        lender_rows (list): Lender rows to refresh
+        workers (int): Number of lenders scraped and saved in parallel
+        batch_timeout (int): Seconds to wait for the batch, None for the completion window
+        checkpoint_path (str): Path to the JSONL checkpoint file
+
+    Returns:
+        dict: Run summary with counts and throughput
+    """
+    completed = load_checkpoint(checkpoint_path)
+    pending_rows = [row for row in lender_rows if str(row.get("lender")) not in completed]
+    print(f"🔁 Resuming batch refresh: {len(completed)} lenders already done, {len(pending_rows)} pending")
+
+    statuses = {}
+    total_tokens = 0
+    run_start = time.monotonic()
+
+    def scrape_one(row):
+        try:
+            return scrape_lender(row)
+        except Exception as e:
+            # refresh_lender handles it like a failure of the live run
+            return e
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        prompts = list(executor.map(scrape_one, pending_rows))
+
+    prompted = [index for index, prompt in enumerate(prompts) if isinstance(prompt, str) and prompt]
+    print(f"📦 Submitting {len(prompted)} extraction prompts as one batch")
+    batch_results = {}
+    if prompted:
+        results = get_openai_analyzer().batch_structured_output(
+            [prompts[index] for index in prompted],
+            model=LENDERS_DATA_MODEL,
+            timeout=batch_timeout,
+            system_message=system_message,
+        )
+        batch_results = dict(zip(prompted, results))
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {
+            executor.submit(refresh_lender, row, prompts[index], batch_results.get(index)): str(row.get("lender"))
+            for index, row in enumerate(pending_rows)
+        }
+        for future, lender_name in futures.items():
+            try:
+                result = future.result()
+            except Exception as e:
+                print(f"❌ Refresh failed for {lender_name}: {e}")
+                result = {"lender": lender_name, "status": "failed", "tokens": 0}
+            statuses[lender_name] = result["status"]
+            total_tokens += result.get("tokens", 0)
+            if result["status"] in CHECKPOINT_DONE_STATUSES:
+                append_checkpoint(checkpoint_path, result)
+
+    return summarize_refresh(statuses, total_tokens, run_start)
+
+
+def summarize_refresh(statuses, total_tokens, run_start):
+    """Print and return the counts and throughput of a refresh run"""
+    elapsed_minutes = max(time.monotonic() - run_start, 1e-6) / 60
+    processed = len(statuses)
+    summary = {
+        "processed": processed,
+        "saved": sum(1 for status in statuses.values() if status == "saved"),
+        "skipped": sum(1 for status in statuses.values() if status == "skipped"),
+        "failed": sum(1 for status in statuses.values() if status == "failed"),
+        "timeout": sum(1 for status in statuses.values() if status == "timeout"),
+        "elapsed_minutes": round(elapsed_minutes, 2),
+        "lenders_per_minute": round(processed / elapsed_minutes, 2),
+        "tokens_per_lender": round(total_tokens / processed, 1) if processed else 0,
+    }
+
+    print("📈 Refresh summary:")
+    for key, value in summary.items():
+        print(f"  {key}: {value}")
+    return summary
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Refresh lender data for lenders whose updated_at is empty.")
+    parser.add_argument("--workers", type=int, default=4, help="Number of lenders processed in parallel")
+    parser.add_argument("--timeout", type=int, default=600, help="Seconds a single lender may run")
+    parser.add_argument("--checkpoint", default="lender_refresh_checkpoint.jsonl", help="Checkpoint file of completed lenders")
+    parser.add_argument("--reset", action="store_true", help="Ignore and remove an existing checkpoint")
+    parser.add_argument("--batch", action="store_true", help="Extract through the OpenAI Batch API instead of live calls")
+    parser.add_argument("--batch-timeout", type=int, default=None, help="Seconds to wait for the batch to finish")
+    args = parser.parse_args()
+
+    if args.reset and os.path.exists(args.checkpoint):
+        os.remove(args.checkpoint)
+
+    # Get all rows from the table where data is not updated
+    lender_data = fetch_lenders_with_null_updated_at()
+    print("Total rows fetched:-",len(lender_data))
+
+    if args.batch:
+        run_batch_refresh(lender_data, workers=args.workers, batch_timeout=args.batch_timeout, checkpoint_path=args.checkpoint)
+    else:
+        run_refresh(lender_data, workers=args.workers, lender_timeout=args.timeout, checkpoint_path=args.checkpoint)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Local in-memory stand-in for the Supabase PostgREST API
+
+Point SUPABASE_URL at it to exercise DatabaseService without a Supabase project:
+
+    python -m app.testing.fake_postgrest --port 8090
+    SUPABASE_URL=http://127.0.0.1:8090 SUPABASE_SERVICE_ROLE_KEY=<any JWT shaped string> ...
+
+Supports the subset DatabaseService uses: select with eq/in filters and limit,
+insert, update filtered by eq, and the exec_sql RPC (accepted and ignored). Tables
+are created on first write.
+"""
+
+import json
+import argparse
+import threading
+from urllib.parse import urlparse, parse_qsl
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+tables = {}
+lock = threading.Lock()
+
+# A token shaped like a JWT, accepted by the supabase client
+FAKE_SERVICE_ROLE_KEY = "eyJhbGciOiJIUzI1NiJ9.eyJyb2xlIjoic2VydmljZV9yb2xlIn0.fake"
+
+
+def parse_filters(query: str):
+    """Split a PostgREST query string into column filters and the row limit"""
+    filters = []
+    limit = None
+    for key, value in parse_qsl(query, keep_blank_values=True):
+        if key == "limit":
+            limit = int(value)
+        elif key in ["select", "order", "offset", "on_conflict", "columns"]:
+            continue
+        else:
+            operator, _, operand = value.partition(".")
+            filters.append((key, operator, operand))
+    return filters, limit
+
+
+def matches(row: dict, filters: list) -> bool:
+    for column, operator, operand in filters:
+        value = row.get(column)
+        if operator == "eq" and str(value) != operand:
+            return False
+        if operator == "in" and str(value) not in [item.strip('"') for item in operand.strip("()").split(",")]:
+            return False
+    return True
+
+
+def reset():
+    """Drop every table"""
+    with lock:
+        tables.clear()
+
+
+class PostgrestHandler(BaseHTTPRequestHandler):
+    """Implements the /rest/v1 calls made by DatabaseService"""
+
+    def send_json(self, payload, status: int = 200):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_json(self):
+        length = int(self.headers.get("Content-Length", 0))
+        return json.loads(self.rfile.read(length) or b"null")
+
+    def route(self):
+        parsed = urlparse(self.path)
+        parts = parsed.path.strip("/").split("/")
+        if len(parts) < 3 or parts[:2] != ["rest", "v1"]:
+            return None, parsed.query
+        return "/".join(parts[2:]), parsed.query
+
+    def do_GET(self):
+        table, query = self.route()
+        if table is None:
+            return self.send_json({"message": f"Unknown path {self.path}"}, status=404)
+        filters, limit = parse_filters(query)
+        with lock:
+            rows = [row for row in tables.get(table, []) if matches(row, filters)]
+        self.send_json(rows[:limit] if limit is not None else rows)
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_POST(self):
+        table, _ = self.route()
+        if table is None:
+            return self.send_json({"message": f"Unknown path {self.path}"}, status=404)
+        body = self.read_json()
+        if table.startswith("rpc/"):
+            return self.send_json({"status": "ok"})
+
+        rows = body if isinstance(body, list) else [body]
+        with lock:
+            tables.setdefault(table, []).extend(dict(row) for row in rows)
+        self.send_json(rows, status=201)
+
+    def do_PATCH(self):
+        table, query = self.route()
+        if table is None:
+            return self.send_json({"message": f"Unknown path {self.path}"}, status=404)
+        body = self.read_json() or {}
+        filters, _ = parse_filters(query)
+        updated = []
+        with lock:
+            for row in tables.get(table, []):
+                if matches(row, filters):
+                    row.update(body)
+                    updated.append(dict(row))
+        self.send_json(updated)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start the stand-in server on a background thread and return it (port 0 picks a free port)"""
+    server = ThreadingHTTPServer((host, port), PostgrestHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the Supabase PostgREST API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8090)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), PostgrestHandler)
+    print(f"🧪 PostgREST stand-in listening on http://{args.host}:{args.port}/rest/v1")
+    server.serve_forever()
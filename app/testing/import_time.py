@@ -0,0 +1,89 @@
+"""
+Import-time budget check for the API
+
+Runs `python -X importtime -c "import app.main"` in a fresh interpreter, prints the
+slowest modules and exits non-zero when the total exceeds the budget or a heavy
+library that should only load on demand is imported at startup.
+
+    python -m app.testing.import_time --budget-ms 800
+"""
+
+import os
+import sys
+import argparse
+import subprocess
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+# Libraries that must only be imported on the code path that needs them
+DEFERRED_MODULES = ["pandas", "numpy", "PyPDF2", "bs4", "pytz", "firecrawl", "google.genai", "openai", "supabase", "tiktoken"]
+
+
+def measure_import_time(module: str = "app.main") -> list:
+    """
+    Import `module` in a fresh interpreter and collect its -X importtime report
+
+    Returns:
+        list: (module_name, self_us, cumulative_us) per imported module
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=PROJECT_ROOT,
+        capture_output=True,
+        text=True,
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Importing {module} failed:\n{result.stderr}")
+
+    timings = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        timings.append((name.strip(), int(self_us), int(cumulative_us)))
+    return timings
+
+
+def check_budget(module: str = "app.main", budget_ms: float = 800, runs: int = 3, top: int = 15) -> bool:
+    """Measure the import of `module` over a few runs and report whether it stays within budget"""
+    totals = []
+    for _ in range(runs):
+        timings = measure_import_time(module)
+        totals.append(next(cumulative for name, _, cumulative in timings if name == module) / 1000)
+
+    # The best run is the least noisy estimate of the real cost
+    total_ms = min(totals)
+    print(f"⏱️ import {module}: {total_ms:.0f} ms (best of {runs}, budget {budget_ms:.0f} ms)")
+
+    print(f"\nSlowest {top} modules by cumulative time:")
+    for name, _, cumulative in sorted(timings, key=lambda timing: timing[2], reverse=True)[:top]:
+        print(f"  {cumulative / 1000:8.1f} ms  {name}")
+
+    imported = {name for name, _, _ in timings}
+    eager = [module_name for module_name in DEFERRED_MODULES if module_name in imported]
+
+    passed = True
+    if eager:
+        print(f"\n❌ Heavy modules imported at startup: {', '.join(eager)}")
+        passed = False
+    if total_ms > budget_ms:
+        print(f"\n❌ Import time {total_ms:.0f} ms is over the {budget_ms:.0f} ms budget")
+        passed = False
+    if passed:
+        print("\n✅ Import time within budget")
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check the API import time against a budget")
+    parser.add_argument("--module", default="app.main")
+    parser.add_argument("--budget-ms", type=float, default=float(os.getenv("IMPORT_TIME_BUDGET_MS", "800")))
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    sys.exit(0 if check_budget(args.module, args.budget_ms, args.runs, args.top) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,336 @@
+"""
+Load-test driver for /orbit/sniffer_ai
+
+Replays a CSV or JSONL file of requests against a running deployment, either with a
+fixed number of requests in flight (--concurrency) or at a target arrival rate
+(--rate, requests per second). Reports latency percentiles, error classes and
+throughput, and writes every failed item to a retry file in the input format so it
+can be fed straight back in.
+
+    python -m app.testing.load_test requests.jsonl --concurrency 8
+    python -m app.testing.load_test advisers.csv --template advisorkhoj --rate 0.5 --duration 600
+
+Inputs:
+    JSONL   one SnifferAIRequest payload per line (or {"payload": {...}})
+    CSV     columns named after the payload fields; list fields are JSON arrays or
+            "|" separated, booleans are true/false. With --template advisorkhoj the
+            CSV has profession/location columns instead.
+
+Combine with REPLAY_MODE=replay on the server to load-test without network or API credits.
+"""
+
+import csv
+import json
+import time
+import random
+import argparse
+import threading
+from pathlib import Path
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Optional
+
+import requests
+
+DEFAULT_API_URL = "http://localhost:5000/orbit/sniffer_ai"
+LIST_FIELDS = ["urls", "keywordsToSearch"]
+BOOL_FIELDS = ["googleSearch", "snifferTool", "enableSearch", "enableRefinement", "streamRefinement", "parallelTools"]
+FLOAT_FIELDS = ["toolDeadlineSeconds"]
+
+headers = {
+    "accept": "application/json",
+    "Content-Type": "application/json",
+}
+
+
+########################################## Inputs ##########################################
+def advisorkhoj_payload(row: dict) -> dict:
+    """Payload scraping the advisorkhoj listing of one profession and location"""
+    return {
+        "urls": [f"https://www.advisorkhoj.com/{row['location']}/{row['profession']}?distance=5&experience=1&sortby=Recommended"],
+        "prompt": f"""Scroll the page till the last of the page and extract all the necessary details of the entities
+        present on the page related to the {row['profession']} for location {row['location']}.
+        You can find the data in the class 'relative' or 'row'.
+        """,
+        "googleSearch": False,
+        "snifferTool": True,
+        "enableSearch": False,
+        "enableRefinement": False,
+        "keywordsToSearch": [],
+    }
+
+
+TEMPLATES = {"advisorkhoj": advisorkhoj_payload}
+
+
+def parse_csv_row(row: dict) -> dict:
+    """Payload from a CSV row whose columns are named after the request fields"""
+    payload = {}
+    for field, value in row.items():
+        if field is None or value is None or value.strip() == "":
+            continue
+        value = value.strip()
+        if field in LIST_FIELDS:
+            payload[field] = json.loads(value) if value.startswith("[") else [item.strip() for item in value.split("|") if item.strip()]
+        elif field in BOOL_FIELDS:
+            payload[field] = value.lower() in ("true", "1", "yes")
+        elif field in FLOAT_FIELDS:
+            payload[field] = float(value)
+        else:
+            payload[field] = value
+    return payload
+
+
+def load_items(path: str, template: Optional[str] = None) -> List[dict]:
+    """
+    Read the requests to send
+
+    Returns:
+        list: Items as {"payload": dict, "source": original row or line}
+    """
+    items = []
+    if path.endswith(".jsonl"):
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                payload = record.get("payload", record) if isinstance(record, dict) else record
+                items.append({"payload": TEMPLATES[template](payload) if template else payload, "source": record})
+    elif path.endswith(".csv"):
+        with open(path, "r", encoding="utf-8", newline="") as f:
+            for row in csv.DictReader(f):
+                payload = TEMPLATES[template](row) if template else parse_csv_row(row)
+                items.append({"payload": payload, "source": row})
+    else:
+        raise ValueError(f"Unsupported input file {path}, expected .csv or .jsonl")
+    return items
+
+
+def write_retry_file(path: str, failed: List[dict], input_path: str):
+    """Write the failed items in the input format"""
+    if not failed:
+        return
+    if input_path.endswith(".csv"):
+        fieldnames = list(failed[0]["source"].keys())
+        with open(path, "w", encoding="utf-8", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=fieldnames)
+            writer.writeheader()
+            writer.writerows(item["source"] for item in failed)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            for item in failed:
+                f.write(json.dumps(item["source"], ensure_ascii=False) + "\n")
+
+
+########################################## Requests ##########################################
+def classify_error(status_code: Optional[int], exception: Optional[Exception], body) -> Optional[str]:
+    """Error class of a finished request, None when it succeeded"""
+    if exception is not None:
+        if isinstance(exception, requests.exceptions.Timeout):
+            return "timeout"
+        if isinstance(exception, requests.exceptions.ConnectionError):
+            return "connection"
+        return type(exception).__name__
+    if status_code >= 400:
+        return f"http_{status_code}"
+    if isinstance(body, dict) and body.get("success") is False:
+        return "app_error"
+    return None
+
+
+def send(session: requests.Session, api_url: str, item: dict, timeout: float) -> dict:
+    """Post one item and time it"""
+    started_at = time.monotonic()
+    status_code, exception, body = None, None, None
+    try:
+        response = session.post(api_url, headers=headers, json=item["payload"], timeout=timeout)
+        status_code = response.status_code
+        try:
+            body = response.json()
+        except ValueError:
+            body = response.text[:500]
+    except Exception as e:
+        exception = e
+
+    return {
+        "item": item,
+        "latency": time.monotonic() - started_at,
+        "status_code": status_code,
+        "error": classify_error(status_code, exception, body),
+        "detail": str(exception) if exception else (body if status_code and status_code >= 400 else None),
+    }
+
+
+class LoadTest:
+    """Sends the items and collects one result per request"""
+
+    def __init__(self, api_url: str, timeout: float, verbose: bool = False):
+        self.api_url = api_url
+        self.timeout = timeout
+        self.verbose = verbose
+        self.results: List[dict] = []
+        self.lock = threading.Lock()
+        self.local = threading.local()
+
+    def session(self) -> requests.Session:
+        # One keep-alive session per worker thread
+        if not hasattr(self.local, "session"):
+            self.local.session = requests.Session()
+        return self.local.session
+
+    def run_one(self, item: dict):
+        result = send(self.session(), self.api_url, item, self.timeout)
+        with self.lock:
+            self.results.append(result)
+            done = len(self.results)
+        status = "✅" if result["error"] is None else f"❌ {result['error']}"
+        if self.verbose or result["error"]:
+            print(f"{status} [{done}] {result['latency']:.1f}s {item['payload'].get('urls')}")
+
+    def run_concurrency(self, items: Iterable[dict], concurrency: int):
+        """Closed loop: keep `concurrency` requests in flight until the items run out"""
+        items = iter(items)
+        items_lock = threading.Lock()
+
+        def worker():
+            # Workers pull the next item only when they are free, so time bounded inputs stay lazy
+            while True:
+                with items_lock:
+                    item = next(items, None)
+                if item is None:
+                    return
+                self.run_one(item)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            for _ in range(concurrency):
+                executor.submit(worker)
+
+    def run_rate(self, items: Iterable[dict], rate: float, max_in_flight: int, poisson: bool = True):
+        """Open loop: start requests at `rate` per second whatever the response times"""
+        with ThreadPoolExecutor(max_workers=max_in_flight) as executor:
+            next_at = time.monotonic()
+            for item in items:
+                delay = next_at - time.monotonic()
+                if delay > 0:
+                    time.sleep(delay)
+                executor.submit(self.run_one, item)
+                next_at += random.expovariate(rate) if poisson else 1 / rate
+
+
+def cycle_items(items: List[dict], count: Optional[int], duration: Optional[float]) -> Iterable[dict]:
+    """The items in order, repeated until `count` requests or `duration` seconds are reached"""
+    started_at = time.monotonic()
+    sent = 0
+    while items:
+        for item in items:
+            if count is not None and sent >= count:
+                return
+            if duration is not None and time.monotonic() - started_at >= duration:
+                return
+            yield item
+            sent += 1
+        if count is None and duration is None:
+            return
+
+
+########################################## Report ##########################################
+def percentile(values: List[float], fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(int(round(fraction * (len(ordered) - 1))), len(ordered) - 1)
+    return ordered[index]
+
+
+def build_report(results: List[dict], elapsed: float) -> dict:
+    latencies = [result["latency"] for result in results]
+    succeeded = [result for result in results if result["error"] is None]
+    errors: Dict[str, int] = {}
+    for result in results:
+        if result["error"]:
+            errors[result["error"]] = errors.get(result["error"], 0) + 1
+
+    return {
+        "requests": len(results),
+        "succeeded": len(succeeded),
+        "failed": len(results) - len(succeeded),
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_per_second": round(len(results) / elapsed, 4) if elapsed else 0.0,
+        "successes_per_hour": round(len(succeeded) / elapsed * 3600, 1) if elapsed else 0.0,
+        "latency_seconds": {
+            "mean": round(sum(latencies) / len(latencies), 3) if latencies else 0.0,
+            "p50": round(percentile(latencies, 0.50), 3),
+            "p90": round(percentile(latencies, 0.90), 3),
+            "p95": round(percentile(latencies, 0.95), 3),
+            "p99": round(percentile(latencies, 0.99), 3),
+            "max": round(max(latencies), 3) if latencies else 0.0,
+        },
+        "errors": errors,
+    }
+
+
+def print_report(report: dict):
+    latency = report["latency_seconds"]
+    print("---------------------------------LOAD TEST REPORT---------------------------------")
+    print(f"Requests: {report['requests']} ({report['succeeded']} succeeded, {report['failed']} failed) in {report['elapsed_seconds']}s")
+    print(f"Throughput: {report['throughput_per_second']} req/s, {report['successes_per_hour']} successful scrapes/hour")
+    print(f"Latency: mean {latency['mean']}s, p50 {latency['p50']}s, p90 {latency['p90']}s, "
+          f"p95 {latency['p95']}s, p99 {latency['p99']}s, max {latency['max']}s")
+    for error, count in sorted(report["errors"].items(), key=lambda entry: -entry[1]):
+        print(f"  {error}: {count}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Load-test driver for /orbit/sniffer_ai")
+    parser.add_argument("input", help="CSV or JSONL file of requests")
+    parser.add_argument("--url", default=DEFAULT_API_URL, help="Endpoint to post to")
+    parser.add_argument("--template", choices=sorted(TEMPLATES), help="Build payloads from the rows with a template")
+    mode = parser.add_mutually_exclusive_group()
+    mode.add_argument("--concurrency", type=int, default=1, help="Requests kept in flight (closed loop)")
+    mode.add_argument("--rate", type=float, help="Arrival rate in requests per second (open loop)")
+    parser.add_argument("--max-in-flight", type=int, default=64, help="Cap on concurrent requests with --rate")
+    parser.add_argument("--uniform", action="store_true", help="Evenly spaced arrivals instead of Poisson with --rate")
+    parser.add_argument("--count", type=int, help="Total requests, cycling through the input")
+    parser.add_argument("--duration", type=float, help="Stop starting requests after this many seconds, cycling through the input")
+    parser.add_argument("--skip", type=int, default=0, help="Skip the first N input items")
+    parser.add_argument("--timeout", type=float, default=180, help="Per request timeout in seconds")
+    parser.add_argument("--retry-file", help="Where to write failed items (default <input>.retry<ext>)")
+    parser.add_argument("--report", help="Also write the report as JSON to this path")
+    parser.add_argument("--verbose", action="store_true", help="Print every request, not only failures")
+    args = parser.parse_args()
+
+    items = load_items(args.input, args.template)[args.skip:]
+    if not items:
+        print("⚠️ No requests to send")
+        return
+
+    load_test = LoadTest(args.url, args.timeout, args.verbose)
+    planned = cycle_items(items, args.count, args.duration)
+    pacing = f"at {args.rate} req/s" if args.rate else f"with concurrency {args.concurrency}"
+    print(f"🚀 Load testing {args.url} {pacing} using {len(items)} input item(s)")
+
+    started_at = time.monotonic()
+    if args.rate:
+        load_test.run_rate(planned, args.rate, args.max_in_flight, poisson=not args.uniform)
+    else:
+        load_test.run_concurrency(planned, args.concurrency)
+    elapsed = time.monotonic() - started_at
+
+    report = build_report(load_test.results, elapsed)
+    print_report(report)
+
+    # Items repeat when the input is cycled, retry each one once
+    failed = list({id(result["item"]): result["item"] for result in load_test.results if result["error"]}.values())
+    if failed:
+        input_path = Path(args.input)
+        retry_file = args.retry_file or str(input_path.with_name(f"{input_path.stem}.retry{input_path.suffix}"))
+        write_retry_file(retry_file, failed, args.input)
+        print(f"📝 Wrote {len(failed)} failed item(s) to {retry_file}")
+
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,195 @@
+"""
+Local stand-in for the OpenAI Files and Batches API
+
+Point OPENAI_BASE_URL at it to exercise OpenAIAnalyzer.batch_structured_output
+without network access or API credits:
+
+    python -m app.testing.openai_batch_stub --port 8089
+    OPENAI_BASE_URL=http://127.0.0.1:8089/v1 OPENAI_API_KEY=test ...
+
+Every request in a batch is answered with the smallest JSON object that satisfies
+its response_format schema, so structured parsing works end to end.
+"""
+
+import json
+import time
+import uuid
+import argparse
+import threading
+from email.parser import BytesParser
+from email.policy import default as default_policy
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+files = {}
+batches = {}
+lock = threading.Lock()
+
+
+def sample_from_schema(schema: dict, definitions: dict):
+    """Build the smallest value that satisfies a JSON schema"""
+    if "$ref" in schema:
+        return sample_from_schema(definitions[schema["$ref"].split("/")[-1]], definitions)
+    if "anyOf" in schema:
+        return sample_from_schema(schema["anyOf"][0], definitions)
+
+    schema_type = schema.get("type")
+    if isinstance(schema_type, list):
+        schema_type = schema_type[0]
+
+    if schema_type == "object":
+        return {name: sample_from_schema(prop, definitions) for name, prop in schema.get("properties", {}).items()}
+    if schema_type == "array":
+        return []
+    if schema_type in ["integer", "number"]:
+        return 0
+    if schema_type == "boolean":
+        return False
+    if schema_type == "null":
+        return None
+    return "Not Found"
+
+
+def answer_request(request: dict) -> dict:
+    """Build the batch output line for one input line"""
+    body = request.get("body", {})
+    json_schema = (body.get("response_format") or {}).get("json_schema", {}).get("schema", {})
+    content = sample_from_schema(json_schema, json_schema.get("$defs", {})) if json_schema else {}
+
+    return {
+        "id": f"batch_req_{uuid.uuid4().hex}",
+        "custom_id": request.get("custom_id"),
+        "response": {
+            "status_code": 200,
+            "request_id": uuid.uuid4().hex,
+            "body": {
+                "id": f"chatcmpl-{uuid.uuid4().hex}",
+                "object": "chat.completion",
+                "created": int(time.time()),
+                "model": body.get("model"),
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": json.dumps(content)},
+                    "finish_reason": "stop",
+                }],
+                "usage": {"prompt_tokens": 0, "completion_tokens": 0, "total_tokens": 0},
+            },
+        },
+        "error": None,
+    }
+
+
+def file_object(file_id: str) -> dict:
+    stored = files[file_id]
+    return {
+        "id": file_id,
+        "object": "file",
+        "bytes": len(stored["content"]),
+        "created_at": stored["created_at"],
+        "filename": stored["filename"],
+        "purpose": stored["purpose"],
+        "status": "processed",
+    }
+
+
+class BatchStubHandler(BaseHTTPRequestHandler):
+    """Implements the subset of /v1/files and /v1/batches used by OpenAIAnalyzer"""
+
+    def send_json(self, payload: dict, status: int = 200):
+        data = json.dumps(payload).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def read_body(self) -> bytes:
+        return self.rfile.read(int(self.headers.get("Content-Length", 0)))
+
+    def do_POST(self):
+        if self.path == "/v1/files":
+            return self.upload_file()
+        if self.path == "/v1/batches":
+            return self.create_batch()
+        self.send_json({"error": {"message": f"Unknown path {self.path}"}}, status=404)
+
+    def do_GET(self):
+        parts = self.path.strip("/").split("/")
+        if len(parts) == 3 and parts[1] == "batches" and parts[2] in batches:
+            return self.send_json(batches[parts[2]])
+        if len(parts) == 4 and parts[1] == "files" and parts[3] == "content" and parts[2] in files:
+            content = files[parts[2]]["content"]
+            self.send_response(200)
+            self.send_header("Content-Type", "application/octet-stream")
+            self.send_header("Content-Length", str(len(content)))
+            self.end_headers()
+            self.wfile.write(content)
+            return
+        if len(parts) == 3 and parts[1] == "files" and parts[2] in files:
+            return self.send_json(file_object(parts[2]))
+        self.send_json({"error": {"message": f"Unknown path {self.path}"}}, status=404)
+
+    def upload_file(self):
+        header = f"Content-Type: {self.headers['Content-Type']}\r\n\r\n".encode()
+        message = BytesParser(policy=default_policy).parsebytes(header + self.read_body())
+
+        fields = {}
+        for part in message.iter_parts():
+            name = part.get_param("name", header="content-disposition")
+            fields[name] = (part.get_filename(), part.get_payload(decode=True))
+
+        filename, content = fields.get("file", ("batch.jsonl", b""))
+        purpose = (fields.get("purpose", (None, b"batch"))[1] or b"batch").decode()
+        file_id = f"file-{uuid.uuid4().hex}"
+        with lock:
+            files[file_id] = {"content": content, "filename": filename, "purpose": purpose, "created_at": int(time.time())}
+        self.send_json(file_object(file_id))
+
+    def create_batch(self):
+        request = json.loads(self.read_body() or b"{}")
+        input_file_id = request.get("input_file_id")
+        if input_file_id not in files:
+            return self.send_json({"error": {"message": f"No such file {input_file_id}"}}, status=404)
+
+        lines = [json.loads(line) for line in files[input_file_id]["content"].decode().splitlines() if line.strip()]
+        output = "\n".join(json.dumps(answer_request(line)) for line in lines).encode()
+
+        now = int(time.time())
+        output_file_id = f"file-{uuid.uuid4().hex}"
+        batch_id = f"batch_{uuid.uuid4().hex}"
+        with lock:
+            files[output_file_id] = {"content": output, "filename": "output.jsonl", "purpose": "batch_output", "created_at": now}
+            batches[batch_id] = {
+                "id": batch_id,
+                "object": "batch",
+                "endpoint": request.get("endpoint"),
+                "input_file_id": input_file_id,
+                "completion_window": request.get("completion_window", "24h"),
+                "status": "completed",
+                "output_file_id": output_file_id,
+                "error_file_id": None,
+                "created_at": now,
+                "completed_at": now,
+                "request_counts": {"total": len(lines), "completed": len(lines), "failed": 0},
+            }
+        self.send_json(batches[batch_id])
+
+    def log_message(self, format, *args):
+        pass
+
+
+def start_server(host: str = "127.0.0.1", port: int = 0) -> ThreadingHTTPServer:
+    """Start the stand-in server on a background thread and return it (port 0 picks a free port)"""
+    server = ThreadingHTTPServer((host, port), BatchStubHandler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Local stand-in for the OpenAI Batch API")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8089)
+    args = parser.parse_args()
+
+    server = ThreadingHTTPServer((args.host, args.port), BatchStubHandler)
+    print(f"🧪 OpenAI batch stand-in listening on http://{args.host}:{args.port}/v1")
+    server.serve_forever()
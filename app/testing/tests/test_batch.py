@@ -0,0 +1,53 @@
+"""
+batch_structured_output runs end to end against the local Batch API stand-in
+
+    pytest app/testing/tests
+"""
+
+import tempfile
+
+import pytest
+from openai import OpenAI
+from pydantic import BaseModel
+
+from app.services.llm_services import OpenAIAnalyzer
+from app.testing.openai_batch_stub import start_server
+
+
+class Rate(BaseModel):
+    lender: str
+    roi: float
+    tenure: int
+
+
+@pytest.fixture
+def analyzer():
+    server = start_server()
+    client = OpenAI(base_url=f"http://127.0.0.1:{server.server_address[1]}/v1", api_key="test")
+    yield OpenAIAnalyzer(client=client)
+    server.shutdown()
+    server.server_close()
+
+
+def test_batch_results_follow_prompt_order(analyzer, tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+
+    results = analyzer.batch_structured_output(["first", "second", "third"], model="gpt-4.1-mini",
+                                               response_format=Rate, poll_interval=0.01, timeout=5)
+
+    assert [result["success"] for result in results] == [True, True, True]
+    assert results[0]["data"] == {"lender": "Not Found", "roi": 0, "tenure": 0}
+    # The temporary input file is removed once the batch is submitted
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_batch_input_file_is_removed_when_submission_fails(analyzer, tmp_path, monkeypatch):
+    monkeypatch.setattr(tempfile, "tempdir", str(tmp_path))
+
+    def fail(file_path):
+        raise RuntimeError("upload failed")
+
+    monkeypatch.setattr(analyzer, "submit_batch", fail)
+    with pytest.raises(RuntimeError):
+        analyzer.batch_structured_output(["first"], response_format=Rate)
+    assert list(tmp_path.iterdir()) == []
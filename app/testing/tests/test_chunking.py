@@ -0,0 +1,55 @@
+"""
+Page corpora are de-duplicated, packed into token budgeted chunks and the chunk outputs merged
+
+    pytest app/testing/tests
+"""
+
+from app.services.chunking import build_sections, chunk_sections, count_tokens, merge_extractions
+
+PAGES = {
+    "https://bank.example/home-loan": "Home loans\nInterest rate 8.5% p.a.\nApply now",
+    "https://bank.example/charges": "Home loans\nProcessing fee 0.5% of loan amount\nApply now",
+}
+
+
+def test_sections_drop_lines_seen_on_earlier_pages():
+    assert build_sections(PAGES) == [
+        "Source: https://bank.example/home-loan\nHome loans\nInterest rate 8.5% p.a.\nApply now",
+        "Source: https://bank.example/charges\nProcessing fee 0.5% of loan amount",
+    ]
+    assert build_sections({"https://bank.example/copy": "", **PAGES, "https://bank.example/same": "Apply now"}) == build_sections(PAGES)
+
+
+def test_sections_are_packed_whole_within_the_budget():
+    sections = [f"Source: https://bank.example/{index}\n" + "rate card line " * 20 for index in range(6)]
+    budget = count_tokens(sections[0]) * 2 + 5
+
+    chunks = chunk_sections(sections, max_tokens=budget)
+
+    assert len(chunks) == 3
+    assert "\n\n".join(chunks) == "\n\n".join(sections)
+    assert all(count_tokens(chunk) <= budget for chunk in chunks)
+
+
+def test_oversized_sections_split_on_lines_and_keep_their_source():
+    section = "Source: https://bank.example/rates\n" + "\n".join(f"Rate slab {index}: 8.{index}% p.a." for index in range(60))
+    budget = count_tokens(section) // 4
+
+    chunks = chunk_sections([section], max_tokens=budget)
+
+    assert len(chunks) > 1
+    assert all(chunk.startswith("Source: https://bank.example/rates\n") for chunk in chunks)
+    assert all(count_tokens(chunk) <= budget for chunk in chunks)
+    lines = [line for chunk in chunks for line in chunk.split("\n")[1:]]
+    assert lines == section.split("\n")[1:]
+
+
+def test_merge_keeps_the_first_found_value_and_unions_lists():
+    merged = merge_extractions([
+        {"homeloanroi": "Not Found", "processingfees": "0.5%", "documents": ["PAN"]},
+        {},
+        {"homeloanroi": "8.5%", "processingfees": "1%", "documents": ["PAN", "Aadhaar"]},
+        {"homeloanroi": "9%", "lapltv": None},
+    ])
+
+    assert merged == {"homeloanroi": "8.5%", "processingfees": "0.5%", "documents": ["PAN", "Aadhaar"], "lapltv": None}
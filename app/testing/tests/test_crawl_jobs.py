@@ -0,0 +1,114 @@
+"""
+Crawl job offsets only move past processed pages, so a resumed job loses none
+
+    pytest app/testing/tests
+"""
+
+import threading
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.endpoints import crawl_jobs
+from app.config.settings import settings
+from app.services.crawl_jobs import CrawlJobManager, CrawlJobStore
+
+DOCUMENTS = [{"markdown": f"page {index}", "metadata": {"sourceURL": f"https://lender.example/p{index}"}} for index in range(6)]
+
+
+class FakeCrawler:
+    """Completed crawl served two documents per status page"""
+
+    def __init__(self):
+        self.webhooks = []
+
+    def start_crawl(self, url, webhook=None, **kwargs):
+        self.webhooks.append(webhook)
+        return {"success": True, "id": "crawl-1"}
+
+    def crawl_status_page(self, crawl_id, skip=0):
+        return {"status": "completed", "total": len(DOCUMENTS), "data": DOCUMENTS[skip:skip + 2], "next": skip + 2 < len(DOCUMENTS)}
+
+    def cancel_crawl(self, crawl_id):
+        pass
+
+
+@pytest.fixture
+def manager(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "CRAWL_POLL_MIN_SECONDS", 0.01)
+    monkeypatch.setattr(settings, "CRAWL_POLL_MAX_SECONDS", 0.05)
+    return CrawlJobManager(crawler=FakeCrawler(), store=CrawlJobStore(str(tmp_path)))
+
+
+def test_skip_waits_for_unfinished_pages(manager):
+    release = threading.Event()
+    later_pages_done = threading.Event()
+    processed = []
+
+    def on_page(page):
+        if page["url"].endswith("/p1"):
+            release.wait(5)
+        processed.append(page["url"])
+        if len(processed) == len(DOCUMENTS) - 1:
+            later_pages_done.set()
+
+    job = manager.start("https://lender.example", on_page)
+    assert later_pages_done.wait(5)
+    # Every page but p1 is processed, the saved offset still stops at p1
+    assert manager.store.load(job["job_id"])["skip"] == 1
+
+    release.set()
+    state = manager.wait(job["job_id"], timeout=5)
+    assert state["skip"] == len(DOCUMENTS)
+    assert state["pages_processed"] == len(DOCUMENTS)
+
+
+def test_kind_callbacks_are_rebuilt_on_resume(manager):
+    pages = []
+
+    def callbacks(state):
+        return pages.append, lambda state: {"pages": len(pages), "params": state["params"]}
+
+    manager.register("test", callbacks)
+    state = {
+        "job_id": "job-1", "crawl_id": "crawl-1", "url": "https://lender.example", "kind": "test", "params": {"a": 1},
+        "mode": "poll", "status": "scraping", "skip": 4, "pages_received": 4, "pages_processed": 4, "pages_failed": 0,
+        "total": None, "error": None, "created_at": "", "updated_at": "",
+    }
+    manager.store.save(state)
+
+    assert [resumed["job_id"] for resumed in manager.resume_all()] == ["job-1"]
+    finished = manager.wait("job-1", timeout=5)
+    assert [page["url"] for page in pages] == ["https://lender.example/p4", "https://lender.example/p5"]
+    assert finished["result"] == {"pages": 2, "params": {"a": 1}}
+    assert finished["skip"] == len(DOCUMENTS)
+
+
+def test_webhook_mode_needs_a_token(manager, monkeypatch):
+    monkeypatch.setattr(settings, "FIRECRAWL_WEBHOOK_URL", "https://orbit.example/orbit/crawl_jobs/webhook")
+    monkeypatch.setattr(settings, "FIRECRAWL_WEBHOOK_TOKEN", None)
+    assert manager.start("https://lender.example", lambda page: None)["mode"] == "poll"
+
+    monkeypatch.setattr(settings, "FIRECRAWL_WEBHOOK_TOKEN", "secret")
+    assert manager.start("https://lender.example", lambda page: None)["mode"] == "webhook"
+    assert manager.crawler.webhooks[-1]["headers"] == {"X-Webhook-Token": "secret"}
+
+
+@pytest.mark.parametrize("configured, sent, status_code", [
+    (None, None, 401),
+    (None, "anything", 401),
+    ("secret", None, 401),
+    ("secret", "wrong", 401),
+    ("secret", "secret", 200),
+])
+def test_webhook_receiver_only_accepts_the_configured_token(monkeypatch, configured, sent, status_code):
+    monkeypatch.setattr(settings, "FIRECRAWL_WEBHOOK_TOKEN", configured)
+    monkeypatch.setattr(crawl_jobs.crawl_job_manager, "handle_webhook", lambda payload: True)
+    app = FastAPI()
+    app.include_router(crawl_jobs.router)
+
+    response = TestClient(app).post("/crawl_jobs/webhook", json={"type": "crawl.page", "metadata": {"job_id": "job-1"}},
+                                    headers={"X-Webhook-Token": sent} if sent else {})
+
+    assert response.status_code == status_code
@@ -0,0 +1,89 @@
+"""
+The fetch router keeps static pages local and escalates JavaScript shells to Firecrawl
+
+    pytest app/testing/tests
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from app.services import fetch_router
+from app.services.fetch_router import FIRECRAWL, LOCAL, detect_js_shell, route_table, route_urls
+
+ARTICLE = "<p>Star Fuels is an authorised fuel dealer on MG Road, open all week.</p>" * 40
+STATIC_PAGE = f"<html><body>{ARTICLE}</body></html>"
+SPA_SHELL = "<html><body><div id=\"__next\"></div><p>Loading the dealer locator, please wait a moment while we fetch the latest list of outlets near you.</p>" \
+            + "<p>Star Fuels dealer network covers every district in the state.</p>" * 3 + "<script src=\"/app.js\"></script></body></html>"
+NOSCRIPT_SHELL = "<html><body><noscript>Please enable JavaScript to view this site.</noscript>" \
+                 + "<p>Star Fuels dealer network covers every district in the state, with outlets open all week.</p>" * 3 + "</body></html>"
+
+
+class CannedPage:
+    def __init__(self, html: str, status_code: int = 200):
+        self.status_code = status_code
+        self.headers = {"content-type": "text/html"}
+        self.text = html
+        self.content = html.encode()
+
+    def raise_for_status(self):
+        pass
+
+
+@pytest.fixture
+def web(monkeypatch):
+    """Canned pages by url, a page given as an int fails with that status code"""
+    pages, fetched = {}, []
+
+    def fetch(url):
+        fetched.append(url)
+        if isinstance(pages[url], int):
+            error = Exception(f"{pages[url]} error")
+            error.response = SimpleNamespace(status_code=pages[url])
+            raise error
+        return CannedPage(pages[url])
+
+    monkeypatch.setattr(fetch_router, "make_request_with_retry", fetch)
+    route_table.clear()
+    yield SimpleNamespace(pages=pages, fetched=fetched)
+    route_table.clear()
+
+
+@pytest.mark.parametrize("html, text, reason", [
+    (STATIC_PAGE, ARTICLE, None),
+    ("<html><body></body></html>", "", "empty"),
+    (SPA_SHELL, "Loading the dealer locator " * 12, "spa_root"),
+    (NOSCRIPT_SHELL, "Star Fuels dealer network " * 12, "noscript"),
+    ("<html>" + "<div class=\"x\"></div>" * 1000 + "<p>" + "a" * 300 + "</p></html>", "a" * 300, "text_ratio"),
+])
+def test_detect_js_shell(html, text, reason):
+    assert detect_js_shell(html, text) == reason
+
+
+def test_shells_are_escalated_and_their_domain_remembered(web):
+    web.pages["https://dealers.example/star"] = STATIC_PAGE
+    web.pages["https://app.dealers.example/locator"] = SPA_SHELL
+    web.pages["https://app.dealers.example/contact"] = STATIC_PAGE
+
+    routed = route_urls(["https://dealers.example/star", "https://app.dealers.example/locator"])
+
+    assert list(routed["pages"]) == ["https://dealers.example/star"]
+    assert routed["escalate"] == ["https://app.dealers.example/locator"]
+    assert routed["decisions"]["https://app.dealers.example/locator"] == {"tier": FIRECRAWL, "reason": "spa_root"}
+
+    # Later pages of the shell's domain go straight to Firecrawl without a local fetch
+    routed = route_urls(["https://app.dealers.example/contact"])
+    assert routed["escalate"] == ["https://app.dealers.example/contact"]
+    assert routed["decisions"]["https://app.dealers.example/contact"]["reason"] == "domain_route"
+    assert "https://app.dealers.example/contact" not in web.fetched
+    assert route_table.snapshot()["dealers.example"]["tier"] == LOCAL
+
+
+def test_blocked_pages_escalate_but_one_off_errors_do_not_route_the_domain(web):
+    web.pages["https://blocked.example/"] = 403
+    web.pages["https://flaky.example/"] = 500
+
+    routed = route_urls(["https://blocked.example/", "https://flaky.example/"])
+
+    assert routed["escalate"] == ["https://blocked.example/", "https://flaky.example/"]
+    assert route_table.snapshot() == {"blocked.example": {"tier": FIRECRAWL, "reason": "blocked"}}
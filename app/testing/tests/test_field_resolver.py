@@ -0,0 +1,30 @@
+"""
+Missing lender fields are searched in groups through the shared OpenAI limiter
+
+    pytest app/testing/tests
+"""
+
+import json
+
+from app.services.field_resolver import resolve_missing_fields
+from app.utils import rate_limiter
+from app.utils.rate_limiter import get_provider_limiter
+
+ANSWERS = {"homeloanroi": "8.5%", "laproi": "9.75%", "processingfees": "0.5%"}
+
+
+def test_searches_share_the_openai_budget_in_their_own_lane(monkeypatch):
+    monkeypatch.setattr(rate_limiter, "_provider_limiters", {})
+    prompts = []
+
+    def search(system_message, prompt):
+        prompts.append(prompt)
+        found = {key: value for key, value in ANSWERS.items() if key in prompt}
+        return f"```json\n{json.dumps(found)}\n```"
+
+    resolved = resolve_missing_fields("Star Bank", ["homeloanroi", "laproi", "processingfees", "mitc"], search)
+
+    assert resolved == {**ANSWERS, "mitc": "Not Found"}
+    assert len(prompts) == 1
+    assert list(rate_limiter._provider_limiters) == ["openai"]
+    assert list(get_provider_limiter("openai").lanes) == ["search"]
@@ -0,0 +1,56 @@
+"""
+Pattern pre-extraction of lender rate fields from crawled page text
+
+    pytest app/testing/tests
+"""
+
+from app.services.pre_extractors import pre_extract, scan_text
+
+HOME_LOAN_PAGE = "\n".join([
+    "Home loan interest rate: 8.50% - 9.20% p.a. for salaried borrowers",
+    "Loan against property rate of interest 9.75% p.a.",
+    "Get up to 90% LTV on your dream home loan",
+    "Processing fee: 0.50% of loan amount + GST",
+    "Minimum credit score of 750 and above",
+    "Repayment tenure of up to 30 years",
+    "Call our toll free customer care 1800 209 1234",
+])
+
+
+def candidate_values(text: str) -> dict:
+    return {candidate["field"]: candidate["value"] for candidate in scan_text(text, "https://bank.example/home-loan")}
+
+
+def test_scan_reads_every_field_from_its_own_line():
+    values = candidate_values(HOME_LOAN_PAGE)
+
+    assert values == {
+        "homeloanroi": "8.5% - 9.2%",
+        "laproi": "9.75%",
+        "homeloanltv": "Up to 90%",
+        "processingfees": "0.50% of loan amount + GST",
+        "minimumcreditscore": "750",
+        "loantenurerange": "Up to 30 years",
+        "customersupportcontactnumbers": "18002091234",
+    }
+
+
+def test_penalty_and_out_of_range_values_are_ignored():
+    values = candidate_values("\n".join([
+        "Penal interest rate of 2% per month on overdue amounts",
+        "Savings account interest rate 3.5% p.a.",
+        "Credit score 450 applicants are not eligible",
+    ]))
+
+    assert values == {}
+
+
+def test_values_repeated_across_pages_pass_the_confidence_threshold():
+    line = "Home loan interest rate starting at 8.75% p.a."
+
+    single, _ = pre_extract({"https://bank.example/a": line}, min_confidence=0.8)
+    repeated, best = pre_extract({"https://bank.example/a": line, "https://bank.example/b": line}, min_confidence=0.8)
+
+    assert single == {}
+    assert repeated == {"homeloanroi": "8.75%"}
+    assert best["homeloanroi"]["urls"] == ["https://bank.example/a", "https://bank.example/b"]
@@ -0,0 +1,44 @@
+"""
+Every lenders_data_prompt is built through get_lenders_data_prompt, and builds
+
+    pytest app/testing/tests
+"""
+
+import ast
+from pathlib import Path
+
+import pytest
+
+from app.models.schemas import LendersExtractSchema
+from app.utils import prompts
+from app.utils.prompts import get_lenders_data_prompt, get_lenders_data_keys
+
+APP_DIR = Path(__file__).resolve().parents[2]
+
+
+def test_lenders_data_prompt_is_only_formatted_by_its_builder():
+    # A direct .format() misses placeholders added to the template later (e.g. {keys})
+    offenders = []
+    for path in APP_DIR.rglob("*.py"):
+        tree = ast.parse(path.read_text(encoding="utf-8"))
+        for node in ast.walk(tree):
+            names = [alias.name for alias in node.names] if isinstance(node, ast.ImportFrom) else []
+            if "lenders_data_prompt" in names or (isinstance(node, ast.Name) and node.id == "lenders_data_prompt"):
+                offenders.append(f"{path.relative_to(APP_DIR)}:{node.lineno}")
+    prompts_file = f"{Path(prompts.__file__).relative_to(APP_DIR)}"
+    assert [offender for offender in offenders if not offender.startswith(prompts_file + ":")] == []
+
+
+@pytest.mark.parametrize("fields", [None, list(LendersExtractSchema.model_fields), ["homeloanroi", "lapltv"]])
+def test_lenders_data_prompt_formats(fields):
+    prompt = get_lenders_data_prompt("Sample HFC", "ROI {8.5%} p.a.", fields)
+    assert "Sample HFC" in prompt
+    assert "ROI (8.5%) p.a." in prompt
+    assert get_lenders_data_keys(fields) in prompt
+    assert "{" not in prompt
+
+
+def test_lenders_data_keys_follow_the_requested_fields():
+    keys = get_lenders_data_keys(["homeloanroi", "lapltv"])
+    assert keys.splitlines() == ['  "homeloan_roi": "values in %age",', '  "lap_ltv": "values in %age",']
+    assert len(get_lenders_data_keys().splitlines()) == len(prompts.lenders_data_keys.splitlines())
@@ -0,0 +1,121 @@
+"""
+Token budgets, Retry-After backoff and circuit breaking of the shared provider limiter
+
+    pytest app/testing/tests
+"""
+
+from types import SimpleNamespace
+
+import pytest
+
+from app.utils import rate_limiter
+from app.utils.rate_limiter import CircuitOpenError, ProviderLimiter, TokenBucket
+
+
+class ApiError(Exception):
+    def __init__(self, status_code, headers=None):
+        super().__init__(f"status code {status_code}")
+        self.response = SimpleNamespace(status_code=status_code, headers=headers or {})
+
+
+class FakeClock:
+    """Monotonic time that only moves when the limiter sleeps"""
+
+    def __init__(self):
+        self.now = 1000.0
+        self.sleeps = []
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.sleeps.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(rate_limiter.time, "monotonic", clock.monotonic)
+    monkeypatch.setattr(rate_limiter.time, "sleep", clock.sleep)
+    return clock
+
+
+def failing(*errors):
+    """Callable raising `errors` in turn, then returning "ok"; counts its calls"""
+    calls = []
+
+    def call():
+        calls.append(1)
+        if len(calls) <= len(errors):
+            raise errors[len(calls) - 1]
+        return "ok"
+
+    call.calls = calls
+    return call
+
+
+def test_token_bucket_waits_for_the_refill_once_empty(clock):
+    bucket = TokenBucket(60)
+    for _ in range(60):
+        bucket.acquire()
+    assert clock.sleeps == []
+
+    bucket.acquire()
+    assert sum(clock.sleeps) == pytest.approx(1.0)
+
+
+def test_token_bucket_adjust_gives_back_unused_tokens(clock):
+    bucket = TokenBucket(1000)
+    bucket.acquire(800)
+    bucket.adjust(-500)
+
+    bucket.acquire(600)
+    assert clock.sleeps == []
+
+
+def test_retry_after_sets_the_backoff_and_slows_the_provider(clock):
+    limiter = ProviderLimiter("test", 600, max_retries=2, max_delay=60)
+    call = failing(ApiError(429, {"retry-after": "7"}))
+
+    assert limiter.run(call) == "ok"
+    assert len(call.calls) == 2
+    assert 7 in clock.sleeps
+    # Halved by the 429, then nudged back up by the successful retry
+    assert limiter.rate_scale == pytest.approx(0.5 * 1.1)
+
+
+def test_client_errors_are_not_retried(clock):
+    limiter = ProviderLimiter("test", 600, max_retries=3)
+    call = failing(ApiError(400))
+
+    with pytest.raises(ApiError):
+        limiter.run(call)
+    assert len(call.calls) == 1
+
+
+def test_circuit_opens_after_repeated_failures_and_probes_after_the_cool_down(clock):
+    limiter = ProviderLimiter("test", 600, max_retries=0, failure_threshold=2, reset_timeout=30)
+    call = failing(ApiError(503), ApiError(503))
+
+    for _ in range(2):
+        with pytest.raises(ApiError):
+            limiter.run(call)
+    with pytest.raises(CircuitOpenError):
+        limiter.run(call)
+    assert len(call.calls) == 2
+
+    clock.now += 30
+    assert limiter.run(call) == "ok"
+    assert limiter.run(call) == "ok"
+
+
+def test_an_open_lane_does_not_block_the_other_keys(clock):
+    limiter = ProviderLimiter("http", 600, max_retries=0, failure_threshold=1, reset_timeout=30,
+                              key_requests_per_minute=60)
+
+    with pytest.raises(ApiError):
+        limiter.run(failing(ApiError(502)), key="dead.example")
+    with pytest.raises(CircuitOpenError):
+        limiter.run(failing(), key="dead.example")
+    assert limiter.run(failing(), key="alive.example") == "ok"
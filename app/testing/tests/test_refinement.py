@@ -0,0 +1,76 @@
+"""
+Local refinement rules normalize scraped records and leave only unparsed fields to the LLM
+
+    pytest app/testing/tests
+"""
+
+from typing import List, Optional
+
+from pydantic import BaseModel
+
+from app.services.refinement import refine_records, refine_records_with_fallback
+
+
+class Lender(BaseModel):
+    lender: str
+    homeloanroi: str
+    minimumcreditscore: Optional[str] = None
+    max_amount: Optional[float] = None
+    tenure_years: Optional[int] = None
+    phone: Optional[str] = None
+    pincode: Optional[str] = None
+    email: Optional[str] = None
+    salaried: Optional[bool] = None
+    documents: Optional[List[str]] = None
+
+
+class FakeAnalyzer:
+    def __init__(self, output):
+        self.output = output
+        self.prompts = []
+
+    def structured_output(self, prompt, response_format=None, model=None):
+        self.prompts.append(prompt)
+        return {"success": True, "data": {"output": self.output}}
+
+
+def test_rules_normalize_numbers_contacts_and_lists():
+    records = [{
+        "lender": " Star Bank. ", "homeloanroi": "8.50% - 9.20% p.a.", "minimumcreditscore": "700+",
+        "max_amount": "Rs. 5 crore", "tenure_years": "360 months", "phone": "Call +91 98450-12345 or 080 2222 3333",
+        "pincode": "560 001", "email": "Loans@StarBank.example", "salaried": "Yes",
+        "documents": "PAN; Aadhaar; pan ; Salary slips",
+    }]
+
+    refined, needs_llm = refine_records(records, Lender)
+
+    assert refined == [{
+        "lender": "Star Bank", "homeloanroi": "8.5 - 9.2", "minimumcreditscore": "700", "max_amount": 50000000.0,
+        "tenure_years": 30, "phone": "919845012345, 08022223333", "pincode": "560001",
+        "email": "loans@starbank.example", "salaried": True, "documents": ["PAN", "Aadhaar", "Salary slips"],
+    }]
+    assert needs_llm == {}
+
+
+def test_unparsed_cells_are_kept_and_flagged_for_the_llm():
+    records = [{"lender": "Moon Bank", "homeloanroi": "linked to repo rate", "max_amount": "as per eligibility"}]
+
+    refined, needs_llm = refine_records(records, Lender)
+
+    assert refined[0]["homeloanroi"] == "linked to repo rate"
+    assert refined[0]["max_amount"] is None
+    assert needs_llm == {0: ["homeloanroi", "max_amount"]}
+
+
+def test_fallback_sends_only_the_flagged_fields_to_the_llm():
+    records = [
+        {"lender": "Star Bank", "homeloanroi": "8.5%"},
+        {"lender": "Moon Bank", "homeloanroi": "linked to repo rate"},
+    ]
+    analyzer = FakeAnalyzer([{"record_index": 1, "homeloanroi": "8.75"}])
+
+    refined = refine_records_with_fallback(records, Lender, analyzer)
+
+    assert [record["homeloanroi"] for record in refined] == ["8.5", "8.75"]
+    assert len(analyzer.prompts) == 1
+    assert "Star Bank" not in analyzer.prompts[0]
@@ -0,0 +1,83 @@
+"""
+Relevance filter keeps the labelled rate facts of a lender site and chunks them for the workers
+
+    pytest app/testing/tests
+"""
+
+from app.config.settings import settings
+from app.services.chunking import build_sections, chunk_sections
+from app.services.relevance import filter_extracted_data, split_passages
+from app.services.sniffer_services import extraction_chunk_tokens
+
+KEYWORDS = ["interest", "roi", "ltv", "home", "credit score", "eligibility", "property", "salaried"]
+
+# Lines a lender extraction needs, labelled by hand
+RELEVANT = {
+    "https://bank.example/home-loan": [
+        "Home loan interest rate (ROI) starts at 8.50% p.a. for salaried applicants",
+        "LTV up to 90% of the property value for loans up to 30 lakh",
+    ],
+    "https://bank.example/eligibility": [
+        "Eligibility: salaried and self employed borrowers aged 21 to 65",
+        "Minimum credit score of 700 is required for a home loan",
+    ],
+    "https://bank.example/charges": [
+        "Processing fee on home loan: 0.5% of the loan amount, property valuation charged at actuals",
+    ],
+}
+NOISE = [
+    "Open a savings account in minutes with our mobile app",
+    "Download the app on the App Store and Google Play",
+    "Follow us on social media for the latest updates",
+    "Careers | Investor relations | Press releases | Sitemap",
+    "Copyright 2026 Bank Example Limited, all rights reserved",
+    "Find the nearest branch or ATM with our locator",
+]
+
+
+def labelled_pages(noise_lines: int = 40) -> dict:
+    """Each page buries its labelled lines in navigation and marketing noise"""
+    pages = {}
+    for url, lines in RELEVANT.items():
+        noise = [f"{NOISE[index % len(NOISE)]} ({url.rsplit('/', 1)[-1]} {index})" for index in range(noise_lines)]
+        middle = len(noise) // 2
+        pages[url] = "\n".join(noise[:middle] + lines + noise[middle:])
+    return pages
+
+
+def test_filter_keeps_every_labelled_line_within_the_budget():
+    pages = labelled_pages()
+
+    filtered = filter_extracted_data(pages, KEYWORDS, token_budget=500)
+
+    labelled = [(url, line) for url, lines in RELEVANT.items() for line in lines]
+    recalled = [(url, line) for url, line in labelled if line in filtered.get(url, "")]
+    assert len(recalled) / len(labelled) == 1.0
+    assert sum(len(text) for text in filtered.values()) < sum(len(text) for text in pages.values()) / 3
+
+
+def test_filter_keeps_the_text_when_nothing_matches():
+    pages = {"https://bank.example/about": "\n".join(NOISE)}
+
+    assert filter_extracted_data(pages, ["mortgage"]) == pages
+
+
+def test_split_passages_bounds_the_words_per_passage():
+    text = "\n".join(f"line {index} of the rate card" for index in range(20))
+
+    passages = split_passages(text, max_words=14)
+
+    assert all(len(passage.split()) <= 14 for passage in passages)
+    assert "\n".join(passages).split("\n") == text.split("\n")
+
+
+def test_filtered_corpus_is_spread_over_the_extraction_workers(monkeypatch):
+    monkeypatch.setattr(settings, "RELEVANCE_TOKEN_BUDGET", 400)
+    monkeypatch.setattr(settings, "EXTRACTION_MAX_WORKERS", 4)
+    pages = labelled_pages(noise_lines=400)
+
+    filtered = filter_extracted_data(pages, KEYWORDS)
+    chunks = chunk_sections(build_sections(filtered), max_tokens=extraction_chunk_tokens())
+
+    assert extraction_chunk_tokens() == 100
+    assert len(chunks) > 1
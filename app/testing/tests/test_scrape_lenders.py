@@ -0,0 +1,57 @@
+"""
+/scrape_lenders falls back to parsing the free-text search answer with OpenAI
+
+    pytest app/testing/tests
+"""
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.endpoints import scrape_lenders
+from app.services.gemini_service import get_gemini_service
+from app.services.llm_services import get_openai_analyzer
+
+SEARCH_ANSWER = "Star Bank home loans: 8.5% - 9.2% interest, up to 80% LTV, credit score 700, ..."
+PARSED = {"lender": "Star Bank", "interest_rate_range": "8.5% - 9.2%", "loan_to_value": "80%",
+          "minimum_credit_score": 700, "loan_amount_range": "5 lakh - 5 crore", "loan_tenure_range": "30 years",
+          "approval_time": "7 days", "processing_fee": "0.5%", "special_offers": "None"}
+
+
+class FakeGemini:
+    def generate_structured_search_response(self, prompt, model=None, response_format=None):
+        return {"success": False, "data": None, "response": SEARCH_ANSWER}
+
+
+class FakeAnalyzer:
+    def __init__(self):
+        self.prompts = []
+
+    def get_structured_response(self, system_message, prompt, model=None, response_format=None):
+        self.prompts.append(prompt)
+        return {"success": True, "data": dict(PARSED), "error": None}
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.saved = []
+
+    def save_unique_data(self, data, table_name, primary_key, update_if_exists=True):
+        self.saved.append(data)
+        return {"status": "inserted", "message": "1 row"}
+
+
+def test_unvalidated_search_answer_is_parsed_by_the_fallback(monkeypatch):
+    analyzer, database = FakeAnalyzer(), FakeDatabase()
+    monkeypatch.setattr(scrape_lenders, "database_service", database)
+    app = FastAPI()
+    app.include_router(scrape_lenders.router)
+    app.dependency_overrides[get_openai_analyzer] = lambda: analyzer
+    app.dependency_overrides[get_gemini_service] = lambda: FakeGemini()
+
+    response = TestClient(app).post("/scrape_lenders", json={"entity": "Star Bank", "prompt": "Home loan rates"})
+
+    assert response.status_code == 200, response.text
+    assert analyzer.prompts == [SEARCH_ANSWER]
+    assert database.saved[0]["lender"] == "Star Bank"
+    assert database.saved[0]["ROI (Rate of Interest)"] == "8.5% - 9.2%"
+    assert database.saved[0]["Minimum Credit Score"] == 700
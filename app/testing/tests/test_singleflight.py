@@ -0,0 +1,64 @@
+"""
+Cross-process single flight shares one result and leaves no files behind
+
+    pytest app/testing/tests
+"""
+
+import os
+import time
+import threading
+
+import pytest
+
+from app.config.settings import settings
+from app.services import singleflight
+from app.services.singleflight import FileLock, sweep
+
+
+@pytest.fixture
+def flight_dir(tmp_path, monkeypatch):
+    monkeypatch.setattr(settings, "SINGLEFLIGHT_DIR", str(tmp_path))
+    monkeypatch.setattr(settings, "SINGLEFLIGHT_WAIT_SECONDS", 5)
+    monkeypatch.setattr(singleflight, "_swept_at", {})
+    return tmp_path
+
+
+def test_waiter_gets_the_leader_result_and_the_lock_file_is_removed(flight_dir):
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+
+    def compute():
+        calls.append(1)
+        started.set()
+        release.wait(5)
+        return {"records": len(calls)}
+
+    # flock locks belong to the open file, so two FileLocks contend like two workers
+    results = []
+    leader = threading.Thread(target=lambda: results.append(FileLock("sniffer", "key").run(compute)))
+    leader.start()
+    assert started.wait(5)
+    waiter = threading.Thread(target=lambda: results.append(FileLock("sniffer", "key").run(compute)))
+    waiter.start()
+    time.sleep(0.3)
+    release.set()
+    leader.join(5)
+    waiter.join(5)
+
+    assert results == [{"records": 1}, {"records": 1}]
+    assert len(calls) == 1
+    assert not os.path.exists(flight_dir / "sniffer" / "key.lock")
+
+
+def test_expired_results_and_lock_files_are_swept(flight_dir):
+    directory = flight_dir / "sniffer"
+    directory.mkdir()
+    expired = time.time() - settings.SINGLEFLIGHT_WAIT_SECONDS - 1
+    for name in ["old.json", "old.lock", "new.json"]:
+        (directory / name).write_text("{}")
+    for name in ["old.json", "old.lock"]:
+        os.utime(directory / name, (expired, expired))
+
+    sweep(str(directory))
+    assert sorted(os.listdir(directory)) == ["new.json"]
@@ -0,0 +1,149 @@
+"""
+/sniffer_ai end to end on canned pages, LLM, Firecrawl and database
+
+    pytest app/testing/tests
+"""
+
+from types import SimpleNamespace
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.api.endpoints import sniffer
+from app.services import fetch_router
+from app.services.llm_services import get_openai_analyzer
+
+USE_CASES = {"use_cases": {"iocl": {
+    "keywords": ["dealer"], "output_format": "IOCLExtractSchema", "table_name": "dealers", "unique_key": "phone",
+}}}
+
+STAR_FUELS = {"name": "Star Fuels", "phone": "+91 98450 12345", "email": "star@fuel.example", "city": "Bengaluru",
+              "address": "12 MG Road, Bengaluru"}
+JSON_LD_PAGE = """<html><head><script type="application/ld+json">{"@context": "https://schema.org",
+"@type": "LocalBusiness", "name": "Star Fuels", "telephone": "+91 98450 12345", "email": "star@fuel.example",
+"address": {"@type": "PostalAddress", "streetAddress": "12 MG Road", "addressLocality": "Bengaluru"}}</script>
+</head><body>""" + "<p>Star Fuels is an authorised fuel dealer on MG Road.</p>" * 60 + "</body></html>"
+PLAIN_PAGE = "<html><body>" + "<p>Moon Petro dealer outlet, open all week for fuel and service.</p>" * 60 + "</body></html>"
+JS_SHELL = "<html><body><div id=\"root\"></div><script src=\"/app.js\"></script></body></html>"
+
+
+class CannedPage:
+    def __init__(self, html: str):
+        self.status_code = 200
+        self.headers = {"content-type": "text/html"}
+        self.text = html
+        self.content = html.encode()
+
+    def raise_for_status(self):
+        pass
+
+
+class FakeAnalyzer:
+    """Classifies every request as the iocl use case and extracts `records` from local pages"""
+
+    def __init__(self, records=None):
+        self.records = records or []
+        self.extractions = 0
+
+    def analyze_context(self, model=None, messages=None, response_format=None):
+        return {"success": True, "data": {"entity": "dealer", "keyword": "iocl"}}
+
+    def get_structured_response(self, system_message, prompt, model=None, response_format=None):
+        self.extractions += 1
+        return {"success": True, "data": {"output": self.records}}
+
+
+class FakeFirecrawl:
+    def __init__(self, records=None):
+        self.records = records or []
+        self.urls = []
+
+    def extract_data(self, urls, prompt=None, schema=None):
+        self.urls.extend(urls)
+        return {"success": True, "data": {"output": self.records}}
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.saved = []
+
+    def check_table_exists(self, table_name):
+        return True
+
+    def save_batch_unique_data(self, records, table_name, update_if_exists=True):
+        self.saved.extend(records)
+        return {"inserted": len(records), "updated": 0}
+
+
+@pytest.fixture
+def pipeline(monkeypatch):
+    """Sniffer router with canned web pages, LLM, Firecrawl and database"""
+    pages = {}
+    database, analyzer, firecrawl = FakeDatabase(), FakeAnalyzer(), FakeFirecrawl()
+    monkeypatch.setattr(sniffer, "read_config", lambda: USE_CASES)
+    monkeypatch.setattr(sniffer, "database_service", database)
+    monkeypatch.setattr(sniffer, "firecrawler", firecrawl)
+    monkeypatch.setattr(fetch_router, "make_request_with_retry", lambda url: CannedPage(pages[url]))
+    fetch_router.route_table.clear()
+
+    app = FastAPI()
+    app.include_router(sniffer.router)
+    app.dependency_overrides[get_openai_analyzer] = lambda: analyzer
+
+    yield SimpleNamespace(client=TestClient(app), pages=pages, database=database, analyzer=analyzer, firecrawl=firecrawl)
+    fetch_router.route_table.clear()
+
+
+def test_structured_fast_path_saves_the_mapped_records(pipeline):
+    pipeline.pages["https://dealers.example/star"] = JSON_LD_PAGE
+
+    response = pipeline.client.post("/sniffer_ai", json={
+        "urls": ["https://dealers.example/star"], "prompt": "Dealer details", "snifferTool": True, "structuredFastPath": True})
+
+    assert response.status_code == 200, response.text
+    assert pipeline.analyzer.extractions == 0
+    assert pipeline.database.saved == [{**STAR_FUELS, "entity": "dealer", "source": "dealers.example"}]
+
+
+def test_parallel_tools_merge_into_one_record_per_key(pipeline, monkeypatch):
+    pipeline.firecrawl.records = [{**STAR_FUELS, "email": None}]
+    search_answer = '[{"name": "Star Fuels", "phone": "+91 98450 12345", "email": "star@fuel.example"}]'
+    gemini = SimpleNamespace(search_google=lambda prompt, model=None: {"success": True, "data": search_answer})
+    monkeypatch.setattr(sniffer, "get_gemini_service", lambda: gemini)
+
+    response = pipeline.client.post("/sniffer_ai", json={
+        "urls": ["https://dealers.example/star"], "prompt": "Dealer details", "snifferTool": True, "googleSearch": True,
+        "fetchRouter": False, "structuredFastPath": False, "parallelTools": True})
+
+    assert response.status_code == 200, response.text
+    assert pipeline.database.saved == [{**STAR_FUELS, "entity": "dealer", "source": "dealers.example"}]
+
+
+def test_fetch_router_merges_local_and_escalated_pages(pipeline):
+    moon_petro = {"name": "Moon Petro", "phone": "+91 98450 67890", "email": None, "city": "Mysuru", "address": None}
+    pipeline.pages["https://dealers.example/moon"] = PLAIN_PAGE
+    pipeline.pages["https://app.dealers.example/star"] = JS_SHELL
+    pipeline.analyzer.records = [moon_petro]
+    pipeline.firecrawl.records = [STAR_FUELS]
+
+    response = pipeline.client.post("/sniffer_ai", json={
+        "urls": ["https://dealers.example/moon", "https://app.dealers.example/star"], "prompt": "Dealer details",
+        "snifferTool": True, "fetchRouter": True, "structuredFastPath": False})
+
+    assert response.status_code == 200, response.text
+    assert pipeline.analyzer.extractions == 1
+    assert pipeline.firecrawl.urls == ["https://app.dealers.example/star"]
+    assert [record["name"] for record in pipeline.database.saved] == ["Moon Petro", "Star Fuels"]
+
+
+def test_search_only_requests_do_not_fetch_the_pages(pipeline, monkeypatch):
+    gemini = SimpleNamespace(search_google=lambda prompt, model=None: {"success": True, "data": dict(STAR_FUELS)})
+    monkeypatch.setattr(sniffer, "get_gemini_service", lambda: gemini)
+    monkeypatch.setattr(sniffer, "route_urls", lambda *args, **kwargs: pytest.fail("pages fetched for a search-only request"))
+
+    response = pipeline.client.post("/sniffer_ai", json={
+        "urls": ["https://dealers.example/star"], "prompt": "Dealer details", "googleSearch": True})
+
+    assert response.status_code == 200, response.text
+    assert pipeline.database.saved == [{**STAR_FUELS, "entity": "dealer", "source": "dealers.example"}]
@@ -0,0 +1,112 @@
+"""
+Streamed refinement hands over records as they complete and saves them in batches
+
+    pytest app/testing/tests
+"""
+
+import json
+from contextlib import nullcontext
+from types import SimpleNamespace
+from typing import List
+
+from pydantic import BaseModel
+
+from app.services.database_service import BatchWriter
+from app.services.llm_services import OpenAIAnalyzer
+from app.utils.json_stream import JsonArrayItemParser
+
+
+class Dealer(BaseModel):
+    name: str
+    phone: str
+
+
+class Dealers(BaseModel):
+    output: List[Dealer]
+
+
+DEALERS = [
+    {"name": "Star \"Fuels\" [MG Road]", "phone": "+91 98450 12345"},
+    {"name": "Moon Petro, {Mysuru}", "phone": "+91 98450 67890"},
+    {"name": "Sun Energy", "phone": "+91 98450 11111"},
+]
+
+
+def pieces(text: str, size: int) -> List[str]:
+    return [text[index:index + size] for index in range(0, len(text), size)]
+
+
+class FakeStreamingClient:
+    """responses.stream() replaying `text` as output_text deltas of `size` characters"""
+
+    def __init__(self, text: str, size: int = 7, status: str = "completed"):
+        usage = SimpleNamespace(input_tokens=120, output_tokens=80, total_tokens=200)
+        self.events = [SimpleNamespace(type="response.output_text.delta", delta=piece) for piece in pieces(text, size)]
+        self.events.append(SimpleNamespace(type=f"response.{status}", response=SimpleNamespace(usage=usage, status=status)))
+        self.responses = SimpleNamespace(stream=lambda **kwargs: nullcontext(iter(self.events)))
+
+
+class FakeDatabase:
+    def __init__(self):
+        self.batches = []
+
+    def save_batch_unique_data(self, records, table_name, update_if_exists=True):
+        self.batches.append([record["name"] for record in records])
+        return {"total_records": len(records), "inserted": len(records), "updated": 0, "skipped": 0, "errors": 0}
+
+
+def test_parser_returns_each_item_once_it_closes():
+    parser = JsonArrayItemParser("output")
+    document = json.dumps({"note": "[not the list]", "output": DEALERS + ["plain", 42]})
+
+    items = [item for piece in pieces(document, 3) for item in parser.feed(piece)]
+
+    assert [json.loads(item) for item in items] == DEALERS + ["plain", 42]
+    assert parser.done
+    assert parser.feed('{"output": [{"name": "late"}]}') == []
+
+
+def test_streamed_items_are_validated_and_handed_over():
+    document = json.dumps({"output": [DEALERS[0], {"name": "No phone"}, DEALERS[1]]})
+    analyzer = OpenAIAnalyzer(client=FakeStreamingClient(document))
+    seen = []
+
+    result = analyzer.stream_structured_output("Dealers", model="gpt-4.1-mini", response_format=Dealers, on_item=seen.append)
+
+    assert result["success"]
+    assert seen == [DEALERS[0], DEALERS[1]]
+    assert result["data"] == {"output": seen}
+    assert (result["item_count"], result["invalid_count"]) == (2, 1)
+
+
+def test_incomplete_stream_keeps_the_items_it_finished():
+    document = json.dumps({"output": DEALERS})[:-40]
+    analyzer = OpenAIAnalyzer(client=FakeStreamingClient(document, status="incomplete"))
+
+    result = analyzer.stream_structured_output("Dealers", model="gpt-4.1-mini", response_format=Dealers)
+
+    assert not result["success"]
+    assert result["data"]["output"] == DEALERS[:2]
+
+
+def test_batch_writer_saves_in_order_and_sums_the_batches():
+    database = FakeDatabase()
+    writer = BatchWriter(database, "dealers", batch_size=2)
+
+    for dealer in DEALERS:
+        writer.add(dealer)
+    result = writer.close()
+
+    assert database.batches == [[DEALERS[0]["name"], DEALERS[1]["name"]], [DEALERS[2]["name"]]]
+    assert (result["batches"], result["inserted"], result["errors"]) == (2, 3, 0)
+
+
+def test_batch_writer_counts_a_failed_batch_as_an_error():
+    class FailingDatabase(FakeDatabase):
+        def save_batch_unique_data(self, records, table_name, update_if_exists=True):
+            raise ConnectionError("database down")
+
+    writer = BatchWriter(FailingDatabase(), "dealers", batch_size=10)
+    writer.add(DEALERS[0])
+
+    assert writer.close()["errors"] == 1
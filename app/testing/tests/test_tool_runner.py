@@ -0,0 +1,104 @@
+"""
+First-stage tools run against a shared deadline and their outputs merge into records
+
+    pytest app/testing/tests
+"""
+
+import time
+import threading
+
+from app.services.tool_runner import merge_tool_results, run_tools, to_records
+from app.utils.rate_limiter import DeadlineExceededError, ProviderLimiter
+
+
+def test_tools_missing_the_deadline_time_out_without_holding_up_the_others():
+    release = threading.Event()
+
+    def slow():
+        release.wait(5)
+        return {"success": True, "data": {"name": "late"}}
+
+    def broken():
+        raise RuntimeError("quota exceeded")
+
+    started_at = time.monotonic()
+    results = run_tools({"fast": lambda: {"success": True, "data": {"name": "Star Fuels"}}, "slow": slow, "broken": broken},
+                        deadline_seconds=0.2)
+    release.set()
+
+    assert time.monotonic() - started_at < 2
+    assert results["fast"]["data"] == {"name": "Star Fuels"}
+    assert (results["slow"]["status"], results["slow"]["success"]) == ("Timeout", False)
+    assert (results["broken"]["status"], results["broken"]["error"]) == ("Error", "quota exceeded")
+
+
+def test_a_late_tool_makes_no_provider_call_after_the_deadline():
+    limiter = ProviderLimiter("test", 600, max_retries=0)
+    release, finished = threading.Event(), threading.Event()
+    calls, outcome = [], []
+
+    def late_tool():
+        release.wait(5)
+        try:
+            limiter.run(lambda: calls.append(1))
+        except DeadlineExceededError as e:
+            outcome.append(e)
+        finally:
+            finished.set()
+        return {"success": True, "data": None}
+
+    results = run_tools({"late": late_tool}, deadline_seconds=0.1)
+    release.set()
+    assert finished.wait(5)
+
+    assert results["late"]["status"] == "Timeout"
+    assert calls == []
+    assert len(outcome) == 1
+
+
+def test_provider_calls_are_unaffected_outside_the_tools():
+    limiter = ProviderLimiter("test", 600, max_retries=0)
+    run_tools({"quick": lambda: {"success": True, "data": None}}, deadline_seconds=0.1)
+    time.sleep(0.2)
+
+    assert limiter.run(lambda: "ok") == "ok"
+
+
+def test_to_records_reads_fenced_json_and_keeps_free_text():
+    answer = "Here are the dealers:\n```json\n[{\"name\": \"Star Fuels\", \"phone\": \"+91 98450 12345\"}]\n```"
+
+    assert to_records(answer) == ([{"name": "Star Fuels", "phone": "+91 98450 12345"}], "")
+    assert to_records("No dealers were found") == ([], "No dealers were found")
+    assert to_records({"output": [{"name": "Moon Petro"}, "noise"]}) == ([{"name": "Moon Petro"}], "")
+
+
+def test_merge_fills_gaps_from_later_tools_and_matches_on_the_unique_key():
+    results = {
+        "extract": {"success": True, "data": {"output": [
+            {"name": "Star Fuels", "phone": "1", "email": "Not Found"},
+            {"name": "Moon Petro", "phone": "2", "email": None},
+        ]}},
+        "google_search": {"success": True, "data": '[{"name": "Star Fuels (MG Road)", "phone": "1", "email": "star@fuel.example"},'
+                                                   ' {"name": "Sun Energy", "phone": "3", "email": "sun@energy.example"}]'},
+        "web_search": {"success": False, "data": None, "status": "Timeout"},
+    }
+
+    records, text = merge_tool_results(results, ["extract", "google_search", "web_search"], unique_key="phone")
+
+    assert records == [
+        {"name": "Star Fuels", "phone": "1", "email": "star@fuel.example"},
+        {"name": "Moon Petro", "phone": "2", "email": None},
+        {"name": "Sun Energy", "phone": "3", "email": "sun@energy.example"},
+    ]
+    assert text == ""
+
+
+def test_single_records_with_different_keys_are_not_merged():
+    results = {
+        "local": {"success": True, "data": {"output": [{"name": "Moon Petro", "phone": "2"}]}},
+        "firecrawl": {"success": True, "data": {"output": [{"name": "Star Fuels", "phone": "1"}]}},
+    }
+
+    records, _ = merge_tool_results(results, ["local", "firecrawl"], unique_key="phone")
+
+    assert [record["name"] for record in records] == ["Moon Petro", "Star Fuels"]
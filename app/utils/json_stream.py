@@ -0,0 +1,110 @@
+"""
+Incremental parsing of a JSON array while it is still being streamed
+"""
+
+import re
+from typing import List
+
+
+class JsonArrayItemParser:
+    """
+    Pulls complete items out of the array `field` of a streamed JSON object
+
+    Text is fed in arbitrary pieces (e.g. model output deltas); every call to feed()
+    returns the raw JSON of the items completed so far. Consumed text is dropped, so
+    memory stays bounded by the size of a single item.
+    """
+
+    def __init__(self, field: str = "output"):
+        self.field = field
+        self.array_start = re.compile(r'"' + re.escape(field) + r'"\s*:\s*\[')
+        self.buffer = ""
+        self.position = 0
+        self.in_array = False
+        self.done = False
+
+        # State of the item being scanned
+        self.item_start = None
+        self.depth = 0
+        self.in_string = False
+        self.escape = False
+
+    def _emit(self, items: List[str], end: int):
+        item = self.buffer[self.item_start:end].strip()
+        if item:
+            items.append(item)
+        self.item_start = None
+
+    def feed(self, text: str) -> List[str]:
+        """
+        Add streamed text and return the raw JSON of every item it completes
+
+        Args:
+            text (str): Next piece of the streamed JSON document
+
+        Returns:
+            list: Raw JSON strings of the completed items, in order
+        """
+        if self.done or not text:
+            return []
+
+        self.buffer += text
+        if not self.in_array:
+            match = self.array_start.search(self.buffer)
+            if not match:
+                return []
+            self.in_array = True
+            self.buffer = self.buffer[match.end():]
+            self.position = 0
+
+        items = []
+        index = self.position
+        while index < len(self.buffer):
+            char = self.buffer[index]
+
+            if self.item_start is None:
+                if char in " \t\r\n,":
+                    index += 1
+                    continue
+                if char == "]":
+                    self.done = True
+                    break
+                self.item_start = index
+                self.depth = 0
+                self.in_string = False
+                self.escape = False
+
+            if self.in_string:
+                if self.escape:
+                    self.escape = False
+                elif char == "\\":
+                    self.escape = True
+                elif char == '"':
+                    self.in_string = False
+                    if self.depth == 0:
+                        self._emit(items, index + 1)
+            elif char == '"':
+                self.in_string = True
+            elif char in "{[":
+                self.depth += 1
+            elif char in "}]":
+                if self.depth == 0:
+                    # Closing bracket of the array right after a scalar item
+                    self._emit(items, index)
+                    self.done = True
+                    break
+                self.depth -= 1
+                if self.depth == 0:
+                    self._emit(items, index + 1)
+            elif char == "," and self.depth == 0:
+                self._emit(items, index)
+
+            index += 1
+
+        # Drop everything that has been consumed
+        cut = self.item_start if self.item_start is not None else index
+        self.buffer = self.buffer[cut:]
+        if self.item_start is not None:
+            self.item_start = 0
+        self.position = index - cut
+        return items
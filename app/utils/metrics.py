@@ -0,0 +1,319 @@
+"""
+Prometheus metrics and optional OpenTelemetry traces
+
+prometheus_client and opentelemetry are optional: without them every metric is a
+no-op and no spans are created, so instrumented code never needs to check.
+"""
+
+import time
+import inspect
+import logging
+import functools
+import threading
+from contextvars import ContextVar
+from typing import Dict, List, Optional
+
+from app.config.settings import settings
+
+logger = logging.getLogger(__name__)
+
+try:
+    from prometheus_client import CollectorRegistry, Counter, Histogram, generate_latest, CONTENT_TYPE_LATEST
+except ImportError:
+    CollectorRegistry = None
+    logger.warning("prometheus_client is not installed, metrics are disabled")
+
+
+class NoopMetric:
+    """Stand-in for a Prometheus metric when prometheus_client is not installed"""
+
+    def labels(self, *args, **kwargs):
+        return self
+
+    def inc(self, amount: float = 1):
+        pass
+
+    def observe(self, amount: float):
+        pass
+
+
+registry = CollectorRegistry() if CollectorRegistry else None
+
+
+def create_counter(name: str, documentation: str, labels: List[str]):
+    return Counter(name, documentation, labels, registry=registry) if registry else NoopMetric()
+
+
+def create_histogram(name: str, documentation: str, labels: List[str], buckets=None):
+    if not registry:
+        return NoopMetric()
+    if buckets:
+        return Histogram(name, documentation, labels, registry=registry, buckets=buckets)
+    return Histogram(name, documentation, labels, registry=registry)
+
+
+########################################## Pipeline Metrics ##########################################
+STAGE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300)
+
+PIPELINE_REQUESTS = create_counter(
+    "sniffer_requests_total", "Pipeline requests by outcome", ["pipeline", "usecase", "status"])
+PIPELINE_DURATION = create_histogram(
+    "sniffer_request_seconds", "End-to-end pipeline latency", ["pipeline", "usecase"], STAGE_BUCKETS)
+STAGE_DURATION = create_histogram(
+    "sniffer_stage_seconds", "Latency of each pipeline stage", ["pipeline", "stage", "usecase"], STAGE_BUCKETS)
+LLM_TOKENS = create_counter(
+    "llm_tokens_total", "Tokens used per provider and model", ["provider", "model", "kind", "usecase"])
+LLM_COST = create_counter(
+    "llm_cost_usd_total", "Estimated spend in USD per provider and model", ["provider", "model", "usecase"])
+
+# USD per 1M (input, output) tokens, matched on the longest model name prefix
+MODEL_PRICES = {
+    "gpt-4o-mini-search-preview": (0.15, 0.60),
+    "gpt-4o-mini": (0.15, 0.60),
+    "gpt-4o": (2.50, 10.00),
+    "gpt-4.1-mini": (0.40, 1.60),
+    "gpt-4.1": (2.00, 8.00),
+    "gpt-5-nano": (0.05, 0.40),
+    "gemini-2.0-flash": (0.10, 0.40),
+    "gemini-2.5-flash": (0.30, 2.50),
+}
+
+
+def estimate_cost(model: str, input_tokens: int, output_tokens: int) -> float:
+    """Estimated USD cost of a call, 0 for models without a known price"""
+    prefix = max((name for name in MODEL_PRICES if (model or "").startswith(name)), key=len, default=None)
+    if not prefix:
+        return 0.0
+    input_price, output_price = MODEL_PRICES[prefix]
+    return (input_tokens * input_price + output_tokens * output_price) / 1_000_000
+
+
+def split_token_usage(token_usage: dict) -> tuple:
+    """(input, output) tokens from the token_usage dict returned by the LLM services"""
+    token_usage = token_usage or {}
+    input_tokens = token_usage.get("prompt_token") or token_usage.get("input_token") or 0
+    output_tokens = (token_usage.get("completion_token") or 0) + (token_usage.get("output_token") or 0)
+    return input_tokens, output_tokens
+
+
+########################################## Subsystem Metrics ##########################################
+CALL_BUCKETS = (0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120)
+
+# Labelled by tier and status class, not host: every crawled site would be a new series
+FETCH_REQUESTS = create_counter("fetch_requests_total", "Page fetches by fetch tier and status class", ["tier", "status"])
+FETCH_BYTES = create_counter("fetch_bytes_total", "Bytes downloaded by fetch tier", ["tier"])
+FETCH_DURATION = create_histogram(
+    "fetch_seconds", "Page fetch latency including retries", ["tier", "status"], CALL_BUCKETS)
+FETCH_ROUTES = create_counter("fetch_routes_total", "Pages routed per fetch tier and reason", ["tier", "reason"])
+
+LLM_CALLS = create_counter("llm_calls_total", "LLM calls by outcome", ["provider", "model", "operation", "outcome"])
+LLM_CALL_DURATION = create_histogram(
+    "llm_call_seconds", "LLM call latency including retries", ["provider", "model", "operation"], CALL_BUCKETS)
+
+CRAWLER_CALLS = create_counter("crawler_calls_total", "Firecrawl calls by outcome", ["operation", "outcome"])
+CRAWLER_CALL_DURATION = create_histogram(
+    "crawler_call_seconds", "Firecrawl call latency including retries", ["operation"], CALL_BUCKETS)
+
+DB_CALLS = create_counter("db_calls_total", "Supabase operations by outcome", ["operation", "outcome"])
+DB_CALL_DURATION = create_histogram("db_call_seconds", "Supabase operation latency", ["operation"], CALL_BUCKETS)
+
+API_ATTEMPTS = create_counter(
+    "api_attempts_total", "Individual attempts made through the provider limiters", ["provider", "outcome"])
+
+CACHE_LOOKUPS = create_counter("cache_lookups_total", "Cache lookups by cache and result", ["cache", "result"])
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    """Count a hit or miss of one of the caches"""
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+
+def status_class(status_code: int = None) -> str:
+    """"2xx", "4xx", ... of an HTTP status code, "error" when the request got no response"""
+    return f"{status_code // 100}xx" if status_code else "error"
+
+
+def record_fetch(tier: str, status_code: int, seconds: float, size: int = 0):
+    """Count a page fetch with its final status code (None if it got no response), latency and size"""
+    status = status_class(status_code)
+    FETCH_REQUESTS.labels(tier, status).inc()
+    FETCH_DURATION.labels(tier, status).observe(seconds)
+    if size:
+        FETCH_BYTES.labels(tier).inc(size)
+
+
+def call_outcome(result) -> str:
+    """Outcome label of a service call from its return value"""
+    if result is None:
+        return "failure"
+    if isinstance(result, dict) and (result.get("success") is False or result.get("status") == "error"):
+        return "failure"
+    return "success"
+
+
+def track_call(subsystem: str, operation: str, provider: str = None):
+    """
+    Decorator counting the calls of a service method and their latency
+
+    Args:
+        subsystem (str): "llm", "crawler" or "db"
+        operation (str): Operation label, e.g. "structured_output"
+        provider (str): LLM provider label, the model is read from the call's `model` argument
+    """
+    def decorator(fn):
+        signature = inspect.signature(fn)
+
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            started_at = time.monotonic()
+            outcome = "error"
+            try:
+                result = fn(*args, **kwargs)
+                outcome = call_outcome(result)
+                return result
+            finally:
+                elapsed = time.monotonic() - started_at
+                if subsystem == "llm":
+                    arguments = signature.bind_partial(*args, **kwargs).arguments
+                    default = signature.parameters.get("model")
+                    model = arguments.get("model") or (default.default if default and default.default is not inspect.Parameter.empty else None)
+                    model = model or getattr(args[0], "model", None) or "unknown"
+                    LLM_CALLS.labels(provider, model, operation, outcome).inc()
+                    LLM_CALL_DURATION.labels(provider, model, operation).observe(elapsed)
+                elif subsystem == "crawler":
+                    CRAWLER_CALLS.labels(operation, outcome).inc()
+                    CRAWLER_CALL_DURATION.labels(operation).observe(elapsed)
+                else:
+                    DB_CALLS.labels(operation, outcome).inc()
+                    DB_CALL_DURATION.labels(operation).observe(elapsed)
+        return wrapper
+    return decorator
+
+
+def render_metrics():
+    """Prometheus text exposition of the registry, None when prometheus_client is not installed"""
+    if not registry:
+        return None
+    return generate_latest(registry), CONTENT_TYPE_LATEST
+
+
+########################################## Tracing ##########################################
+def get_tracer():
+    """OpenTelemetry tracer when OTEL_TRACES_ENABLED is set and the SDK is installed, else None"""
+    if not settings.OTEL_TRACES_ENABLED:
+        return None
+    try:
+        from opentelemetry import trace
+    except ImportError:
+        logger.warning("opentelemetry is not installed, traces are disabled")
+        return None
+    return trace.get_tracer("sniffer")
+
+
+########################################## Pipeline Tracker ##########################################
+current_tracker: ContextVar[Optional["PipelineTracker"]] = ContextVar("current_tracker", default=None)
+
+
+class PipelineTracker:
+    """
+    Times the consecutive stages of one pipeline run and collects its token usage
+
+    Stages are marked as the pipeline moves on, each mark ends the previous stage.
+    Observations are exported on finish() so every stage and token counter carries
+    the use case, which is only known after classification.
+    """
+
+    def __init__(self, pipeline: str = "sniffer"):
+        self.pipeline = pipeline
+        self.usecase = "unknown"
+        self.started_at = time.monotonic()
+        self.stages: Dict[str, float] = {}
+        self.tokens: List[tuple] = []
+        self.current_stage = None
+        self.current_started_at = None
+        self.lock = threading.Lock()
+
+        self.tracer = get_tracer()
+        self.root_span = self.tracer.start_span(pipeline) if self.tracer else None
+        self.stage_span = None
+        self.token = current_tracker.set(self)
+
+    def stage(self, name: str):
+        """Start stage `name`, ending the current one"""
+        self._end_stage()
+        self.current_stage = name
+        self.current_started_at = time.monotonic()
+        if self.tracer:
+            from opentelemetry import trace
+            self.stage_span = self.tracer.start_span(name, context=trace.set_span_in_context(self.root_span))
+
+    def _end_stage(self):
+        if self.current_stage is None:
+            return
+        elapsed = time.monotonic() - self.current_started_at
+        self.stages[self.current_stage] = self.stages.get(self.current_stage, 0.0) + elapsed
+        if self.stage_span:
+            self.stage_span.end()
+            self.stage_span = None
+        self.current_stage = None
+
+    def add_tokens(self, provider: str, model: str, token_usage: dict):
+        """Collect the token usage of one provider call"""
+        with self.lock:
+            self.tokens.append((provider, model, token_usage))
+
+    def finish(self, status: str = "success"):
+        """End the run and export its stage timings and token counters"""
+        self._end_stage()
+        total = time.monotonic() - self.started_at
+        current_tracker.reset(self.token)
+
+        for stage, elapsed in self.stages.items():
+            STAGE_DURATION.labels(self.pipeline, stage, self.usecase).observe(elapsed)
+        PIPELINE_DURATION.labels(self.pipeline, self.usecase).observe(total)
+        PIPELINE_REQUESTS.labels(self.pipeline, self.usecase, status).inc()
+
+        total_cost = 0.0
+        for provider, model, token_usage in self.tokens:
+            total_cost += export_token_usage(provider, model, token_usage, self.usecase)
+
+        if self.root_span:
+            self.root_span.set_attribute("usecase", self.usecase)
+            self.root_span.set_attribute("status", status)
+            self.root_span.set_attribute("cost_usd", total_cost)
+            self.root_span.end()
+
+        stage_summary = ", ".join(f"{stage}={elapsed:.2f}s" for stage, elapsed in self.stages.items())
+        logger.info(f"{self.pipeline} {status} in {total:.2f}s (usecase {self.usecase}, ~${total_cost:.4f}): {stage_summary}")
+
+
+def export_token_usage(provider: str, model: str, token_usage: dict, usecase: str = "none") -> float:
+    """Add one call's token usage to the counters and return its estimated cost"""
+    input_tokens, output_tokens = split_token_usage(token_usage)
+    if not input_tokens and not output_tokens:
+        return 0.0
+
+    model = model or "unknown"
+    cost = estimate_cost(model, input_tokens, output_tokens)
+    if provider.endswith("_batch"):
+        # Batch API requests are billed at half price
+        cost *= 0.5
+    LLM_TOKENS.labels(provider, model, "input", usecase).inc(input_tokens)
+    LLM_TOKENS.labels(provider, model, "output", usecase).inc(output_tokens)
+    if cost:
+        LLM_COST.labels(provider, model, usecase).inc(cost)
+    return cost
+
+
+def record_token_usage(provider: str, model: str, token_usage: dict):
+    """
+    Record the token usage of a provider call
+
+    Inside a tracked pipeline run the usage is attributed to its use case when the
+    run finishes, otherwise it is exported right away.
+    """
+    tracker = current_tracker.get()
+    if tracker:
+        tracker.add_tokens(provider, model, token_usage)
+    else:
+        export_token_usage(provider, model, token_usage)
@@ -42,6 +42,24 @@ Your task is to extract **only real, verifiable financial data** from the intern
 - Do not proivde any source information or urls.
 """
 
+multi_field_search_system_message = """You are a financial research assistant.
+
+Your task is to find **only real, verifiable financial data** from the internet for every key listed by the user.
+
+- Do not make up or assume any values.
+- Respond with a single JSON object whose keys are exactly the keys listed by the user.
+- Keep every value under 20 words, using numerical data or short phrases.
+- If the data for a key is not available publicly, set its value strictly to: Not found.
+- Do not hallucinate placeholder numbers or generic ranges.
+- Do not provide any source information or urls.
+"""
+
+multi_field_search_prompt = """Please provide the real financial data related to the housing loans provided by the Lender/Bank: {lender_name}
+
+Keys to search:
+{keys}
+"""
+
 lenders_data_prompt = """Please look into the data provided reatled to home loan from {lender_name} and provide the below details in a concise format.
 
 Raw Data: 
@@ -49,7 +67,11 @@ Raw Data:
 
 Keys to extract:  
 dict(
-  "lender": "",
+{keys})
+"""
+
+# One line per lender field, only the fields still missing are sent in {keys}
+lenders_data_keys = """  "lender": "",
   "alias": "",
   "official_website": "",
   "homeloan_website": "",
@@ -88,7 +110,6 @@ dict(
   "approved_property_types": "only property type names separated by comma",
   "property_type_specifications": "only property type specifications names separated by comma",
   "source_urls": "only source urls separated by comma"
-)
 """
 
 lenders_usecase_system_message_v2 = """You are a bank policy data extractor. Your job is to browse, click, scroll, and parse official Bandhan Bank pages to collect home loan and Loan Against Property (LAP) parameters. You must return one JSON object matching the provided schema, with clean, normalized values. Do not guess; if a field is not found, set it to null. Prefer the most recent, official sources on bandhanbank.com (including PDFs hosted on the same domain).
@@ -275,6 +296,22 @@ gemini_search_prompt = """What is the
                 for home loan in India for {source}."""
 
 
+def get_lenders_data_keys(fields=None):
+    """Key lines of lenders_data_prompt for the requested schema fields, all of them by default"""
+    lines = lenders_data_keys.splitlines()
+    if fields is None:
+        return "\n".join(lines)
+    # Prompt keys are the schema field names with underscores, e.g. "homeloan_roi" -> homeloanroi
+    wanted = set(fields)
+    return "\n".join(line for line in lines if line.split('"')[1].replace("_", "") in wanted)
+
+
+def get_lenders_data_prompt(lender_name, final_data, fields=None):
+    """lenders_data_prompt filled in for a lender, the braces of the raw data escaped"""
+    cleaned_data = final_data.replace("{", "(").replace("}", ")")
+    return lenders_data_prompt.format(lender_name=lender_name, final_data=cleaned_data, keys=get_lenders_data_keys(fields))
+
+
 def get_prompt(prompt_name):
     if prompt_name == "lenders_usecase_system_message_v2":
         return lenders_usecase_system_message_v2
@@ -0,0 +1,355 @@
+"""
+Shared rate limiting and retry scheduling for outbound API calls
+
+Every external provider (OpenAI, Gemini, Firecrawl, plain HTTP fetches) gets one
+ProviderLimiter holding its requests/min and tokens/min budgets, an exponential
+backoff with jitter that honours Retry-After, and a circuit breaker. Providers
+fronting many independent servers (plain HTTP fetches) also keep a lane per key,
+e.g. per host, so one dead site only opens its own circuit.
+"""
+
+import re
+import time
+import random
+import logging
+import threading
+import contextvars
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Callable, Dict, Optional
+
+from app.config.settings import settings
+from app.utils.metrics import API_ATTEMPTS
+
+logger = logging.getLogger(__name__)
+
+# Status codes worth retrying, everything else in the 4xx range fails immediately
+RETRYABLE_STATUS_CODES = [408, 409, 425, 429, 500, 502, 503, 504, 520, 522, 524]
+
+# Lanes kept per provider, the least recently used ones are forgotten beyond this
+MAX_KEY_LANES = 10000
+
+
+class CircuitOpenError(Exception):
+    """Raised when a provider's circuit breaker is open"""
+
+
+class DeadlineExceededError(Exception):
+    """Raised instead of calling a provider once the caller's deadline has passed"""
+
+
+# Monotonic deadline of the provider calls made in the current context (e.g. a first-stage
+# tool), calls after it are refused so work nobody waits for stops spending quota
+call_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar("call_deadline", default=None)
+
+
+class TokenBucket:
+    """Thread-safe token bucket refilled continuously at `capacity` per minute"""
+
+    def __init__(self, capacity_per_minute: int):
+        self.capacity = float(capacity_per_minute)
+        self.tokens = float(capacity_per_minute)
+        self.refill_per_second = capacity_per_minute / 60.0
+        self.updated_at = time.monotonic()
+        self.lock = threading.Lock()
+
+    def _refill(self, scale: float = 1.0):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.refill_per_second * scale)
+        self.updated_at = now
+
+    def acquire(self, amount: float = 1.0, scale: float = 1.0):
+        """Block until `amount` tokens are available and take them"""
+        if self.capacity <= 0:
+            return
+
+        # Requests bigger than the whole bucket are allowed once it is full
+        amount = min(amount, self.capacity)
+        while True:
+            with self.lock:
+                self._refill(scale)
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                wait = (amount - self.tokens) / (self.refill_per_second * scale)
+            time.sleep(min(wait, 1.0))
+
+    def adjust(self, amount: float):
+        """Take (or give back, if negative) tokens after the real usage is known"""
+        if self.capacity <= 0:
+            return
+        with self.lock:
+            self._refill()
+            self.tokens = min(self.capacity, self.tokens - amount)
+
+
+class CircuitBreaker:
+    """Opens after consecutive failures and lets a single probe through after a cool-down"""
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self.lock = threading.Lock()
+
+    def allow(self) -> bool:
+        with self.lock:
+            if self.opened_at is None:
+                return True
+            if time.monotonic() - self.opened_at >= self.reset_timeout and not self.probing:
+                self.probing = True
+                return True
+            return False
+
+    def record_success(self):
+        with self.lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self.lock:
+            self.failures += 1
+            self.probing = False
+            if self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+
+
+def get_status_code(error: Exception) -> Optional[int]:
+    """Best-effort HTTP status code of an exception raised by any of the provider SDKs"""
+    for attribute in ("status_code", "code", "status"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return value
+
+    response = getattr(error, "response", None)
+    value = getattr(response, "status_code", None)
+    if isinstance(value, int):
+        return value
+
+    # Firecrawl raises plain exceptions with the status in the message
+    match = re.search(r"status code:?\s*(\d{3})", str(error), re.IGNORECASE)
+    return int(match.group(1)) if match else None
+
+
+def get_retry_after(error: Exception) -> Optional[float]:
+    """Seconds to wait according to the Retry-After header of a failed response, if any"""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+
+    retry_after_ms = headers.get("retry-after-ms")
+    if retry_after_ms:
+        try:
+            return float(retry_after_ms) / 1000
+        except ValueError:
+            pass
+
+    retry_after = headers.get("retry-after")
+    if not retry_after:
+        return None
+    try:
+        return float(retry_after)
+    except ValueError:
+        try:
+            return max(parsedate_to_datetime(retry_after).timestamp() - time.time(), 0.0)
+        except (TypeError, ValueError):
+            return None
+
+
+def is_retryable(error: Exception) -> bool:
+    """Whether a failed call is worth retrying"""
+    if isinstance(error, (CircuitOpenError, DeadlineExceededError)):
+        return False
+
+    status_code = get_status_code(error)
+    if status_code is not None:
+        return status_code in RETRYABLE_STATUS_CODES
+
+    # Timeouts and dropped connections carry no status code
+    name = type(error).__name__.lower()
+    return "timeout" in name or "connection" in name
+
+
+class ProviderLimiter:
+    """Request/token budgets, retries and circuit breaking for one external provider"""
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: int,
+        tokens_per_minute: int = 0,
+        max_retries: int = None,
+        base_delay: float = None,
+        max_delay: float = None,
+        failure_threshold: int = None,
+        reset_timeout: float = None,
+        key_requests_per_minute: int = 0,
+    ):
+        self.name = name
+        self.requests = TokenBucket(requests_per_minute)
+        self.tokens = TokenBucket(tokens_per_minute)
+        self.max_retries = settings.API_MAX_RETRIES if max_retries is None else max_retries
+        self.base_delay = base_delay or settings.API_RETRY_BASE_DELAY
+        self.max_delay = max_delay or settings.API_RETRY_MAX_DELAY
+        self.breaker = CircuitBreaker(
+            failure_threshold or settings.CIRCUIT_FAILURE_THRESHOLD,
+            reset_timeout or settings.CIRCUIT_RESET_SECONDS,
+        )
+
+        # Throttling responses shrink the refill rate, successes slowly restore it
+        self.rate_scale = 1.0
+        self.blocked_until = 0.0
+        self.lock = threading.Lock()
+
+        # Per-key lanes: their own breaker, request budget and throttling on top of the provider's
+        self.key_requests_per_minute = key_requests_per_minute
+        self.lanes: "OrderedDict[str, ProviderLimiter]" = OrderedDict()
+
+    def lane(self, key: Optional[str]) -> "ProviderLimiter":
+        """Limiter of one key of the provider (e.g. one host), the provider itself without a key"""
+        if key is None:
+            return self
+        with self.lock:
+            lane = self.lanes.get(key)
+            if lane is None:
+                lane = self.lanes[key] = ProviderLimiter(
+                    f"{self.name}:{key}", self.key_requests_per_minute,
+                    max_retries=self.max_retries, base_delay=self.base_delay, max_delay=self.max_delay,
+                    failure_threshold=self.breaker.failure_threshold, reset_timeout=self.breaker.reset_timeout,
+                )
+                if len(self.lanes) > MAX_KEY_LANES:
+                    self.lanes.popitem(last=False)
+            self.lanes.move_to_end(key)
+            return lane
+
+    def acquire(self, tokens: int = 0):
+        """Block until the provider's budgets allow one more request of `tokens` tokens"""
+        wait = self.blocked_until - time.monotonic()
+        if wait > 0:
+            time.sleep(wait)
+        self.requests.acquire(1, self.rate_scale)
+        if tokens:
+            self.tokens.acquire(tokens, self.rate_scale)
+
+    def record_tokens(self, used_tokens: int, estimated_tokens: int = 0):
+        """Correct the token budget once the real usage of a call is known"""
+        if used_tokens:
+            self.tokens.adjust(used_tokens - estimated_tokens)
+
+    def _backoff(self, attempt: int, error: Exception, base_delay: float) -> float:
+        retry_after = get_retry_after(error)
+        if retry_after is not None:
+            return min(retry_after, self.max_delay)
+        # Full jitter exponential backoff
+        return random.uniform(0, min(self.max_delay, base_delay * (2 ** attempt)))
+
+    def _throttled(self, delay: float):
+        with self.lock:
+            self.rate_scale = max(self.rate_scale * 0.5, 0.1)
+            self.blocked_until = max(self.blocked_until, time.monotonic() + delay)
+        logger.warning(f"{self.name} is throttling requests, pausing {delay:.1f}s at {self.rate_scale:.0%} of the budget")
+
+    def _recovered(self):
+        if self.rate_scale < 1.0:
+            with self.lock:
+                self.rate_scale = min(self.rate_scale * 1.1, 1.0)
+
+    def run(self, fn: Callable, tokens: int = 0, max_retries: int = None, base_delay: float = None, key: str = None):
+        """
+        Call `fn` within the provider's budgets, retrying transient failures
+
+        Args:
+            fn (callable): Zero-argument callable making the API request
+            tokens (int): Estimated tokens the request will use
+            max_retries (int): Override for the provider's retry count
+            base_delay (float): Override for the provider's first backoff delay
+            key (str): Lane of the request (e.g. the host), failures and throttling of
+                one key do not affect the others
+
+        Returns:
+            The return value of `fn`
+
+        Raises:
+            CircuitOpenError: If the circuit of the provider (or of the key) is open
+            DeadlineExceededError: If the call_deadline of the context has passed
+            Exception: The last error once retries are exhausted or it is not retryable
+        """
+        max_retries = self.max_retries if max_retries is None else max_retries
+        base_delay = base_delay or self.base_delay
+        lane = self.lane(key)
+
+        for attempt in range(max_retries + 1):
+            deadline = call_deadline.get()
+            if deadline is not None and time.monotonic() >= deadline:
+                API_ATTEMPTS.labels(self.name, "deadline").inc()
+                raise DeadlineExceededError(f"Deadline passed, skipping {lane.name} request")
+            if not lane.breaker.allow():
+                API_ATTEMPTS.labels(self.name, "circuit_open").inc()
+                raise CircuitOpenError(f"Circuit open for {lane.name}, skipping request")
+
+            if lane is not self:
+                lane.acquire()
+            self.acquire(tokens)
+            try:
+                result = fn()
+            except Exception as e:
+                if not is_retryable(e):
+                    API_ATTEMPTS.labels(self.name, "failed").inc()
+                    lane.breaker.record_success()
+                    raise
+
+                API_ATTEMPTS.labels(self.name, "throttled" if get_status_code(e) == 429 else "retryable_error").inc()
+                lane.breaker.record_failure()
+                if attempt >= max_retries:
+                    logger.error(f"{self.name} request failed after {attempt + 1} attempts: {e}")
+                    raise
+
+                delay = self._backoff(attempt, e, base_delay)
+                if get_status_code(e) == 429:
+                    lane._throttled(delay)
+                logger.warning(f"{self.name} request failed ({e}), retry {attempt + 1}/{max_retries} in {delay:.1f}s")
+                time.sleep(delay)
+                continue
+
+            API_ATTEMPTS.labels(self.name, "success").inc()
+            lane.breaker.record_success()
+            lane._recovered()
+            return result
+
+
+_provider_limiters: Dict[str, ProviderLimiter] = {}
+_registry_lock = threading.Lock()
+
+
+def get_provider_limiter(provider: str) -> ProviderLimiter:
+    """
+    Get the shared limiter of a provider, creating it from settings on first use
+
+    Args:
+        provider (str): One of "openai", "gemini", "firecrawl", "http"
+
+    Returns:
+        ProviderLimiter: Limiter shared by every client of the provider
+    """
+    with _registry_lock:
+        if provider not in _provider_limiters:
+            budgets = {
+                "openai": (settings.OPENAI_REQUESTS_PER_MINUTE, settings.OPENAI_TOKENS_PER_MINUTE),
+                "gemini": (settings.GEMINI_REQUESTS_PER_MINUTE, settings.GEMINI_TOKENS_PER_MINUTE),
+                "firecrawl": (settings.FIRECRAWL_REQUESTS_PER_MINUTE, 0),
+                "http": (settings.HTTP_REQUESTS_PER_MINUTE, 0),
+            }
+            requests_per_minute, tokens_per_minute = budgets.get(provider, (60, 0))
+            # Plain fetches go to many unrelated sites, each host gets its own lane; OpenAI's
+            # lanes are its models with a request limit of their own (the search model)
+            key_requests_per_minute = {
+                "http": settings.HTTP_HOST_REQUESTS_PER_MINUTE,
+                "openai": settings.SEARCH_REQUESTS_PER_MINUTE,
+            }.get(provider, 0)
+            _provider_limiters[provider] = ProviderLimiter(
+                provider, requests_per_minute, tokens_per_minute, key_requests_per_minute=key_requests_per_minute)
+        return _provider_limiters[provider]